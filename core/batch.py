@@ -0,0 +1,686 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the batch pricing module for ordinary life insurance products
+
+including
+..py:class:: BatchPricing 批量定价模块
+..py:class:: BatchStat 批量法定准备金模块
+..py:class:: BatchGaap 批量GAAP月度现金流模块
+
+所有中间结果均为 (保单 × 保单年度) 的二维矩阵，超出保险期间的格子为0
+
+
+"""
+
+
+import numpy as np
+import core.tbl_manage as tm
+import core.memo as memo
+import core.decrement as dc
+import core.pricing as pc
+import core.stat as st
+import core.gaap as ga
+import core.benefit_rule as br
+
+
+def rev_cumsum(x):
+    """
+    沿保单年度的反向累加
+    """
+    return x[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+
+def roll_left(x, insterm):
+    """
+    逐行左移一格，首列移至各自保险期间的最后一年，与单点的np.roll(x, -1)一致
+
+    :param np.ndarray x: (保单 × 保单年度) 矩阵
+    :param np.ndarray insterm: 各保单的保险期间
+    :rtype: np.ndarray
+    """
+    out = np.zeros(x.shape)
+    out[:, :-1] = x[:, 1:]
+    out[np.arange(len(x)), insterm - 1] = x[:, 0]
+    out[np.arange(x.shape[1])[None, :] >= insterm[:, None]] = 0
+    return out
+
+
+def apply_shock(rate, shock):
+    """
+    对发生率施加冲击，结果截断在[0, 1]
+
+    :param np.ndarray rate: 年度发生率
+    :param tuple shock: ("mul", 系数) 或 ("add", 增量)，为None时不调整
+    :rtype: np.ndarray
+    """
+    if shock is None:
+        return rate
+    kind, value = shock
+    if kind == "mul":
+        rate = rate * value
+    elif kind == "add":
+        rate = rate + value
+    else:
+        raise ValueError("unknown shock kind {}".format(kind))
+    return np.clip(rate, 0, 1)
+
+
+def safe_div(x, y):
+    """
+    逐项相除，除数为0的格子（保险期间外）取0
+    """
+    return np.divide(x, y, out=np.zeros(np.broadcast(x, y).shape), where=(y != 0))
+
+
+class BatchPricing(object):
+    """
+    批量定价模块，一次计算多个model points的保费
+    """
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm):
+        """
+        给定险种代码与model points数组，标量会被广播
+
+        Example:
+
+        >>> bp = BatchPricing(10513002, np.arange(0, 71), 0, 10, 50)
+        >>> bp.gp()
+
+        :param int plan_id: 险种代码
+        :param iss_age: 投保年龄
+        :param sex: 性别，0为男性，1为女性
+        :param payterm: 缴费期间
+        :param insterm: 保险期间，"105@"表示保至105岁
+        """
+        self.plan_id = plan_id
+        self.pricing = pc.PricingOd(plan_id)
+        iss_age = np.atleast_1d(np.asarray(iss_age, dtype='int64'))
+        if isinstance(insterm, str) and insterm == "105@":
+            insterm = 106 - iss_age
+        arrays = np.broadcast_arrays(iss_age, np.asarray(sex, dtype='int64'),
+                                     np.asarray(payterm, dtype='int64'), np.asarray(insterm, dtype='int64'))
+        self.iss_age, self.sex, self.payterm, self.insterm = [x.copy() for x in arrays]
+
+    IntRate = pc.PricingOd.IntRate
+    IntRate_CV = pc.PricingOd.IntRate_CV
+    load_tbl_name = pc.PricingOd.load_tbl_name
+    mat = pc.PricingOd.mat
+
+    @classmethod
+    def from_grid(cls, plan_id, ages, sexes, payterms, insterm):
+        """
+        生成年龄、性别、缴费期间的全组合，用于费率表
+
+        :param int plan_id: 险种代码
+        :param ages: 投保年龄列表
+        :param sexes: 性别列表
+        :param payterms: 缴费期间列表
+        :param insterm: 保险期间
+        :rtype: BatchPricing
+        """
+        age, sex, payterm = np.meshgrid(ages, sexes, payterms, indexing='ij')
+        return cls(plan_id, age.ravel(), sex.ravel(), payterm.ravel(), insterm)
+
+    def __len__(self):
+        return len(self.iss_age)
+
+    @memo.node("pricing")
+    def ben_list(self):
+        return self.pricing.ben_list()
+
+    @memo.node("insterm")
+    def mp_polyr(self):
+        """
+        :return: 保单年度行向量，从1开始
+        :rtype: np.ndarray
+        """
+        return np.arange(1, self.insterm.max() + 1, dtype='int64')[None, :]
+
+    @memo.node("iss_age")
+    def mp_age(self):
+        """
+        :return: 到达年龄矩阵
+        :rtype: np.ndarray
+        """
+        return self.iss_age[:, None] + self.mp_polyr() - 1
+
+    @memo.node("insterm")
+    def mp_valid(self):
+        """
+        :return: 保险期间内为True的掩码矩阵
+        :rtype: np.ndarray
+        """
+        return self.mp_polyr() <= self.insterm[:, None]
+
+    @memo.node("sex")
+    def mp_sex(self):
+        """
+        BatchStat、BatchGaap经由以下节点读取定价对象的model point属性，属性修改后依赖的节点重新计算
+
+        :return: 性别数组
+        :rtype: np.ndarray
+        """
+        return self.sex.view()
+
+    @memo.node("payterm")
+    def mp_payterm(self):
+        return self.payterm.view()
+
+    @memo.node("insterm")
+    def mp_insterm(self):
+        return self.insterm.view()
+
+    @memo.node("mat")
+    def mp_mat(self):
+        return self.mat
+
+    def get_qx_mat(self, tbl_name, sex):
+        """
+        按性别、投保年龄与保单年度从（选择-终极）发生率表中取值
+
+        :param str tbl_name: 发生率表名
+        :param sex: 性别数组
+        :return: 发生率矩阵
+        :rtype: np.ndarray
+        """
+        tbl = [tm.ReadTable.get_select_table(tbl_name, x) for x in (0, 1)]
+        t = self.mp_polyr() - 1
+        valid = self.mp_valid()
+        iss_age = self.mp_age()[:, :1]
+        qx = np.where(sex[:, None] == 0, tbl[0].lookup(iss_age, t), tbl[1].lookup(iss_age, t))
+        if np.isnan(qx[valid]).any():
+            raise ValueError("age out of range in {}".format(tbl_name))
+        qx[~valid] = 0
+        return qx
+
+    @memo.node("sex")
+    def adj_qx_list(self, ben):
+        """
+        与PricingOd.adj_qx_list一致
+
+        :param ben: 调整发生率的责任
+        :return: 发生率矩阵
+        :rtype: np.ndarray
+        """
+        if (ben.BEN_TYPE == "ann") or (ben.BEN_TYPE == "endow"):
+            return np.zeros(self.mp_valid().shape)
+        qx = self.get_qx_mat(ben.get_qx_tbl_name(), self.sex)
+        adj = dc.KERNEL.adj_tbl_name(ben, self.ben_list())
+        if adj is not None:
+            qx = qx * (1 - self.get_qx_mat(adj, self.sex))
+        return qx
+
+    @memo.node()
+    def mp_qx_ben_list(self, ben):
+        try:
+            qx = [self.adj_qx_list(x) for x in ben]
+        except TypeError:
+            qx = self.adj_qx_list(ben)
+        return qx
+
+    @memo.node()
+    def mp_lx_eop(self):
+        if [x for x in self.ben_list() if x.BEN_TYPE == "death"].__len__() != 1:
+            raise NotImplementedError("death benifit number error")
+        qx = self.mp_qx_ben_list(self.ben_list())
+        return dc.KERNEL.project(np.stack(qx, axis=1)).lx_eop
+
+    @memo.node()
+    def mp_lx_bop(self):
+        lx = np.roll(self.mp_lx_eop(), 1, axis=1)
+        lx[:, 0] = 1
+        return lx
+
+    def _dx(self, int_rate, phase):
+        adj = {
+            "boy": 1,
+            "moy": 0.5,
+            "eoy": 0
+        }
+        v = (1 + int_rate) ** -(self.mp_polyr() - adj[phase])
+        return self.mp_lx_bop() * v * self.mp_valid()
+
+    @memo.node("IntRate")
+    def mp_dx(self, phase="moy"):
+        return self._dx(self.IntRate, phase)
+
+    @memo.node("IntRate")
+    def mp_cx(self, ben):
+        if ben.BEN_TYPE == "ann":
+            cx = self.mp_lx_eop() * (1 + self.IntRate) ** -self.mp_polyr() * self.mp_valid()
+        else:
+            cx = self.mp_dx("moy") * self.mp_qx_ben_list(ben)
+        return cx
+
+    def _ben_sa(self, rule):
+        sa = rule(self.insterm[:, None], self.payterm[:, None], self.mp_age(), self.mp_polyr(), self.mat)
+        return sa * self.mp_valid()
+
+    @memo.node("insterm", "payterm", "mat")
+    def mp_ben_fix(self, ben):
+        return self._ben_sa(br.get_fix_rule(ben))
+
+    @memo.node("insterm", "payterm", "mat")
+    def mp_ben_prem(self, ben):
+        return self._ben_sa(br.get_prem_rule(ben))
+
+    @memo.node("payterm", "load_tbl_name")
+    def mp_ld(self):
+        """
+        :return: loading矩阵，超出loading表的年度为0
+        :rtype: np.ndarray
+        """
+        ld = np.zeros(self.mp_valid().shape)
+        for pt in np.unique(self.payterm):
+            load = tm.ReadTable.get_load_array(self.load_tbl_name + ".csv", pt)[:ld.shape[1]]
+            ld[self.payterm == pt, :len(load)] = load
+        return ld
+
+    @memo.node("payterm")
+    def mp_prem_ind(self):
+        """
+        :return: 缴费期内为1的矩阵
+        :rtype: np.ndarray
+        """
+        return (self.mp_polyr() <= self.payterm[:, None]).astype('float64')
+
+    @memo.node()
+    def mp_netp(self):
+        return (self.mp_prem_ind() - self.mp_ld()) * self.mp_dx("boy")
+
+    @memo.node()
+    def gp(self):
+        """
+        普通险保费计算公式，与PricingOd.gp一致
+        :return: 每个model point标准SA对应的保费,取2位小数
+        :rtype: np.ndarray
+        """
+        fix = 0
+        prem = 0
+        for ben in self.ben_list():
+            cx = self.mp_cx(ben)
+            fix = fix + (cx * self.mp_ben_fix(ben)).sum(axis=1)
+            prem = prem + (cx * self.mp_ben_prem(ben)).sum(axis=1)
+        return np.round(fix / (self.mp_netp().sum(axis=1) - prem), 2)
+
+    @memo.node("IntRate_CV")
+    def mp_dx_cv(self, phase="moy"):
+        return self._dx(self.IntRate_CV, phase)
+
+    @memo.node()
+    def mp_cx_cv(self, ben):
+        return self.mp_dx_cv() * self.mp_qx_ben_list(ben)
+
+    @memo.node()
+    def mp_netp_cv(self):
+        return (self.mp_prem_ind() - self.mp_ld()) * self.mp_dx_cv("boy")
+
+    @memo.node()
+    def apv_ben_fix_cv(self):
+        fix = 0
+        for ben in self.ben_list():
+            fix = fix + self.mp_cx_cv(ben) * self.mp_ben_fix(ben)
+        return fix
+
+    @memo.node()
+    def apv_ben_prem_cv(self):
+        """
+        :return: 每单位保费的保费相关赔付现值
+        :rtype: np.ndarray
+        """
+        prem = 0
+        for ben in self.ben_list():
+            prem = prem + self.mp_cx_cv(ben) * self.mp_ben_prem(ben)
+        return prem
+
+    @memo.node()
+    def apv_ben_total_cv(self):
+        return self.apv_ben_fix_cv() + self.gp()[:, None] * self.apv_ben_prem_cv()
+
+    @memo.node()
+    def gp_cv(self):
+        return self.apv_ben_total_cv().sum(axis=1) / self.mp_netp_cv().sum(axis=1)
+
+    def _pvr(self, apv, gp_cv):
+        pvr = apv - gp_cv[:, None] * self.mp_netp_cv()
+        return roll_left(safe_div(rev_cumsum(pvr), self.mp_dx_cv("boy")), self.insterm)
+
+    @memo.node()
+    def pvr(self):
+        return self._pvr(self.apv_ben_total_cv(), self.gp_cv())
+
+    def _cv(self, pvr):
+        k = 0.8
+        r = np.fmin(k + self.mp_polyr() * (1 - k) / np.fmin(20, self.payterm[:, None]), 1)
+        return pvr * r
+
+    @memo.node("payterm")
+    def cv(self):
+        """
+        现金价值，与PricingOd.cv一致
+        :return: 现金价值矩阵
+        :rtype: np.ndarray
+        """
+        return self._cv(self.pvr())
+
+    def cv_at(self, gp):
+        """
+        以给定保费计算现金价值，保费无关的部分取缓存
+
+        :param np.ndarray gp: 各model point的保费
+        :return: 现金价值矩阵
+        :rtype: np.ndarray
+        """
+        apv = self.apv_ben_fix_cv() + np.asarray(gp, dtype='float64')[:, None] * self.apv_ben_prem_cv()
+        return self._cv(self._pvr(apv, apv.sum(axis=1) / self.mp_netp_cv().sum(axis=1)))
+
+    pass
+
+
+class BatchStat(object):
+    """
+    批量法定准备金模块，与Stat逐项一致，定价部分使用BatchPricing
+    """
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm):
+        """
+        参数同BatchPricing
+
+        Example:
+
+        >>> bs = BatchStat(10513002, [30, 40], [0, 1], 10, 50)
+        >>> bs.stat()
+        """
+        self.plan_id = plan_id
+        self.pricing = BatchPricing(plan_id, iss_age, sex, payterm, insterm)
+
+    IntRate = st.Stat.IntRate
+    method = st.Stat.method
+    qx_shock = None
+    # 评估发生率冲击，见apply_shock，不影响定价部分
+
+    def __len__(self):
+        return len(self.pricing)
+
+    def ben_list(self):
+        return self.pricing.ben_list()
+
+    @memo.node("pricing", "qx_shock")
+    def adj_qx_list(self, ben):
+        """
+        与Stat.adj_qx_list一致，扣除表见DecrementKernel.adj_tbl_name
+        """
+        sex = self.pricing.mp_sex()
+        qx = self.pricing.get_qx_mat(ben.get_qx_tbl_name(), sex)
+        adj = dc.KERNEL.adj_tbl_name(ben, self.ben_list())
+        if adj is not None:
+            qx = qx * (1 - self.pricing.get_qx_mat(adj, sex))
+        return apply_shock(qx, self.qx_shock) * self.pricing.mp_valid()
+
+    @memo.node()
+    def mp_lx_eop(self):
+        if [x for x in self.ben_list() if x.BEN_TYPE == "death"].__len__() != 1:
+            raise NotImplementedError("death benifit number error")
+        qx = [self.adj_qx_list(x) for x in self.ben_list()]
+        return dc.KERNEL.project(np.stack(qx, axis=1)).lx_eop
+
+    @memo.node()
+    def mp_lx_bop(self):
+        lx = np.roll(self.mp_lx_eop(), 1, axis=1)
+        lx[:, 0] = 1
+        return lx
+
+    @memo.node("IntRate", "pricing")
+    def mp_dx(self, phase="moy"):
+        adj = {
+            "boy": 1,
+            "moy": 0.5,
+            "eoy": 0
+        }
+        v = (1 + self.IntRate) ** -(self.pricing.mp_polyr() - adj[phase])
+        return self.mp_lx_bop() * v * self.pricing.mp_valid()
+
+    @memo.node()
+    def mp_cx_ben(self, ben, phase="moy"):
+        return self.mp_dx(phase) * self.adj_qx_list(ben)
+
+    @memo.node("pricing")
+    def apv_ben_fix(self):
+        fix = 0
+        for ben in self.ben_list():
+            fix = fix + self.mp_cx_ben(ben) * self.pricing.mp_ben_fix(ben)
+        return fix
+
+    @memo.node("pricing")
+    def apv_ben_prem(self):
+        """
+        :return: 每单位保费的保费相关赔付现值
+        :rtype: np.ndarray
+        """
+        prem = 0
+        for ben in self.ben_list():
+            prem = prem + self.mp_cx_ben(ben) * self.pricing.mp_ben_prem(ben)
+        return prem
+
+    @memo.node("pricing")
+    def apv_ben_total(self):
+        return self.apv_ben_fix() + self.pricing.gp()[:, None] * self.apv_ben_prem()
+
+    @memo.node("pricing")
+    def mp_p(self):
+        return self.pricing.mp_prem_ind() * self.mp_dx("boy")
+
+    def _trnp(self, apv):
+        trnp = np.zeros(apv.shape)
+        if self.method == "FPT":
+            trnp[:, 0] = apv[:, 0]
+            renewal = (apv.sum(axis=1) - apv[:, 0]) / (self.mp_p().sum(axis=1) - 1)
+            polyr = self.pricing.mp_polyr()
+            mask = (polyr > 1) & (polyr <= self.pricing.mp_payterm()[:, None])
+            trnp = np.where(mask, renewal[:, None], trnp)
+        return trnp
+
+    @memo.node("method", "pricing")
+    def trnp(self):
+        """
+        一年期完全修正净保费
+        :return: TRNP矩阵
+        :rtype: np.ndarray
+        """
+        return self._trnp(self.apv_ben_total())
+
+    def _adj_rsv(self, apv, trnp):
+        res = apv - trnp * self.mp_dx("boy")
+        res = safe_div(rev_cumsum(res), self.mp_dx("boy"))
+        return roll_left(res, self.pricing.mp_insterm())
+
+    @memo.node("pricing")
+    def adj_rsv(self):
+        return self._adj_rsv(self.apv_ben_total(), self.trnp())
+
+    def _prem_rsv(self, trnp, gp):
+        res = np.fmax(trnp - gp[:, None], 0) * rev_cumsum(self.mp_p())
+        res[:, 0] = 0
+        res = roll_left(res, self.pricing.mp_insterm())
+        return safe_div(res, self.mp_dx("eoy"))
+
+    @memo.node("pricing")
+    def prem_rsv(self):
+        return self._prem_rsv(self.trnp(), self.pricing.gp())
+
+    @memo.node("pricing")
+    def stat(self):
+        """
+        法定准备金，与Stat.stat一致
+        :return: 每千元保额的准备金矩阵
+        :rtype: np.ndarray
+        """
+        return np.fmax(self.adj_rsv() + self.prem_rsv(), self.pricing.cv())
+
+    def stat_at(self, gp):
+        """
+        以给定保费计算法定准备金（现金价值同样按该保费计算），保费无关的部分取缓存
+
+        :param np.ndarray gp: 各model point的保费
+        :return: 每千元保额的准备金矩阵
+        :rtype: np.ndarray
+        """
+        gp = np.asarray(gp, dtype='float64')
+        apv = self.apv_ben_fix() + gp[:, None] * self.apv_ben_prem()
+        trnp = self._trnp(apv)
+        return np.fmax(self._adj_rsv(apv, trnp) + self._prem_rsv(trnp, gp), self.pricing.cv_at(gp))
+
+    pass
+
+
+class BatchGaap(object):
+    """
+    批量GAAP月度现金流模块，矩阵为 (保单 × 保单月度)，月度发生率按(表, 性别)预先计算并缓存
+
+    与Gaap的区别：保费与赔付均按保单保额 sa / Gaap.sa 缩放
+    """
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm, sa=None):
+        """
+        参数同BatchPricing
+
+        Example:
+
+        >>> bg = BatchGaap(10513002, np.arange(20, 50), 0, 10, 50)
+        >>> bg.mp_prem()
+
+        :param sa: 保单保额，默认为Gaap.SA
+        """
+        self.plan_id = plan_id
+        self.pricing = BatchPricing(plan_id, iss_age, sex, payterm, insterm)
+        sa = ga.Gaap.SA if sa is None else sa
+        self.sa = np.broadcast_to(np.asarray(sa, dtype='float64'), self.pricing.iss_age.shape).copy()
+
+    lapse_tbl_name = ga.Gaap.lapse_tbl_name
+    sa_unit = ga.Gaap.sa
+    qx_shock = None
+    lapse_shock = None
+    # 年度发生率与退保率的冲击，见apply_shock
+
+    def __len__(self):
+        return len(self.pricing)
+
+    def ben_list(self):
+        return self.pricing.ben_list()
+
+    @memo.node("pricing")
+    def mp_mth(self):
+        """
+        :return: 保单月度行向量，从0开始
+        :rtype: np.ndarray
+        """
+        return np.arange(12 * self.pricing.mp_insterm().max(), dtype='int64')[None, :]
+
+    @memo.node()
+    def mp_polyr(self):
+        return self.mp_mth() // 12 + 1
+
+    @memo.node("pricing")
+    def mp_age(self):
+        return self.pricing.mp_age()[:, :1] + self.mp_mth() // 12
+
+    @memo.node("pricing")
+    def mp_valid(self):
+        return self.mp_mth() < 12 * self.pricing.mp_insterm()[:, None]
+
+    @memo.node("sa", "sa_unit")
+    def mp_scale(self):
+        """
+        :return: 保额缩放列向量
+        :rtype: np.ndarray
+        """
+        return (self.sa / self.sa_unit)[:, None]
+
+    def get_qx_mat(self, tbl_name, adj_tbl_name=None):
+        """
+        按性别与到达年龄从月度发生率表中取值
+
+        :param str tbl_name: 发生率表名
+        :param str adj_tbl_name: 扣除表名
+        :return: 月度发生率矩阵
+        :rtype: np.ndarray
+        """
+        tbl = [tm.ReadTable.get_monthly_mort_array(tbl_name, x, adj_tbl_name) for x in (0, 1)]
+        n = min(len(x) for x in tbl)
+        tbl = np.vstack([x[:n] for x in tbl])
+        age = self.mp_age()
+        valid = self.mp_valid()
+        qx = tbl[self.pricing.mp_sex()[:, None], np.minimum(age, n - 1)]
+        qx[age >= n] = np.nan
+        if np.isnan(qx[valid]).any():
+            raise ValueError("age out of range in {}".format(tbl_name))
+        qx[~valid] = 0
+        return qx
+
+    @memo.node("qx_shock")
+    def adj_qx_list(self, ben):
+        """
+        与Gaap.adj_qx_list一致，扣除表见DecrementKernel.adj_tbl_name
+        """
+        tbl_name = ben.get_qx_tbl_name()
+        qx = self.get_qx_mat(tbl_name, dc.KERNEL.adj_tbl_name(ben, self.ben_list()))
+        if self.qx_shock is not None:
+            qx = ga.Gaap.ytom(apply_shock(1 - (1 - qx) ** 12, self.qx_shock))
+        return qx * self.mp_valid()
+
+    @memo.node("lapse_tbl_name", "lapse_shock", "pricing")
+    def mp_lapse(self):
+        """
+        :return: 月度退保率矩阵
+        :rtype: np.ndarray
+        """
+        lap = np.zeros(self.mp_valid().shape)
+        payterm = self.pricing.mp_payterm()
+        for pt in np.unique(payterm):
+            lapse = tm.ReadTable.get_lapse_array(self.lapse_tbl_name + ".csv", pt)
+            lapse = ga.Gaap.ytom(np.repeat(apply_shock(lapse, self.lapse_shock), 12))
+            lapse = lapse[:lap.shape[1]]
+            lap[payterm == pt, :len(lapse)] = lapse
+        return lap * self.mp_valid()
+
+    @memo.node()
+    def mp_lx_eop(self):
+        if [x for x in self.ben_list() if x.BEN_TYPE == "death"].__len__() != 1:
+            raise NotImplementedError("death benifit number error")
+        qx = [self.adj_qx_list(x) for x in self.ben_list()]
+        rates = np.stack(qx + [self.mp_lapse()], axis=1)
+        return dc.KERNEL.project(rates, groups=[0] * len(qx) + [1]).lx_eop
+
+    @memo.node()
+    def mp_lx_bop(self):
+        lx = np.roll(self.mp_lx_eop(), 1, axis=1)
+        lx[:, 0] = 1
+        return lx * self.mp_valid()
+
+    @memo.node("pricing")
+    def mp_prem(self):
+        """
+        每个保单年度首月收取年缴保费
+        :return: 保费现金流矩阵
+        :rtype: np.ndarray
+        """
+        mth = self.mp_mth()
+        prem = (mth % 12 == 0) & (self.mp_polyr() <= self.pricing.mp_payterm()[:, None])
+        return prem * self.pricing.gp()[:, None] * self.mp_scale() * self.mp_lx_bop()
+
+    @memo.node("pricing")
+    def mp_ben_fix(self, ben):
+        """
+        :param ben: 责任
+        :return: 未贴现的赔付现金流矩阵
+        :rtype: np.ndarray
+        """
+        rule = br.get_fix_rule(ben)
+        ben_fix = rule(self.pricing.mp_insterm()[:, None], self.pricing.mp_payterm()[:, None],
+                       self.mp_age(), self.mp_polyr(), self.pricing.mp_mat())
+        return self.adj_qx_list(ben) * self.mp_lx_bop() * ben_fix * self.mp_scale()
+
+    pass
+
+
+if __name__ == '__main__':
+    a = BatchPricing.from_grid(10513002, np.arange(0, 51), [0, 1], [1, 5, 10], 50)
+    print(a.gp())
@@ -0,0 +1,211 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the benchmark suite for pricing, statutory and GAAP hot paths
+
+including
+..py:func:: run 运行基准测试
+..py:func:: compare 比较两次基准测试结果
+
+对list_plan_benifit.csv中的每个险种，分别计时单点（PricingOd / Stat / Gaap对象）与批量（Batch*）计算，
+记录耗时、实际解析csv次数、tracemalloc峰值内存，结果保存为json以便不同commit之间比较
+
+Example:
+
+python -m core.bench --out bench.json
+python -m core.bench --out bench_new.json --compare bench.json
+
+
+"""
+
+
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tracemalloc
+import numpy as np
+import core.tbl_manage as tm
+import core.pricing as pc
+import core.stat as st
+import core.gaap as ga
+import core.batch as bt
+
+
+CASES = ("PricingOd.gp", "PricingOd.cv", "Stat.stat", "Gaap.mp_ben_fix")
+BATCH_SIZES = (1, 1000, 100000)
+SINGLE_SIZES = BATCH_SIZES
+# 单点与批量使用相同规模以便直接比较；单点100000个model points耗时较长，可用--single-sizes缩小
+CHUNK = 10000
+# 批量计算的分块大小，控制(保单 × 月度)矩阵的内存
+INSTERM = 50
+PAYTERMS = (1, 5, 10)
+# loading表与lapse表共有的缴费期间
+
+
+def model_points(n, seed=0):
+    """
+    生成随机model points
+
+    :param int n: 个数
+    :param int seed: 随机种子
+    :return: iss_age, sex, payterm
+    :rtype: tuple
+    """
+    rng = np.random.RandomState(seed)
+    return rng.randint(0, 56, n), rng.randint(0, 2, n), rng.choice(PAYTERMS, n)
+
+
+def _single(plan_id, case, iss_age, sex, payterm):
+    for age, s, pt in zip(iss_age.tolist(), sex.tolist(), payterm.tolist()):
+        if case.startswith("PricingOd"):
+            obj = pc.PricingOd(plan_id)
+            pricing = obj
+        elif case.startswith("Stat"):
+            obj = st.Stat(plan_id)
+            pricing = obj.pricing
+        else:
+            obj = ga.Gaap(plan_id, "MONTH")
+            obj.IssAge = age
+            obj.insterm = INSTERM
+            pricing = obj.pricing
+        obj.sex, obj.payterm = s, pt
+        pricing.IssAge, pricing.sex, pricing.payterm, pricing.insterm = age, s, pt, INSTERM
+        if case == "PricingOd.gp":
+            obj.gp()
+        elif case == "PricingOd.cv":
+            obj.cv()
+        elif case == "Stat.stat":
+            obj.stat()
+        else:
+            [obj.mp_ben_fix(x) for x in obj.ben_list()]
+
+
+def _batch(plan_id, case, iss_age, sex, payterm):
+    for i in range(0, len(iss_age), CHUNK):
+        args = (plan_id, iss_age[i:i + CHUNK], sex[i:i + CHUNK], payterm[i:i + CHUNK], INSTERM)
+        if case == "PricingOd.gp":
+            bt.BatchPricing(*args).gp()
+        elif case == "PricingOd.cv":
+            bt.BatchPricing(*args).cv()
+        elif case == "Stat.stat":
+            bt.BatchStat(*args).stat()
+        else:
+            obj = bt.BatchGaap(*args)
+            [obj.mp_ben_fix(x) for x in obj.ben_list()]
+
+
+def measure(func, memory=True):
+    """
+    冷缓存下计时，并另行运行一次记录tracemalloc峰值
+
+    :param func: 无参函数
+    :param bool memory: 是否记录内存
+    :return: 计量结果
+    :rtype: dict
+    """
+    tm.ReadTable.clear_cache()
+    reads = tm.ReadTable.read_count
+    start = time.perf_counter()
+    func()
+    out = {
+        "seconds": time.perf_counter() - start,
+        "csv_reads": tm.ReadTable.read_count - reads
+    }
+    if memory:
+        tm.ReadTable.clear_cache()
+        tracemalloc.start()
+        try:
+            func()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        out["alloc_net_bytes"] = current
+        out["alloc_peak_bytes"] = peak
+    return out
+
+
+def run(plan_ids=None, cases=CASES, single_sizes=SINGLE_SIZES, batch_sizes=BATCH_SIZES, memory=True):
+    """
+    运行基准测试，计算失败的组合记录错误信息后继续
+
+    :param plan_ids: 险种代码，默认为list_plan_benifit.csv中的全部险种
+    :return: 基准测试结果
+    :rtype: dict
+    """
+    if plan_ids is None:
+        plan_ids = sorted(set(tm.ReadTable.get_plan_table()['plan_id'].tolist()))
+    results = []
+    for plan_id in plan_ids:
+        for case in cases:
+            for mode, sizes, func in (("single", single_sizes, _single), ("batch", batch_sizes, _batch)):
+                for size in sizes:
+                    mp = model_points(size)
+                    row = {"plan_id": plan_id, "case": case, "mode": mode, "size": size}
+                    try:
+                        row.update(measure(lambda: func(plan_id, case, *mp), memory))
+                        row["per_policy_us"] = row["seconds"] / size * 1e6
+                    except Exception as e:
+                        row["error"] = "{}: {}".format(type(e).__name__, e)
+                    results.append(row)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": tm.pd.__version__,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results
+    }
+
+
+def _key(row):
+    return row["plan_id"], row["case"], row["mode"], row["size"]
+
+
+def compare(old, new):
+    """
+    比较两次结果的耗时
+
+    :param dict old: 基准结果
+    :param dict new: 新结果
+    :return: (组合, 原耗时, 新耗时, 新/原) 的列表
+    :rtype: list
+    """
+    base = dict((_key(x), x) for x in old["results"] if "seconds" in x)
+    out = []
+    for row in new["results"]:
+        if "seconds" in row and _key(row) in base:
+            before = base[_key(row)]["seconds"]
+            out.append((_key(row), before, row["seconds"], row["seconds"] / before if before else float("inf")))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PyRes benchmark")
+    parser.add_argument("--out", default="bench.json")
+    parser.add_argument("--compare", help="与之比较的基准结果json")
+    parser.add_argument("--plan", type=int, action="append", help="险种代码，可重复")
+    parser.add_argument("--single-sizes", type=int, nargs="*", default=list(SINGLE_SIZES),
+                        help="单点计算的model points个数，默认与批量相同")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=list(BATCH_SIZES))
+    parser.add_argument("--no-memory", action="store_true")
+    args = parser.parse_args(argv)
+    res = run(args.plan, CASES, args.single_sizes, args.batch_sizes, not args.no_memory)
+    with open(args.out, "w") as f:
+        json.dump(res, f, indent=1)
+    for row in res["results"]:
+        if "error" in row:
+            print("{plan_id} {case:<16} {mode:<6} {size:>7}  {error}".format(**row))
+        else:
+            print("{plan_id} {case:<16} {mode:<6} {size:>7}  {seconds:9.4f}s  {csv_reads:3d} reads".format(**row))
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        for key, before, after, ratio in compare(old, res):
+            print("{} {:<16} {:<6} {:>7}  {:9.4f}s -> {:9.4f}s  x{:.2f}".format(*(key + (before, after, ratio))))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
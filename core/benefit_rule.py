@@ -0,0 +1,125 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the vectorized sum assured rules of benefits
+
+including
+..py:data:: SA_FIX_RULES 固定保额规则
+..py:data:: SA_PREM_RULES 保费相关保额规则
+..py:func:: get_fix_rule 获取责任的固定保额规则
+..py:func:: get_prem_rule 获取责任的保费相关保额规则
+
+规则均为 rule(nb, np_, age, polyr, mat) 形式的函数，参数可为任意形状的数组，
+按numpy规则广播，返回float64数组，与Benefit.get_ben_sa_fix / get_ben_sa_p逐项一致
+
+
+"""
+
+
+import numpy as np
+
+
+def _in_force(age, mat):
+    return (age < mat) & (age >= 0)
+
+
+def _shape(nb, np_, age, polyr, mat):
+    return np.broadcast(np.asarray(age), np.asarray(polyr), np.asarray(np_)).shape
+
+
+def sa_zero(nb, np_, age, polyr, mat):
+    """
+    uid(0), 无赔付
+    """
+    return np.zeros(_shape(nb, np_, age, polyr, mat))
+
+
+def sa_fix_1000(nb, np_, age, polyr, mat):
+    """
+    uid(1), sa = 1000
+    """
+    ben = np.where(_in_force(age, mat), 1000., 0.)
+    return np.broadcast_to(ben, _shape(nb, np_, age, polyr, mat)).copy()
+
+
+def sa_ann_2(nb, np_, age, polyr, mat):
+    """
+    uid(2), 年金给付，第3保单年度300，59岁600，60岁至满期前一年200，前两年及满期前一年起为0，其余100
+    """
+    age = np.asarray(age)
+    polyr = np.asarray(polyr)
+    cond = [polyr == 3,
+            age == 59,
+            (age < (mat - 1)) & (age > 59),
+            (polyr <= 2) | (age >= (mat - 1))]
+    ben = np.select(cond, [300., 600., 200., 0.], 100.)
+    return np.broadcast_to(ben, _shape(nb, np_, age, polyr, mat)).copy()
+
+
+def sa_prem_paid(nb, np_, age, polyr, mat):
+    """
+    uid_p(1), sa = prem payed
+    """
+    return np.where(_in_force(age, mat), np.minimum(np_, polyr), 0).astype('float64')
+
+
+def sa_prem_paid_105(nb, np_, age, polyr, mat):
+    """
+    uid_p(2), sa = 1.05 * prem payed
+    """
+    return np.where(_in_force(age, mat), 1.05 * np.minimum(np_, polyr), 0.)
+
+
+SA_FIX_RULES = {
+    # Benefit.get_ben_sa_fix按uid_p取值
+    "default": {
+        0: sa_zero,
+        1: sa_fix_1000,
+        2: sa_zero,
+        # uid_p(2)只有保费返还，没有固定保额
+    },
+    # Ann.get_ben_sa_fix按uid_f取值
+    "ann": {
+        2: sa_ann_2,
+    },
+}
+
+SA_PREM_RULES = {
+    0: sa_zero,
+    1: sa_prem_paid,
+    2: sa_prem_paid_105,
+}
+
+
+def get_fix_rule(ben):
+    """
+    获取责任的固定保额规则，未定义的uid抛出NotImplementedError，不按0处理
+
+    Example:
+    >>> get_fix_rule(Db(1, 0, 1))(50, 10, np.arange(30, 80), np.arange(1, 51), 80)
+
+    :param ben: Benefit类
+    :return: 向量化的保额函数
+    """
+    if getattr(ben, "BEN_TYPE", None) == "ann":
+        try:
+            return SA_FIX_RULES["ann"][ben.uid_f]
+        except KeyError:
+            raise NotImplementedError("annuity uid_f {} not defined".format(ben.uid_f))
+    try:
+        return SA_FIX_RULES["default"][ben.uid_p]
+    except KeyError:
+        raise NotImplementedError("fixed sa uid_p {} not defined".format(ben.uid_p))
+
+
+def get_prem_rule(ben):
+    """
+    获取责任的保费相关保额规则，未定义的uid_p抛出NotImplementedError，不按0处理
+
+    :param ben: Benefit类
+    :return: 向量化的保额函数
+    """
+    try:
+        return SA_PREM_RULES[ben.uid_p]
+    except KeyError:
+        raise NotImplementedError("premium sa uid_p {} not defined".format(ben.uid_p))
@@ -0,0 +1,257 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the streaming GAAP cashflow projection
+
+including
+..py:func:: project_chunk 计算一组同险种保单的月度现金流
+..py:func:: read_shards 读取npy分片中的一列
+..py:class:: CashflowWriter 现金流分片写出
+..py:class:: CashflowAggregator 按险种与日历月汇总
+..py:class:: CashflowProjector 流式现金流计算
+
+保单文件由ingest.PolicyStream分块读取与校验，每个计算单元用BatchGaap计算 (保单 × 保单月度) 的 lx_bop、保费、赔付，
+写出后即释放，内存占用只与块大小有关，与保单总数无关；
+输出为 policy_id, month, lx_bop, prem, ben 的长表，每块一个分片：
+npy格式每列一个文件 part-00000.prem.npy，parquet格式（需要pyarrow）每块一个 part-00000.parquet
+
+
+"""
+
+
+import os
+import sys
+import glob
+import time
+import numpy as np
+import core.tbl_manage as tm
+import core.batch as bt
+import core.ingest as ig
+
+
+CF_COLUMNS = ["policy_id", "month", "lx_bop", "prem", "ben"]
+# month 为保单月度，从0开始
+ISSUE_COLUMN = "issue_month"
+# 可选列，签单年月 yyyymm，有该列时汇总按日历月
+
+
+def project_chunk(plan_id, iss_age, sex, payterm, insterm, sa):
+    """
+    计算一组同险种保单的月度现金流，赔付为各责任之和
+
+    :return: lx_bop, prem, ben，均为 (保单 × 保单月度)；保单月度有效标志
+    :rtype: tuple
+    """
+    bg = bt.BatchGaap(plan_id, iss_age, sex, payterm, insterm, sa)
+    ben = sum(bg.mp_ben_fix(x) for x in bg.ben_list())
+    return bg.mp_lx_bop(), bg.mp_prem(), ben, bg.mp_valid()
+
+
+def read_shards(directory, column):
+    """
+    按分片顺序读取npy输出中的一列，各分片为内存映射
+
+    :param str directory: 输出目录
+    :param str column: 列名，见CF_COLUMNS
+    :return: 各分片数组的列表
+    :rtype: list
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "part-*.{}.npy".format(column))))
+    return [np.load(x, mmap_mode="r") for x in paths]
+
+
+class CashflowWriter(object):
+    """
+    现金流分片写出，每次write写一个分片
+    """
+    FORMATS = ("npy", "parquet")
+
+    def __init__(self, directory, fmt="npy"):
+        """
+
+        :param str directory: 输出目录，不存在时创建，已有的分片（上次写出的结果）会被删除
+        :param str fmt: "npy" 或 "parquet"
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError("unknown format {}".format(fmt))
+        if fmt == "parquet":
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError("parquet output requires pyarrow, use fmt='npy' instead")
+        self.directory = directory
+        self.fmt = fmt
+        self.shards = 0
+        self.rows = 0
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for path in glob.glob(os.path.join(directory, "part-*.npy")) + \
+                glob.glob(os.path.join(directory, "part-*.parquet")):
+            os.remove(path)
+        # 分片数可能少于上次，残留的分片会被read_shards一并读入
+
+    def write(self, policy_id, lx_bop, prem, ben, valid):
+        """
+        以长表格式写出一块保单的有效月度现金流
+
+        :param np.ndarray policy_id: 保单号
+        """
+        rows, month = np.nonzero(valid)
+        cols = {
+            "policy_id": np.asarray(policy_id)[rows],
+            "month": month.astype('int32'),
+            "lx_bop": lx_bop[rows, month],
+            "prem": prem[rows, month],
+            "ben": ben[rows, month]
+        }
+        name = os.path.join(self.directory, "part-{:05d}".format(self.shards))
+        if self.fmt == "npy":
+            for col in CF_COLUMNS:
+                np.save("{}.{}.npy".format(name, col), cols[col])
+        else:
+            tm.pd.DataFrame(cols, columns=CF_COLUMNS).to_parquet(name + ".parquet", index=False)
+        self.shards += 1
+        self.rows += len(rows)
+
+    pass
+
+
+class CashflowAggregator(object):
+    """
+    按险种与月份累加保费与赔付，月份为日历月（有签单年月时）或保单月度
+    """
+    def __init__(self):
+        self.totals = {}
+        # plan_id -> {"start": 起始月, "prem": 数组, "ben": 数组}
+
+    @staticmethod
+    def month_index(issue_month):
+        """
+        :param issue_month: 签单年月 yyyymm
+        :return: 自公元0年1月起的月数
+        :rtype: np.ndarray
+        """
+        issue_month = np.asarray(issue_month, dtype='int64')
+        return issue_month // 100 * 12 + issue_month % 100 - 1
+
+    def add(self, plan_id, prem, ben, issue_month=None):
+        """
+        :param int plan_id: 险种代码
+        :param np.ndarray prem: (保单 × 保单月度) 保费
+        :param np.ndarray ben: (保单 × 保单月度) 赔付
+        :param issue_month: 各保单签单年月，None时按保单月度汇总
+        """
+        n_pol, n_mth = prem.shape
+        start = 0 if issue_month is None else self.month_index(issue_month)
+        month = (np.zeros(n_pol, dtype='int64') + start)[:, None] + np.arange(n_mth)
+        lo = int(month.min())
+        idx = (month - lo).ravel()
+        size = int(idx.max()) + 1
+        prem = np.bincount(idx, weights=prem.ravel(), minlength=size)
+        ben = np.bincount(idx, weights=ben.ravel(), minlength=size)
+        total = self.totals.get(plan_id)
+        if total is None:
+            self.totals[plan_id] = {"start": lo, "prem": prem, "ben": ben}
+            return
+        new_lo = min(lo, total["start"])
+        new_size = max(lo + size, total["start"] + len(total["prem"])) - new_lo
+        for key, value in (("prem", prem), ("ben", ben)):
+            acc = np.zeros(new_size)
+            acc[total["start"] - new_lo:total["start"] - new_lo + len(total[key])] += total[key]
+            acc[lo - new_lo:lo - new_lo + size] += value
+            total[key] = acc
+        total["start"] = new_lo
+
+    def frame(self, calendar=True):
+        """
+        :param bool calendar: 月份是否为日历月
+        :return: 列为 plan_id, month, prem, ben 的汇总表，日历月时month为yyyymm
+        :rtype: tm.pd.DataFrame
+        """
+        frames = []
+        for plan_id, total in sorted(self.totals.items()):
+            month = total["start"] + np.arange(len(total["prem"]))
+            if calendar:
+                month = month // 12 * 100 + month % 12 + 1
+            frames.append(tm.pd.DataFrame({
+                "plan_id": plan_id,
+                "month": month,
+                "prem": total["prem"],
+                "ben": total["ben"]
+            })[["plan_id", "month", "prem", "ben"]])
+        if not frames:
+            return tm.pd.DataFrame(columns=["plan_id", "month", "prem", "ben"])
+        return tm.pd.concat(frames, ignore_index=True)
+
+    pass
+
+
+class CashflowProjector(object):
+    """
+    流式现金流计算：读块、计算、写出、汇总，逐块进行
+    """
+    def __init__(self, chunk_size=5000, read_size=50000):
+        """
+
+        Example:
+
+        >>> CashflowProjector().run("policy.csv", "cf", aggregate=True)
+
+        :param int chunk_size: 每次BatchGaap计算的保单数，决定 (保单 × 月度) 矩阵大小
+        :param int read_size: 每次从保单文件读取的行数
+        """
+        self.chunk_size = chunk_size
+        self.read_size = read_size
+        self.stream = None
+        # 最近一次读取的保单流，未通过校验的保单见stream.reject_frame()
+
+    def iter_cashflows(self, policy_path):
+        """
+        :param str policy_path: 保单文件路径
+        :return: 逐块返回 (plan_id, 保单块, lx_bop, prem, ben, valid)
+        """
+        self.stream = ig.PolicyStream(policy_path, self.read_size, self.chunk_size, extra_columns=[ISSUE_COLUMN])
+        for plan_id, c in self.stream:
+            mp = [c[x].values.astype('int64') for x in ig.MP_COLUMNS]
+            yield (plan_id, c) + project_chunk(plan_id, *(mp + [c["sa"].values]))
+
+    def run(self, policy_path, out_dir=None, aggregate=True, fmt="npy", reject_path=None):
+        """
+        :param str policy_path: 保单文件路径
+        :param str out_dir: 逐单现金流输出目录，None时不写出
+        :param bool aggregate: 是否按险种与月份汇总
+        :param str fmt: 输出格式
+        :param str reject_path: 未通过校验的保单输出路径，None时不输出
+        :return: 保单数、未通过校验的保单数、分片数、行数、耗时与汇总表
+        :rtype: dict
+        """
+        start = time.time()
+        writer = None if out_dir is None else CashflowWriter(out_dir, fmt)
+        agg = CashflowAggregator() if aggregate else None
+        calendar = None
+        n = 0
+        for plan_id, c, lx_bop, prem, ben, valid in self.iter_cashflows(policy_path):
+            n += len(c)
+            if writer is not None:
+                writer.write(c["policy_id"].values, lx_bop, prem, ben, valid)
+            if agg is not None:
+                calendar = ISSUE_COLUMN in c.columns
+                agg.add(plan_id, prem, ben, c[ISSUE_COLUMN].values if calendar else None)
+        if reject_path is not None:
+            self.stream.reject_frame().to_csv(reject_path, index=False)
+        return {
+            "policies": n,
+            "rejected": self.stream.stats["rejected"],
+            "shards": 0 if writer is None else writer.shards,
+            "rows": 0 if writer is None else writer.rows,
+            "seconds": time.time() - start,
+            "aggregate": None if agg is None else agg.frame(bool(calendar))
+        }
+
+    pass
+
+
+if __name__ == '__main__':
+    res = CashflowProjector().run(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print("{policies} policies, {rejected} rejected, {shards} shards, {rows} rows, {seconds:.2f}s".format(**res))
+    print(res["aggregate"])
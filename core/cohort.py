@@ -0,0 +1,137 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the aggregated cohort projection
+
+including
+..py:class:: CohortProjection 按险种与签单年度汇总的准备金与现金流
+
+法定准备金与GAAP现金流均与保额成正比：相同 (险种, 性别, 投保年龄, 缴费期间, 保险期间) 的保单只按单位保额计算一次，
+再以各签单年度的保额合计为权重累加到预先分配的 (险种签单年度 × 保单年度) 数组中，不生成逐单向量
+
+
+"""
+
+
+import numpy as np
+import core.tbl_manage as tm
+import core.stat as st
+import core.batch as bt
+import core.runner as rn
+
+
+class CohortProjection(object):
+    """
+    按 (险种, 签单年度) 汇总的法定准备金与GAAP年度现金流
+    """
+    RESULTS = ("sa_inforce", "stat_reserve", "gaap_prem", "gaap_ben")
+    # sa_inforce 为保单年度初的有效保额（GAAP lx_bop × sa）
+    COHORT_COLUMNS = ["plan_id", "issue_year"]
+
+    def __init__(self, policies, chunk_size=2000):
+        """
+
+        Example:
+
+        >>> cp = CohortProjection(tm.pd.read_csv("policy.csv"))
+        >>> cp.run()
+        >>> cp.frame()
+
+        :param tm.pd.DataFrame policies: 包含POLICY_COLUMNS与issue_year的保单，没有issue_year时只按险种汇总
+        :param int chunk_size: 每次计算的model point数
+        """
+        policies = policies.copy()
+        if "issue_year" not in policies.columns:
+            policies["issue_year"] = 0
+        self.chunk_size = chunk_size
+        keys = self.COHORT_COLUMNS + rn.MP_COLUMNS
+        grouped = policies.groupby(keys, sort=True)["sa"].sum().reset_index()
+        # 同一cohort内相同model point的保额合计
+        self.cohorts = grouped[self.COHORT_COLUMNS].drop_duplicates().reset_index(drop=True)
+        self.cell = grouped
+        self.cell["cohort"] = grouped.groupby(self.COHORT_COLUMNS, sort=True).ngroup().values
+        self.n_dur = int(grouped["insterm"].max())
+        self.totals = dict((x, np.zeros((len(self.cohorts), self.n_dur))) for x in self.RESULTS)
+
+    def _project(self, plan_id, mp):
+        """
+        单位保额（Stat.sa）的年度结果
+
+        :param np.ndarray mp: (model point × MP_COLUMNS)
+        :return: 各结果的 (model point × 保单年度) 矩阵
+        :rtype: dict
+        """
+        args = (plan_id, mp[:, 0], mp[:, 1], mp[:, 2], mp[:, 3])
+        bs = bt.BatchStat(*args)
+        bg = bt.BatchGaap(*(args + (st.Stat.sa,)))
+        bg.pricing = bs.pricing
+        n_pol, n_dur = len(mp), int(mp[:, 3].max())
+
+        def annual(x, how):
+            x = x.reshape(n_pol, n_dur, 12)
+            return x[..., 0] if how == "first" else x.sum(axis=2)
+
+        ben = sum(bg.mp_ben_fix(x) for x in bg.ben_list())
+        return {
+            "sa_inforce": annual(bg.mp_lx_bop(), "first") * st.Stat.sa,
+            "stat_reserve": bs.stat() * bs.pricing.mp_valid(),
+            "gaap_prem": annual(bg.mp_prem(), "sum"),
+            "gaap_ben": annual(ben, "sum")
+        }
+
+    def run(self):
+        """
+        计算并累加全部cohort，重复调用时重新计算
+
+        :return: 各结果的 (cohort × 保单年度) 数组，行与self.cohorts对应
+        :rtype: dict
+        """
+        self.totals = dict((x, np.zeros((len(self.cohorts), self.n_dur))) for x in self.RESULTS)
+        for plan_id, idx in self.cell.groupby("plan_id").indices.items():
+            cell = self.cell.iloc[idx]
+            uniq, inverse = np.unique(cell[rn.MP_COLUMNS].values.astype('int64'), axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            cohort = cell["cohort"].values
+            scale = cell["sa"].values / st.Stat.sa
+            for i in range(0, len(uniq), self.chunk_size):
+                mp = uniq[i:i + self.chunk_size]
+                sel = (inverse >= i) & (inverse < i + len(mp))
+                # 本块model point在各cohort中的保额权重
+                c_ids = np.unique(cohort[sel])
+                weight = np.zeros((len(c_ids), len(mp)))
+                np.add.at(weight, (np.searchsorted(c_ids, cohort[sel]), inverse[sel] - i), scale[sel])
+                for name, value in self._project(int(plan_id), mp).items():
+                    self.totals[name][c_ids, :value.shape[1]] += weight.dot(value)
+        return self.totals
+
+    def frame(self):
+        """
+        :return: 列为 plan_id, issue_year, polyr 与各结果的长表，已满期的保单年度不输出
+        :rtype: tm.pd.DataFrame
+        """
+        cohort, dur = np.nonzero(self.totals["sa_inforce"] > 0)
+        out = self.cohorts.iloc[cohort].reset_index(drop=True)
+        out["polyr"] = dur + 1
+        for name in self.RESULTS:
+            out[name] = self.totals[name][cohort, dur]
+        return out
+
+    pass
+
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(0)
+    n = 100000
+    demo = tm.pd.DataFrame({
+        "policy_id": np.arange(n),
+        "plan_id": 10513002,
+        "iss_age": rng.randint(0, 56, n),
+        "sex": rng.randint(0, 2, n),
+        "payterm": rng.choice([1, 5, 10], n),
+        "insterm": 50,
+        "sa": rng.randint(10, 500, n) * 1000.,
+        "issue_year": rng.randint(2010, 2020, n)
+    })
+    cp = CohortProjection(demo)
+    cp.run()
+    print(cp.frame())
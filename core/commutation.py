@@ -0,0 +1,378 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the commutation functions
+
+including
+..py:class:: Commutation 换算函数表
+..py:class:: ProductCommutation 险种口径的换算函数
+..py:func:: interp_reserve 按保单月度插值准备金向量
+
+Commutation以到达年龄为下标，给出险种各责任发生率下每单位保额的年金、保险现值与净保费准备金，
+不含给付金额规则、loading、修正方法与现金价值下限，是通用的精算基础，数值与PricingOd.gp、Stat.stat不同；
+
+ProductCommutation按投保年龄分行，由BatchStat的现值列一次累加得到，
+含险种的给付金额、loading保费与一年期完全修正方法，gp、stat与reserve_at与BatchPricing.gp、BatchStat.stat一致；
+两者一次生成后，任意投保年龄、保单年度的取值均为数组取值，年龄、期间参数均可为数组
+
+
+"""
+
+
+import threading
+from collections import OrderedDict
+import numpy as np
+import core.tbl_manage as tm
+import core.decrement as dc
+import core.pricing as pc
+import core.batch as bt
+import core.nonforfeiture as nf
+
+
+def _rev_cumsum(x):
+    return x[..., ::-1].cumsum(axis=-1)[..., ::-1]
+
+
+def _pad(x):
+    """
+    在保单年度方向补一列0，保单年度取到保险期间时仍可取值
+    """
+    return np.concatenate([x, np.zeros(x.shape[:-1] + (1,))], axis=-1)
+
+
+def _cached(cls, key, build):
+    """
+    按key取cls._instances中缓存的对象，不存在时以build()生成，超出cls.CACHE_SIZE后按LRU淘汰
+    """
+    with cls._lock:
+        if key in cls._instances:
+            cls._instances.move_to_end(key)
+            return cls._instances[key]
+    value = build()
+    with cls._lock:
+        cls._instances[key] = value
+        while len(cls._instances) > cls.CACHE_SIZE:
+            cls._instances.popitem(last=False)
+    return value
+
+
+class Commutation(object):
+    """
+    换算函数表 Dx, Nx, Cx, Mx, Rx
+
+    Cx, Mx, Rx 按责任分行，dec为None时取全部责任之和；
+    保额为1、净保费不含loading，险种口径的保费与准备金见ProductCommutation
+    """
+    def __init__(self, qx, int_rate, phase="moy"):
+        """
+
+        Example:
+
+        >>> cm = Commutation.from_plan(10513002, 0, 0.025)
+        >>> cm.net_premium(30, 20, 10)
+
+        :param qx: (责任 × 年龄) 的发生率，第0列为0岁
+        :param float int_rate: 利率
+        :param str phase: 赔付时点，与PricingOd.mp_dx一致
+        """
+        adj = {
+            "boy": 1,
+            "moy": 0.5,
+            "eoy": 0
+        }
+        qx = np.atleast_2d(np.asarray(qx, dtype='float64'))
+        ages = np.arange(qx.shape[1] + 1)
+        v = 1 / (1 + int_rate)
+        self.int_rate = int_rate
+        self.qx = qx
+        self.lx = np.concatenate([[1.], np.cumprod(1 - qx.sum(axis=0))])
+        self.Dx = v ** ages * self.lx
+        self.Nx = _rev_cumsum(self.Dx)
+        cx = v ** (ages[:-1] + 1 - adj[phase]) * self.lx[:-1] * qx
+        self.Cx = np.concatenate([cx, np.zeros((len(qx), 1))], axis=1)
+        self.Mx = _rev_cumsum(self.Cx)
+        self.Rx = _rev_cumsum(self.Mx)
+        # 各数组比年龄多一列0，x + n 到达极限年龄后一岁时仍可取值
+
+    CACHE_SIZE = 64
+    # 缓存条目上限，超出后按LRU淘汰
+    _instances = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def from_plan(cls, plan_id, sex, int_rate, phase="moy"):
+        """
+        按险种责任生成换算函数表，发生率调整与PricingOd.adj_qx_list一致，结果按参数缓存
+
+        :param int plan_id: 险种代码
+        :param int sex: 性别
+        :param float int_rate: 利率
+        :param str phase: 赔付时点
+        :rtype: Commutation
+        """
+        key = (plan_id, sex, int_rate, phase, tm.ReadTable.generation)
+        return _cached(cls, key, lambda: cls._build(plan_id, sex, int_rate, phase))
+
+    @classmethod
+    def _build(cls, plan_id, sex, int_rate, phase):
+        bens = pc.PricingOd(plan_id).ben_list()
+        qx = []
+        for ben in bens:
+            if (ben.BEN_TYPE == "ann") or (ben.BEN_TYPE == "endow"):
+                qx.append(None)
+                continue
+            q = tm.ReadTable.get_mort_array(ben.get_qx_tbl_name(), sex)
+            adj = dc.KERNEL.adj_tbl_name(ben, bens)
+            if adj is not None:
+                k = tm.ReadTable.get_mort_array(adj, sex)
+                n = min(len(q), len(k))
+                q = q[:n] * (1 - k[:n])
+            qx.append(q)
+        n = min(len(x) for x in qx if x is not None)
+        qx = [np.zeros(n) if x is None else x[:n] for x in qx]
+        cm = cls(qx, int_rate, phase)
+        cm.b_ids = [x.b_id for x in bens]
+        return cm
+
+    def _m(self, dec):
+        return self.Mx.sum(axis=0) if dec is None else self.Mx[dec]
+
+    def _r(self, dec):
+        return self.Rx.sum(axis=0) if dec is None else self.Rx[dec]
+
+    def ax_due(self, x, n):
+        """
+        期初付年金现值 ä_{x:n}
+        """
+        x = np.asarray(x)
+        return (self.Nx[x] - self.Nx[x + n]) / self.Dx[x]
+
+    def Ax(self, x, n, dec=None):
+        """
+        定期保险现值 A_{x:n}
+        """
+        x = np.asarray(x)
+        m = self._m(dec)
+        return (m[x] - m[x + n]) / self.Dx[x]
+
+    def IAx(self, x, n, dec=None):
+        """
+        递增定期保险现值 (IA)_{x:n}，第k年保额为k
+        """
+        x = np.asarray(x)
+        m = self._m(dec)
+        r = self._r(dec)
+        return (r[x] - r[x + n] - n * m[x + n]) / self.Dx[x]
+
+    def net_premium(self, x, n, m, dec=None):
+        """
+        单位保额的年缴净保费，不含loading
+
+        :param x: 投保年龄
+        :param n: 保险期间
+        :param m: 缴费期间
+        """
+        return self.Ax(x, n, dec) / self.ax_due(x, m)
+
+    def reserve(self, x, t, n, m, dec=None):
+        """
+        单位保额第t保单年度末的均衡净保费准备金，不作修正、不设现金价值下限
+
+        :param x: 投保年龄
+        :param t: 已经过保单年度
+        :param n: 保险期间
+        :param m: 缴费期间
+        :rtype: np.ndarray
+        """
+        x, t, n, m = np.broadcast_arrays(*[np.asarray(y, dtype='int64') for y in (x, t, n, m)])
+        p = self.net_premium(x, n, m, dec)
+        mm = self._m(dec)
+        xt = x + np.minimum(t, n)
+        pv_ben = mm[xt] - mm[x + n]
+        pv_prem = np.where(t < m, self.Nx[xt] - self.Nx[x + np.maximum(m, t)], 0)
+        return np.where(t < n, (pv_ben - p * pv_prem) / self.Dx[xt], 0)
+
+    def reserve_at(self, x, months, n, m, dec=None):
+        """
+        任意保单月度的准备金，年内按 (1-f)(tV + P) + f·(t+1)V 插值
+
+        :param months: 已经过保单月数
+        :rtype: np.ndarray
+        """
+        months = np.asarray(months, dtype='int64')
+        t = months // 12
+        f = (months % 12) / 12.
+        p = np.where(t < np.asarray(m), self.net_premium(x, n, m, dec), 0)
+        v0 = self.reserve(x, t, n, m, dec)
+        v1 = self.reserve(x, t + 1, n, m, dec)
+        return np.where(f > 0, (1 - f) * (v0 + p) + f * v1, v0)
+
+    pass
+
+
+class ProductCommutation(object):
+    """
+    险种口径的换算函数，数组均为 (投保年龄 × 保单年度)，第t列为第t+1保单年度初，比保险期间多一列0，只读
+
+    评估利率：Dx 年初贴现的生存人数，Ex 年末贴现的年初生存人数，Mx 给付现值（含保费相关给付）自第t年起的累计，
+    NPx 缴费期内Dx自第t年起的累计；
+    定价利率：Mfix 固定给付现值累计，Mprem 每单位保费的保费相关给付现值累计，Nload 扣除loading的保费现值累计；
+    现金价值利率：Dcv，Mcv，Ncv
+
+    保费 gp = Mfix_0 / (Nload_0 - Mprem_0)，取2位小数；
+    一年期完全修正：续年修正净保费 β = M_1 / NP_1，tV = (M_t - β·NP_t) / D_t，
+    保费不足准备金 max(β - gp, 0)·NP_t / E_{t-1}（缴费期内），
+    现金价值 (Mcv_t - P_cv·Ncv_t) / Dcv_t × r_t，P_cv = Mcv_0 / Ncv_0，
+    法定准备金取两者较大值，与BatchStat.stat一致，期满时为0
+    """
+    def __init__(self, bs):
+        """
+
+        Example:
+
+        >>> pc_ = ProductCommutation.get(10513002, 0, 10, 50)
+        >>> pc_.stat([30, 40], [5, 10])
+        >>> pc_.reserve_at(30, 18)
+
+        :param bt.BatchStat bs: 已设置假设的批量准备金对象，各行为一个投保年龄
+        """
+        bp = bs.pricing
+        self.plan_id = bs.plan_id
+        self.iss_age = bp.iss_age
+        self.payterm = bp.payterm
+        self.insterm = bp.insterm
+        fix = 0
+        prem = 0
+        for ben in bp.ben_list():
+            cx = bp.mp_cx(ben)
+            fix = fix + cx * bp.mp_ben_fix(ben)
+            prem = prem + cx * bp.mp_ben_prem(ben)
+        self.Mfix = _pad(_rev_cumsum(fix))
+        self.Mprem = _pad(_rev_cumsum(prem))
+        self.Nload = _pad(_rev_cumsum(bp.mp_netp()))
+        self.premium = np.round(self.Mfix[:, 0] / (self.Nload[:, 0] - self.Mprem[:, 0]), 2)
+        gp = self.premium[:, None]
+        self.Dx = _pad(bs.mp_dx("boy"))
+        self.Ex = _pad(bs.mp_dx("eoy"))
+        self.Mx = _pad(_rev_cumsum(bs.apv_ben_fix() + gp * bs.apv_ben_prem()))
+        self.NPx = _pad(_rev_cumsum(bs.mp_p()))
+        self.Dcv = _pad(bp.mp_dx_cv("boy"))
+        self.Mcv = _pad(_rev_cumsum(bp.apv_ben_fix_cv() + gp * bp.apv_ben_prem_cv()))
+        self.Ncv = _pad(_rev_cumsum(bp.mp_netp_cv()))
+        self.fpt = bs.method == "FPT"
+        self.beta = bt.safe_div(self.Mx[:, 1], self.NPx[:, 1]) if self.fpt else np.zeros(len(bp))
+        self.premium_cv = bt.safe_div(self.Mcv[:, 0], self.Ncv[:, 0])
+        for x in ("Mfix", "Mprem", "Nload", "premium", "Dx", "Ex", "Mx", "NPx", "Dcv", "Mcv", "Ncv",
+                  "beta", "premium_cv"):
+            getattr(self, x).setflags(write=False)
+
+    CACHE_SIZE = 64
+    _instances = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, plan_id, sex, payterm, insterm, assumptions=None):
+        """
+        对全部可覆盖保险期间的投保年龄生成换算函数，行号即投保年龄，结果按参数缓存
+
+        :param int plan_id: 险种代码
+        :param int sex: 性别
+        :param int payterm: 缴费期间
+        :param insterm: 保险期间，"105@"表示保至105岁
+        :param assumptions: 假设组合（modelpoint.AssumptionSet），默认为类属性
+        :rtype: ProductCommutation
+        """
+        key = (plan_id, sex, payterm, insterm, assumptions, tm.ReadTable.generation)
+
+        def build():
+            ages = np.arange(nf.NonforfeitureTable.max_issue_age(plan_id, sex, insterm) + 1)
+            bs = bt.BatchStat(plan_id, ages, sex, payterm, insterm)
+            if assumptions is not None:
+                assumptions.apply(bs)
+            return cls(bs)
+        return _cached(cls, key, build)
+
+    def _index(self, x, t):
+        x, t = np.broadcast_arrays(np.asarray(x, dtype='int64'), np.asarray(t, dtype='int64'))
+        if ((x < 0) | (x >= len(self.iss_age))).any():
+            raise ValueError("iss_age out of range for plan {}".format(self.plan_id))
+        return x, np.clip(t, 0, self.Dx.shape[1] - 1), t
+
+    def gp(self, x):
+        """
+        :param x: 投保年龄
+        :return: 每标准保额的保费
+        """
+        return self.premium[np.asarray(x, dtype='int64')]
+
+    def trnp(self, x, t):
+        """
+        第t+1保单年度的修正净保费，首年为当年给付现值
+
+        :param x: 投保年龄
+        :param t: 已经过保单年度
+        """
+        x, tc, t = self._index(x, t)
+        first = self.Mx[x, 0] - self.Mx[x, 1] if self.fpt else 0
+        return np.where(t == 0, first, np.where((t > 0) & (t < self.payterm[x]), self.beta[x], 0))
+
+    def stat(self, x, t):
+        """
+        第t保单年度末的法定准备金，签单时与期满后为0
+
+        :param x: 投保年龄
+        :param t: 已经过保单年度
+        :rtype: np.ndarray
+        """
+        x, tc, t = self._index(x, t)
+        adj = bt.safe_div(self.Mx[x, tc] - self.beta[x] * self.NPx[x, tc], self.Dx[x, tc])
+        short = np.fmax(self.beta[x] - self.premium[x], 0) * self.NPx[x, tc]
+        prem = np.where(tc < self.payterm[x], bt.safe_div(short, self.Ex[x, np.maximum(tc - 1, 0)]), 0)
+        k = 0.8
+        r = np.fmin(k + tc * (1 - k) / np.fmin(20, self.payterm[x]), 1)
+        cv = bt.safe_div(self.Mcv[x, tc] - self.premium_cv[x] * self.Ncv[x, tc], self.Dcv[x, tc]) * r
+        return np.where((t > 0) & (t < self.insterm[x]), np.fmax(adj + prem, cv), 0)
+
+    def reserve_at(self, x, months):
+        """
+        任意保单月度的法定准备金，年内按 (1-f)(tV + P) + f·(t+1)V 插值，P为该年度的修正净保费
+
+        :param x: 投保年龄
+        :param months: 已经过保单月数
+        :rtype: np.ndarray
+        """
+        months = np.asarray(months, dtype='int64')
+        t = months // 12
+        f = (months % 12) / 12.
+        v0 = self.stat(x, t)
+        return np.where(f > 0, (1 - f) * (v0 + self.trnp(x, t)) + f * self.stat(x, t + 1), v0)
+
+    pass
+
+
+def interp_reserve(rsv, months, prem=None):
+    """
+    按保单月度对年度准备金向量插值，rsv[..., k]为第k+1保单年度末的准备金，签单时为0；
+    给定prem时年内按 (1-f)(tV + P) + f·(t+1)V 插值，否则按tV与(t+1)V线性插值
+
+    Example:
+
+    >>> bs = BatchStat(10513002, [30, 40], 0, 10, 50)
+    >>> interp_reserve(bs.stat(), [18, 30], bs.trnp())
+
+    :param np.ndarray rsv: 年度准备金，可为 (保单 × 保单年度) 矩阵
+    :param months: 已经过保单月数，对应rsv的每一行
+    :param np.ndarray prem: 与rsv同形状，prem[..., k]为第k+1保单年度初收取的净保费（如BatchStat.trnp）
+    :rtype: np.ndarray
+    """
+    rsv = np.atleast_2d(rsv)
+    v = np.concatenate([np.zeros((len(rsv), 1)), rsv], axis=1)
+    months = np.broadcast_to(np.asarray(months, dtype='int64'), (len(rsv),))
+    t = np.minimum(months // 12, v.shape[1] - 1)
+    f = (months % 12) / 12.
+    rows = np.arange(len(rsv))
+    v0 = v[rows, t]
+    if prem is not None:
+        p = _pad(np.atleast_2d(np.asarray(prem, dtype='float64')))
+        v0 = np.where(f > 0, v0 + p[rows, np.minimum(t, p.shape[1] - 1)], v0)
+    return (1 - f) * v0 + f * v[rows, np.minimum(t + 1, v.shape[1] - 1)]
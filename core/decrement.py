@@ -0,0 +1,119 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the multi-decrement projection kernel
+
+including
+..py:class:: Projection 多减因预测结果
+..py:class:: DecrementKernel 多减因预测
+
+发生率张量为 (保单 × 减因 × 期间)；同一组内的减因相加（1 - Σq，与原各模块的mp_lx_cal一致），
+各组按顺序相乘（如Gaap中先死亡、重疾，再退保），一次计算期初、期末在险与各减因的退出人数；
+死亡发生率是否扣除重疾发生率（K表）由DecrementKernel.adj_tbl_name统一判断，定价、准备金与GAAP各模块一致
+
+Example:
+
+>>> k = DecrementKernel()
+>>> proj = k.project(np.stack([qx_death, qx_ci, lapse], axis=1), groups=[0, 0, 1])
+>>> proj.lx_eop
+
+
+"""
+
+
+import numpy as np
+
+
+class Projection(object):
+    """
+    多减因预测结果，数组均为 (保单 × 期间)，exits为 (保单 × 减因 × 期间)
+    """
+    __slots__ = ("survival", "lx_eop", "lx_bop", "exits")
+
+    def __init__(self, survival, lx_eop, lx_bop, exits):
+        self.survival = survival
+        self.lx_eop = lx_eop
+        self.lx_bop = lx_bop
+        self.exits = exits
+
+    pass
+
+
+class DecrementKernel(object):
+    """
+    多减因预测，可指定float32；每次调用的结果为新数组，调用方（memo节点）缓存后设为只读
+    """
+    def __init__(self, dtype='float64'):
+        """
+
+        :param dtype: 计算精度，'float64' 或 'float32'
+        """
+        self.dtype = np.dtype(dtype)
+
+    ADJ_TBL_NAME = "K_2000_1.csv"
+    # 重疾发生率表，含重疾责任的险种死亡发生率扣除该表
+
+    @classmethod
+    def adj_tbl_name(cls, ben, ben_list):
+        """
+        责任发生率的扣除表：险种含重疾责任时死亡责任扣除K表（重疾提前给付），其他情况不扣除
+
+        :param ben: 责任
+        :param ben_list: 险种的全部责任
+        :return: 扣除表名，不扣除时为None
+        :rtype: str
+        """
+        if ben.BEN_TYPE == "death" and [x for x in ben_list if getattr(x, "BEN_TYPE", None) == "ci"]:
+            return cls.ADJ_TBL_NAME
+        return None
+
+    def _buffer(self, shape):
+        return np.empty(shape, dtype=self.dtype)
+
+    def project(self, rates, groups=None, exits=False):
+        """
+
+        :param rates: (保单 × 减因 × 期间) 发生率，二维时视为单个保单
+        :param groups: 各减因所属组，默认全部为同一组
+        :param bool exits: 是否计算各减因退出人数
+        :rtype: Projection
+        """
+        rates = np.asarray(rates, dtype=self.dtype)
+        if rates.ndim == 2:
+            rates = rates[None]
+        n_pol, n_dec, n_dur = rates.shape
+        groups = np.zeros(n_dec, dtype='int64') if groups is None else np.asarray(groups, dtype='int64')
+        order = np.unique(groups)
+        shape = (n_pol, n_dur)
+        survival = self._buffer(shape)
+        before = None
+        if exits:
+            before = self._buffer((len(order), n_pol, n_dur))
+        for i, g in enumerate(order):
+            idx = np.nonzero(groups == g)[0]
+            q = rates[:, idx[0]] if len(idx) == 1 else rates[:, idx].sum(axis=1)
+            if i == 0:
+                if exits:
+                    before[0] = 1
+                np.subtract(1, q, out=survival)
+            else:
+                if exits:
+                    before[i] = survival
+                survival *= 1 - q
+        lx_eop = np.cumprod(survival, axis=1, out=self._buffer(shape))
+        lx_bop = self._buffer(shape)
+        lx_bop[:, 0] = 1
+        lx_bop[:, 1:] = lx_eop[:, :-1]
+        out = None
+        if exits:
+            out = self._buffer(rates.shape)
+            pos = dict((g, i) for i, g in enumerate(order))
+            for k in range(n_dec):
+                np.multiply(rates[:, k], lx_bop * before[pos[groups[k]]], out=out[:, k])
+        return Projection(survival, lx_eop, lx_bop, out)
+
+    pass
+
+
+KERNEL = DecrementKernel()
+# 各模块共用的默认kernel（float64）
@@ -1,6 +1,8 @@
 # -*- coding:utf-8 -*-
 import numpy as np
 import core.tbl_manage as tm
+import core.memo as memo
+import core.decrement as dc
 import core.pricing as pc
 import core.stat as stat
 #from peewee import *
@@ -23,6 +25,7 @@ class Gaap(object):
     IntRate = 0.035
     method = "FPT"
 
+    @memo.node("IssAge", "insterm", "time_scale")
     def apv_mp_age(self):
         """
         :return: model points对应的age列 
@@ -38,6 +41,7 @@ class Gaap(object):
             pass
         return mp_age
 
+    @memo.node("time_scale")
     def apv_mp_polmth(self):
         """
         
@@ -52,6 +56,7 @@ class Gaap(object):
     def apv_mp_mth(self):
         return 0
 
+    @memo.node()
     def apv_mp_polyr(self):
         """
 
@@ -61,9 +66,11 @@ class Gaap(object):
         polyr = self.apv_mp_age() - self.apv_mp_age()[0] + 1
         return polyr
 
+    @memo.node("pricing")
     def ben_list(self):
         return self.pricing.ben_list()
 
+    @memo.node("sex", "pricing")
     def adj_qx_list(self, sex, ben):
         """
 
@@ -72,16 +79,24 @@ class Gaap(object):
         :return: qx
         :rtype: np.ndarray
         """
-        qx = self.pricing.get_qx_list(sex, ben.get_qx_tbl())
-        if ben.BEN_TYPE == "death":
-            qx = qx * (1 - self.pricing.get_qx_list(self.sex, tm.ReadTable.get_mort_table("K_2000_1.csv")).values)
+        qx = self.pricing.get_qx_list(sex, ben.get_qx_tbl_name())
+        adj = dc.KERNEL.adj_tbl_name(ben, self.pricing.ben_list())
+        if adj is not None:
+            qx = qx * (1 - self.pricing.get_qx_list(self.sex, adj))
         return qx
 
     @staticmethod
     def ytom(rate):
+        """
+        年度发生率转换为月度发生率，支持数组
+
+        :param rate: 年度发生率
+        :return: 月度发生率
+        """
         rate = 1 - (1-rate) ** (1/12)
         return rate
 
+    @memo.node("sex", "time_scale")
     def mp_qx_ben(self, ben):
         """
 
@@ -92,14 +107,13 @@ class Gaap(object):
             qx = [self.adj_qx_list(self.sex, x) for x in ben]
         except TypeError:
             qx = self.adj_qx_list(self.sex, ben)
-        y2m = np.frompyfunc(lambda x: self.ytom(x), 1, 1)
-        if self.time_scale is "MONTH":
-            qx = np.repeat(qx, 12).values
-            qx = y2m(qx)
+        if self.time_scale == "MONTH":
+            qx = self.ytom(np.repeat(np.asarray(qx, dtype='float64'), 12, axis=-1))
         else:
             qx = qx
         return qx
 
+    @memo.node()
     def mp_qx_ben_list(self,ben):
         """
         
@@ -121,6 +135,7 @@ class Gaap(object):
         return lapse_list
     # TODO lapse list 归类
 
+    @memo.node("payterm", "lapse_tbl_name", "time_scale", "pricing")
     def mp_lapse(self):
         """
 
@@ -128,12 +143,10 @@ class Gaap(object):
         :rtype: np.ndarray
         """
         lapse = self.get_lapse_list(self.payterm, self.lapse_tbl_name).values
-        lapse[np.isnan(lapse)] = 0
+        lapse = np.where(np.isnan(lapse), 0, lapse)
         lap = lapse[:len(self.pricing.apv_mp_age())]
-        y2m = np.frompyfunc(lambda x: self.ytom(x), 1, 1)
-        if self.time_scale is "MONTH":
-            lap = np.repeat(lap, 12)
-            lap = y2m(lap)
+        if self.time_scale == "MONTH":
+            lap = self.ytom(np.repeat(lap, 12))
         else:
             lap = lap
         return lap
@@ -148,26 +161,29 @@ class Gaap(object):
         # db部分处理
         qx = self.mp_qx_ben_list(self.ben_list())
         lap = self.mp_lapse()
-        lx = (1 - reduce(lambda x, y: x + y, qx))*(1 - lap)
-        lx = lx.cumprod()
-        return lx
+        rates = np.vstack([np.stack(qx), np.asarray(lap, dtype='float64')[None]])
+        return dc.KERNEL.project(rates, groups=[0] * len(qx) + [1]).lx_eop[0]
 
+    @memo.node()
     def mp_lx_eop(self):
         return self.mp_lx_cal()
 
+    @memo.node()
     def mp_lx_bop(self):
         lx = np.roll(self.mp_lx_eop(), 1)
         lx[0] = 1
         return lx
 
+    @memo.node("payterm", "time_scale", "SA", "sa", "pricing")
     def mp_prem(self):
-        prem = np.zeros(len(self.apv_mp_age()), dtype='int32')
-        if self.time_scale is "MONTH":
+        lx = self.mp_lx_bop()
+        prem = np.zeros(len(lx), dtype='int32')
+        if self.time_scale == "MONTH":
             prem[np.arange(self.payterm) * 12] = 1
         else:
             prem[:self.payterm] = 1
-        prem = prem * self.SA / a.pricing.gp()
-        prem = prem * a.mp_lx_bop()
+        prem = prem * self.pricing.gp() * self.SA / self.sa
+        prem = prem * lx
         return prem
 
     def mp_ben(self):
@@ -179,6 +195,7 @@ class Gaap(object):
         ben = self.mp_qx_ben_list(self.ben_list())
         return qx
 
+    @memo.node("time_scale", "pricing")
     def mp_ben_fix(self, ben):
         ben_fix = self.pricing.mp_ben_fix(ben)
         if self.time_scale is "MONTH":
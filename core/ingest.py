@@ -0,0 +1,222 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the streaming policy ingestion
+
+including
+..py:class:: PolicyRules 保单校验规则
+..py:class:: PolicyStream 分块读取、校验保单并按险种切分为计算单元
+
+读取线程按块解析保单文件并校验，通过校验的保单按险种与块大小切分后放入有界队列，
+计算端从队列取出计算单元时，读取线程同时解析后续的块；队列满时读取线程等待，内存占用与文件大小无关；
+计算端提前停止或出错时，读取线程收到停止信号后退出
+
+Example:
+
+>>> stream = PolicyStream("policy.csv")
+>>> for plan_id, units in stream:
+...     BatchStat(plan_id, ...)
+>>> stream.stats
+
+
+"""
+
+
+import os
+import time
+import queue
+import threading
+import numpy as np
+import core.tbl_manage as tm
+import core.pricing as pc
+
+
+POLICY_COLUMNS = ["policy_id", "plan_id", "iss_age", "sex", "payterm", "insterm", "sa"]
+MP_COLUMNS = ["iss_age", "sex", "payterm", "insterm"]
+ASSUMPTION_KEY = ["plan_id"]
+# 同一假设键下的保单使用相同的责任与假设表，可在同一批次中计算
+
+
+class PolicyRules(object):
+    """
+    保单校验规则，险种、责任与假设表取自ProductIndex与list_plan_benifit.csv
+    """
+    def __init__(self, load_tbl_name=None):
+        """
+
+        :param str load_tbl_name: loading表名，默认为PricingOd.load_tbl_name
+        """
+        self.index = pc.ProductIndex.get()
+        load_tbl_name = load_tbl_name or pc.PricingOd.load_tbl_name
+        path = os.path.join(tm.ReadTable.LOADING_TABLE_DIRECTORY, load_tbl_name + ".csv")
+        self.payterms = np.array([int(x) for x in tm.ReadTable.read_csv(path).columns if x.isdigit()])
+        self.max_age = {}
+        # 各险种发生率表覆盖的最大到达年龄
+        for plan_id, plan in self.index.plans.items():
+            ages = [len(tm.ReadTable.get_mort_array(x.get_qx_tbl_name(), s)) - 1
+                    for x in plan.benefits if getattr(x, "BEN_TYPE", None) not in ("ann", "endow", None)
+                    for s in (0, 1)]
+            self.max_age[plan_id] = min(ages) if ages else 105
+
+    @staticmethod
+    def normalize(chunk):
+        """
+        数值列转为数值，无法转换的值为nan；保险期间"105@"（保至105岁）转为 106 - iss_age，与BatchPricing一致
+
+        :param tm.pd.DataFrame chunk: 保单
+        :rtype: tm.pd.DataFrame
+        """
+        out = chunk.copy()
+        for x in POLICY_COLUMNS:
+            if x != "insterm":
+                out[x] = tm.pd.to_numeric(out[x], errors="coerce")
+        to_age = out["insterm"].astype(str).str.strip() == "105@"
+        insterm = tm.pd.to_numeric(out["insterm"].where(~to_age), errors="coerce")
+        out["insterm"] = insterm.where(~to_age, 106 - out["iss_age"])
+        return out
+
+    def check(self, chunk):
+        """
+        :param tm.pd.DataFrame chunk: 保单
+        :return: 各行的错误原因，通过时为空字符串
+        :rtype: np.ndarray
+        """
+        reason = np.full(len(chunk), "", dtype=object)
+
+        def fail(mask, msg):
+            mask = np.asarray(mask) & (reason == "")
+            reason[mask] = msg
+
+        fail(chunk[POLICY_COLUMNS].isnull().any(axis=1).values, "missing value")
+        chunk = self.normalize(chunk)
+        fail(chunk[POLICY_COLUMNS].isnull().any(axis=1).values, "non-numeric value")
+        fail((chunk[["plan_id"] + MP_COLUMNS] % 1 != 0).any(axis=1).values, "non-integer value")
+        # 投保年龄等整数列不截断小数，如30.5岁
+        plan_id = chunk["plan_id"].fillna(-1).values.astype('int64')
+        age = chunk["iss_age"].fillna(-1).values.astype('int64')
+        payterm = chunk["payterm"].fillna(-1).values.astype('int64')
+        insterm = chunk["insterm"].fillna(-1).values.astype('int64')
+        fail(~np.isin(plan_id, list(self.index.plans)), "unknown plan_id")
+        fail(~np.isin(chunk["sex"].fillna(-1).values, (0, 1)), "invalid sex")
+        fail(age < 0, "invalid iss_age")
+        fail((insterm <= 0) | (payterm <= 0) | (payterm > insterm), "invalid payterm/insterm")
+        fail(~np.isin(payterm, self.payterms), "payterm not in loading table")
+        max_age = np.array([self.max_age.get(x, -1) for x in plan_id.tolist()])
+        fail(age + insterm - 1 > max_age, "age out of mortality table")
+        fail(chunk["sa"].fillna(0).values <= 0, "invalid sa")
+        return reason
+
+    pass
+
+
+class PolicyStream(object):
+    """
+    读取线程与计算端通过有界队列衔接的保单流
+    """
+    _DONE = object()
+
+    def __init__(self, path, read_size=50000, unit_size=5000, queue_size=4, rules=None, extra_columns=()):
+        """
+
+        :param str path: 保单文件路径
+        :param int read_size: 每次解析的行数
+        :param int unit_size: 每个计算单元的最大保单数
+        :param int queue_size: 队列中最多等待的计算单元数
+        :param PolicyRules rules: 校验规则
+        :param extra_columns: 可选列，文件中有该列时一并读入，不参与校验
+        """
+        self.path = path
+        self.extra_columns = list(extra_columns)
+        self.read_size = read_size
+        self.unit_size = unit_size
+        self.queue_size = queue_size
+        self.rules = rules or PolicyRules()
+        self.rejects = []
+        # 未通过校验的保单，增加reason列
+        self.stats = {"rows": 0, "valid": 0, "rejected": 0, "units": 0,
+                      "reader_wait_sec": 0., "consumer_wait_sec": 0.}
+        self._stop = threading.Event()
+
+    def _put(self, q, item):
+        """
+        放入队列，队列满时等待，收到停止信号时放弃
+
+        :return: 是否已放入
+        :rtype: bool
+        """
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, q):
+        try:
+            header = tm.pd.read_csv(self.path, nrows=0).columns
+            usecols = POLICY_COLUMNS + [x for x in self.extra_columns if x in header]
+            for chunk in tm.pd.read_csv(self.path, usecols=usecols, chunksize=self.read_size):
+                if self._stop.is_set():
+                    return
+                reason = self.rules.check(chunk)
+                ok = reason == ""
+                self.stats["rows"] += len(chunk)
+                self.stats["valid"] += int(ok.sum())
+                if not ok.all():
+                    bad = chunk[~ok].copy()
+                    bad["reason"] = reason[~ok]
+                    self.rejects.append(bad)
+                    self.stats["rejected"] += len(bad)
+                for plan_id, grp in self.rules.normalize(chunk[ok]).groupby("plan_id"):
+                    grp = grp.sort_values("insterm")
+                    for i in range(0, len(grp), self.unit_size):
+                        start = time.time()
+                        if not self._put(q, (int(plan_id), grp.iloc[i:i + self.unit_size])):
+                            return
+                        self.stats["reader_wait_sec"] += time.time() - start
+                        self.stats["units"] += 1
+        except Exception as e:
+            self._put(q, e)
+        else:
+            self._put(q, self._DONE)
+
+    def __iter__(self):
+        """
+        :return: 逐个返回 (plan_id, 保单Dataframe)
+        """
+        q = queue.Queue(self.queue_size)
+        self._stop = threading.Event()
+        reader = threading.Thread(target=self._produce, args=(q,))
+        reader.daemon = True
+        reader.start()
+        try:
+            while True:
+                start = time.time()
+                item = q.get()
+                self.stats["consumer_wait_sec"] += time.time() - start
+                if item is self._DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self._stop.set()
+            # 提前停止时通知读取线程并清空队列，读取线程不会阻塞在put上
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+            reader.join()
+
+    def reject_frame(self):
+        """
+        :return: 未通过校验的保单
+        :rtype: tm.pd.DataFrame
+        """
+        if not self.rejects:
+            return tm.pd.DataFrame(columns=POLICY_COLUMNS + ["reason"])
+        return tm.pd.concat(self.rejects, ignore_index=True)
+
+    pass
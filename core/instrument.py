@@ -0,0 +1,209 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the opt-in profiling hooks for the pricing modules
+
+including
+..py:class:: Profile 方法调用计数、耗时与内存分配统计
+..py:func:: profile 在with块内启用统计
+
+启用时替换PricingOd、Stat、Gaap及对应Batch*类的方法以及ReadTable的读表方法，退出时恢复原方法，
+未启用时没有任何额外开销；结果可导出为json汇总，
+或flamegraph.pl / speedscope可读取的folded stacks格式（每行 "a;b;c 微秒数"）
+
+Example:
+
+>>> with profile() as prof:
+...     Stat(10513002).stat()
+>>> prof.summary()[:10]
+>>> prof.to_json("stat.json")
+>>> prof.to_folded("stat.folded")  # flamegraph.pl stat.folded > stat.svg
+
+
+"""
+
+
+import json
+import time
+import threading
+import tracemalloc
+
+
+def _targets():
+    """
+    :return: (类, 方法名筛选函数) 列表
+    """
+    import core.tbl_manage as tm
+    import core.pricing as pc
+    import core.stat as st
+    import core.gaap as ga
+    import core.batch as bt
+    return [
+        (pc.PricingOd, lambda x: not x.startswith("__")),
+        (st.Stat, lambda x: not x.startswith("__")),
+        (ga.Gaap, lambda x: not x.startswith("__")),
+        (bt.BatchPricing, lambda x: not x.startswith("__")),
+        (bt.BatchStat, lambda x: not x.startswith("__")),
+        (bt.BatchGaap, lambda x: not x.startswith("__")),
+        (tm.ReadTable, lambda x: x.startswith("get_") or x.startswith("read_"))
+    ]
+
+
+class Profile(object):
+    """
+    方法调用统计，同一时间只能有一个Profile处于启用状态
+    """
+    _active = None
+    _lock = threading.Lock()
+
+    def __init__(self, memory=False):
+        """
+
+        :param bool memory: 是否用tracemalloc记录各方法（含子调用）的净分配字节数，开启后运行明显变慢
+        """
+        self.memory = memory
+        self.stats = {}
+        # 方法名 -> [调用次数, 累计耗时, 自身耗时, 净分配字节]
+        self.stacks = {}
+        # 调用栈 -> 自身耗时
+        self._saved = []
+        self._local = threading.local()
+        self._stat_lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _wrap(self, name, func):
+        prof = self
+
+        def wrapper(*args, **kwargs):
+            stack = prof._stack()
+            frame = [name, 0.]
+            # 名称，子调用耗时
+            stack.append(frame)
+            mem = tracemalloc.get_traced_memory()[0] if prof.memory else 0
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                alloc = tracemalloc.get_traced_memory()[0] - mem if prof.memory else 0
+                path = tuple(x[0] for x in stack)
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                own = elapsed - frame[1]
+                with prof._stat_lock:
+                    st = prof.stats.setdefault(name, [0, 0., 0., 0])
+                    st[0] += 1
+                    if name not in path[:-1]:
+                        st[1] += elapsed
+                    # 递归调用只计一次累计耗时
+                    st[2] += own
+                    st[3] += alloc
+                    prof.stacks[path] = prof.stacks.get(path, 0.) + own
+        wrapper.__name__ = getattr(func, "__name__", name)
+        wrapper.__doc__ = getattr(func, "__doc__", None)
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def start(self):
+        with Profile._lock:
+            if Profile._active is not None:
+                raise RuntimeError("another Profile is already active")
+            Profile._active = self
+        for cls, select in _targets():
+            for attr, raw in list(cls.__dict__.items()):
+                if not select(attr):
+                    continue
+                name = "{}.{}".format(cls.__name__, attr)
+                if isinstance(raw, staticmethod):
+                    new = staticmethod(self._wrap(name, raw.__func__))
+                elif isinstance(raw, classmethod):
+                    new = classmethod(self._wrap(name, raw.__func__))
+                elif callable(raw):
+                    new = self._wrap(name, raw)
+                else:
+                    continue
+                self._saved.append((cls, attr, raw))
+                setattr(cls, attr, new)
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        return self
+
+    def stop(self):
+        for cls, attr, raw in reversed(self._saved):
+            setattr(cls, attr, raw)
+        self._saved = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        with Profile._lock:
+            Profile._active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def summary(self):
+        """
+        :return: 按累计耗时降序的 (方法, 调用次数, 累计秒数, 自身秒数, 净分配字节)
+        :rtype: list
+        """
+        rows = [(k,) + tuple(v) for k, v in self.stats.items()]
+        return sorted(rows, key=lambda x: -x[2])
+
+    def to_json(self, path=None):
+        """
+        :param str path: 输出路径，None时只返回结果
+        :rtype: dict
+        """
+        out = {
+            "memory": self.memory,
+            "methods": [dict(zip(("name", "calls", "cum_seconds", "self_seconds", "alloc_bytes"), x))
+                        for x in self.summary()]
+        }
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(out, f, indent=1)
+        return out
+
+    def to_folded(self, path=None):
+        """
+        folded stacks格式，每行为以;连接的调用栈与自身耗时（微秒）
+
+        :param str path: 输出路径，None时只返回文本
+        :rtype: str
+        """
+        lines = ["{} {}".format(";".join(k), int(round(v * 1e6)))
+                 for k, v in sorted(self.stacks.items()) if v > 0]
+        text = "\n".join(lines) + "\n"
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    pass
+
+
+def profile(memory=False):
+    """
+    :param bool memory: 是否记录内存分配
+    :return: 可用于with语句的Profile
+    :rtype: Profile
+    """
+    return Profile(memory)
+
+
+if __name__ == '__main__':
+    import core.stat as st
+    with profile(memory=True) as prof:
+        st.Stat(10513002).stat()
+    for row in prof.summary()[:20]:
+        print("{:<32} {:>6d} {:9.4f}s {:9.4f}s {:>12d}B".format(*row))
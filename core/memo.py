@@ -0,0 +1,125 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the per model point computation cache
+
+including
+..py:func:: node 方法结果缓存装饰器
+..py:func:: clear 清除对象上的缓存
+..py:func:: clone 复制对象及其缓存
+
+每个缓存结果记录其计算时读取的假设属性（自身声明的属性以及计算过程中调用的其他节点的属性），
+取用时逐项比较，任一假设（如IntRate、sex）改变即重新计算；
+ReadTable.clear_cache后全部缓存失效。
+
+Example:
+
+>>> a = PricingOd(10513002)
+>>> a.gp()  # 计算并缓存
+>>> a.IntRate = 0.03
+>>> a.gp()  # mp_dx等依赖IntRate的节点重新计算，mp_lx_eop直接取缓存
+
+
+"""
+
+
+import copy
+import functools
+import threading
+import numpy as np
+import core.tbl_manage as tm
+
+
+_local = threading.local()
+
+
+def _same(x, y):
+    if x is y:
+        return True
+    if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+        return False
+    return type(x) is type(y) and x == y
+
+
+def _arg_key(arg):
+    if isinstance(arg, list):
+        return tuple(arg)
+    return arg
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def node(*deps):
+    """
+    方法结果缓存装饰器，用于返回数组的中间计算方法
+
+    返回的ndarray为只读，调用方需要修改时应先copy
+
+    :param str deps: 方法直接读取的假设属性名
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(self, *args):
+            key = (name,) + tuple(_arg_key(x) for x in args)
+            memo = self.__dict__.setdefault("_memo", {})
+            stack = _stack()
+            entry = memo.get(key)
+            if entry is not None and entry[2] == tm.ReadTable.generation \
+                    and all(_same(getattr(o, a), v) for o, a, v in entry[1].values()):
+                if stack:
+                    stack[-1].update(entry[1])
+                return entry[0]
+            used = dict(((id(self), a), (self, a, getattr(self, a))) for a in deps)
+            generation = tm.ReadTable.generation
+            stack.append(used)
+            try:
+                value = func(self, *args)
+            finally:
+                stack.pop()
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            memo[key] = (value, used, generation)
+            if stack:
+                stack[-1].update(used)
+            return value
+        return wrapper
+    return decorator
+
+
+def clear(obj):
+    """
+    清除对象上的全部缓存
+
+    :param obj: 使用了node装饰器的对象
+    """
+    obj.__dict__.pop("_memo", None)
+
+
+def clone(obj):
+    """
+    浅复制对象，并继承其缓存；副本修改假设后只有依赖该假设的节点重新计算
+
+    Example:
+
+    >>> shocked = clone(base)
+    >>> shocked.IntRate = 0.04
+
+    :param obj: 使用了node装饰器的对象
+    :return: 副本
+    """
+    new = copy.copy(obj)
+    memo = {}
+    for key, (value, used, generation) in obj.__dict__.get("_memo", {}).items():
+        deps = {}
+        for (oid, attr), (o, a, v) in used.items():
+            o = new if o is obj else o
+            deps[(id(o), a)] = (o, a, v)
+        memo[key] = (value, deps, generation)
+    new.__dict__["_memo"] = memo
+    return new
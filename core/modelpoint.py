@@ -0,0 +1,206 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the model point and assumption set types
+
+including
+..py:class:: ModelPoint 单个model point
+..py:class:: AssumptionSet 假设组合
+..py:class:: ModelPoints 批量model points（按列存储）
+
+ModelPoint与AssumptionSet不可修改、可哈希，可直接作为缓存键，按构造参数pickle；
+apply将其写入PricingOd、Stat、Gaap或Batch*对象的实例属性，覆盖类属性默认值，
+各对象的假设互不影响
+
+Example:
+
+>>> mp = ModelPoint(10513002, 40, 1, 10, 50, 200000)
+>>> ass = AssumptionSet.default().replace(valuation_int_rate=0.03)
+>>> s = Stat(10513002)
+>>> ass.apply(mp.apply(s))
+>>> s.stat()
+
+
+"""
+
+
+import numpy as np
+import core.pricing as pc
+import core.stat as st
+import core.gaap as ga
+import core.batch as bt
+
+
+class ModelPoint(pc.Record):
+    """
+    单个model point，sa为保单保额
+    """
+    __slots__ = ("plan_id", "iss_age", "sex", "payterm", "insterm", "sa")
+
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm, sa=ga.Gaap.SA):
+        """
+        :param insterm: 保险期间，"105@"表示保至105岁
+        """
+        insterm = insterm if isinstance(insterm, str) else int(insterm)
+        pc.Record.__init__(self, int(plan_id), int(iss_age), int(sex), int(payterm), insterm, float(sa))
+
+    def apply(self, obj):
+        """
+        写入PricingOd、Stat或Gaap对象，Gaap的保单保额为SA
+
+        :return: obj
+        """
+        for o in [obj, getattr(obj, "pricing", None), getattr(obj, "stat", None)]:
+            if not isinstance(o, (pc.PricingOd, st.Stat, ga.Gaap)):
+                continue
+            o.IssAge, o.sex, o.payterm, o.insterm = self.iss_age, self.sex, self.payterm, self.insterm
+            if isinstance(o, ga.Gaap):
+                o.SA = self.sa
+        return obj
+
+    pass
+
+
+class AssumptionSet(pc.Record):
+    """
+    假设组合：定价利率、现金价值利率、loading表、评估利率、准备金方法、退保率表
+    """
+    __slots__ = ("pricing_int_rate", "cv_int_rate", "load_tbl_name",
+                 "valuation_int_rate", "method", "lapse_tbl_name")
+
+    def __init__(self, pricing_int_rate, cv_int_rate, load_tbl_name, valuation_int_rate, method, lapse_tbl_name):
+        pc.Record.__init__(self, float(pricing_int_rate), float(cv_int_rate), load_tbl_name,
+                           float(valuation_int_rate), method, lapse_tbl_name)
+
+    @classmethod
+    def default(cls):
+        """
+        :return: 各模块类属性中的默认假设
+        :rtype: AssumptionSet
+        """
+        return cls(pc.PricingOd.IntRate, pc.PricingOd.IntRate_CV, pc.PricingOd.load_tbl_name,
+                   st.Stat.IntRate, st.Stat.method, ga.Gaap.lapse_tbl_name)
+
+    def apply(self, obj):
+        """
+        写入PricingOd、Stat、Gaap或对应的Batch*对象及其内部的定价对象
+
+        :return: obj
+        """
+        if isinstance(obj, (pc.PricingOd, bt.BatchPricing)):
+            obj.IntRate, obj.IntRate_CV, obj.load_tbl_name = \
+                self.pricing_int_rate, self.cv_int_rate, self.load_tbl_name
+            return obj
+        if isinstance(obj, (st.Stat, ga.Gaap, bt.BatchStat)):
+            obj.IntRate, obj.method = self.valuation_int_rate, self.method
+        if isinstance(obj, (ga.Gaap, bt.BatchGaap)):
+            obj.lapse_tbl_name = self.lapse_tbl_name
+        if isinstance(obj, ga.Gaap):
+            self.apply(obj.stat)
+        self.apply(obj.pricing)
+        return obj
+
+    pass
+
+
+class ModelPoints(object):
+    """
+    批量model points，各字段为只读数组，pickle时只传数组
+    """
+    __slots__ = ModelPoint.__slots__
+
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm, sa=ga.Gaap.SA):
+        """
+        参数可为数组或标量，标量会被广播；insterm为"105@"时换算为 106 - iss_age
+
+        Example:
+
+        >>> mps = ModelPoints(10513002, np.arange(20, 50), 0, 10, 50)
+        >>> mps.batch(BatchStat).stat()
+        """
+        iss_age = np.atleast_1d(np.asarray(iss_age, dtype='int64'))
+        if isinstance(insterm, str) and insterm == "105@":
+            insterm = 106 - iss_age
+        arrays = np.broadcast_arrays(np.asarray(plan_id, dtype='int64'), iss_age,
+                                     np.asarray(sex, dtype='int64'), np.asarray(payterm, dtype='int64'),
+                                     np.asarray(insterm, dtype='int64'), np.asarray(sa, dtype='float64'))
+        for name, arr in zip(self.__slots__, arrays):
+            arr = np.array(arr)
+            arr.setflags(write=False)
+            object.__setattr__(self, name, arr)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelPoints is immutable")
+
+    def __getstate__(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, arr in zip(self.__slots__, state):
+            arr = np.array(arr)
+            arr.setflags(write=False)
+            object.__setattr__(self, name, arr)
+
+    @classmethod
+    def from_points(cls, points):
+        """
+        :param list points: ModelPoint列表，insterm不能为"105@"
+        :rtype: ModelPoints
+        """
+        return cls(*[[getattr(x, y) for x in points] for y in cls.__slots__])
+
+    @classmethod
+    def from_frame(cls, frame):
+        """
+        :param frame: 包含 plan_id, iss_age, sex, payterm, insterm, sa 列的Dataframe
+        :rtype: ModelPoints
+        """
+        return cls(*[frame[x].values for x in cls.__slots__])
+
+    def __len__(self):
+        return len(self.iss_age)
+
+    def __getitem__(self, item):
+        """
+        整数下标返回ModelPoint，切片或数组下标返回ModelPoints
+        """
+        if isinstance(item, (int, np.integer)):
+            return ModelPoint(*[getattr(self, x)[item] for x in self.__slots__])
+        return ModelPoints(*[getattr(self, x)[item] for x in self.__slots__])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def groups(self):
+        """
+        按险种拆分
+
+        :return: 逐个返回 (plan_id, ModelPoints)
+        """
+        for plan_id in np.unique(self.plan_id):
+            yield int(plan_id), self[self.plan_id == plan_id]
+
+    def batch(self, batch_cls, assumptions=None):
+        """
+        生成批量计算对象，只适用于单一险种
+
+        :param batch_cls: BatchPricing、BatchStat或BatchGaap
+        :param AssumptionSet assumptions: 假设组合，None时使用类属性默认值
+        """
+        plan_ids = np.unique(self.plan_id)
+        if len(plan_ids) != 1:
+            raise ValueError("ModelPoints.batch requires a single plan_id, got {}".format(len(plan_ids)))
+        args = (int(plan_ids[0]), self.iss_age, self.sex, self.payterm, self.insterm)
+        obj = batch_cls(*(args + (self.sa,))) if batch_cls is bt.BatchGaap else batch_cls(*args)
+        if assumptions is not None:
+            assumptions.apply(obj)
+        return obj
+
+    pass
+
+
+if __name__ == '__main__':
+    mp = ModelPoint(10513002, 40, 1, 10, 50, 200000)
+    s = AssumptionSet.default().apply(mp.apply(st.Stat(10513002)))
+    print(s.stat())
@@ -0,0 +1,210 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the cash value and nonforfeiture tables
+
+including
+..py:class:: NonforfeitureTable 现金价值与不丧失价值表
+
+按 (险种, 性别, 缴费期间, 保险期间) 与定价、现金价值假设，对全部投保年龄一次批量计算各保单年度末的：
+cv 现金价值，rpu 减额缴清保额，eti_years 展期定期年数，eti_endow 展期后剩余的满期金；
+金额均为每标准保额（PricingOd.sa），结果按参数缓存，保全查询直接取表；
+逐单准备金的现金价值下限只计算本model point（PricingOd.cv），不经过本表，避免首次评估时计算全部投保年龄
+
+减额缴清：rpu = sa × CV / 未来给付现值（现金价值利率，保费相关给付按原保费计）
+展期定期：以CV按原给付（年金、满期金除外）购买定期保障，保障至期满仍有剩余时剩余部分购买满期金，
+不足一年的部分按年内线性插值；减额缴清保额与满期金均不超过sa
+
+Example:
+
+>>> nf = NonforfeitureTable.get(10513002, 0, 10, 50)
+>>> nf.cv[30]
+>>> nf.lookup([30, 40], [5, 10])
+
+
+"""
+
+
+import threading
+from collections import OrderedDict
+import numpy as np
+import core.tbl_manage as tm
+import core.pricing as pc
+import core.batch as bt
+
+
+class NonforfeitureTable(object):
+    """
+    现金价值与不丧失价值表，数组均为 (投保年龄 × 保单年度)，只读
+    """
+    ASSUMPTIONS = ("IntRate", "IntRate_CV", "load_tbl_name", "mat")
+    # 影响现金价值的假设属性，与BatchPricing类属性同名
+
+    def __init__(self, plan_id, sex, payterm, insterm, **assumptions):
+        """
+
+        :param int plan_id: 险种代码
+        :param int sex: 性别
+        :param int payterm: 缴费期间
+        :param insterm: 保险期间，"105@"表示保至105岁
+        :param assumptions: IntRate、IntRate_CV、load_tbl_name、mat，默认为BatchPricing类属性
+        """
+        self.plan_id = plan_id
+        self.sex = sex
+        self.payterm = payterm
+        self.insterm = insterm
+        self.assumptions = dict((x, assumptions.get(x, getattr(bt.BatchPricing, x))) for x in self.ASSUMPTIONS)
+        self.ages = np.arange(self.max_age() + 1)
+        names = ("cv", "rpu", "eti_years", "eti_endow")
+        if len(self.ages) == 0:
+            for x in names:
+                setattr(self, x, np.zeros((0, 0)))
+            return
+        bp = bt.BatchPricing(plan_id, self.ages, sex, payterm, insterm)
+        for k, v in self.assumptions.items():
+            setattr(bp, k, v)
+        values = self._project(bp)
+        for x, v in zip(names, values):
+            v.setflags(write=False)
+            setattr(self, x, v)
+
+    CACHE_SIZE = 64
+    # 缓存条目上限，超出后按LRU淘汰
+    _instances = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, plan_id, sex, payterm, insterm, **assumptions):
+        """
+        取得缓存的表，参数同构造函数；
+        缓存键含ReadTable.generation，假设表更新后旧表不再命中并在下次写入时清除
+
+        :rtype: NonforfeitureTable
+        """
+        values = tuple(assumptions.get(x, getattr(bt.BatchPricing, x)) for x in cls.ASSUMPTIONS)
+        generation = tm.ReadTable.generation
+        key = (plan_id, sex, payterm, insterm) + values + (generation,)
+        with cls._lock:
+            if key in cls._instances:
+                cls._instances.move_to_end(key)
+                return cls._instances[key]
+        table = cls(plan_id, sex, payterm, insterm, **dict(zip(cls.ASSUMPTIONS, values)))
+        with cls._lock:
+            for k in [k for k in cls._instances if k[-1] != generation]:
+                del cls._instances[k]
+            cls._instances[key] = table
+            while len(cls._instances) > cls.CACHE_SIZE:
+                cls._instances.popitem(last=False)
+        return table
+
+    @classmethod
+    def from_pricing(cls, pricing):
+        """
+        取得与PricingOd对象的险种、model point与假设一致的表
+
+        :param pc.PricingOd pricing: 定价对象
+        :rtype: NonforfeitureTable
+        """
+        return cls.get(pricing.plan_id, pricing.sex, pricing.payterm, pricing.insterm,
+                       **dict((x, getattr(pricing, x)) for x in cls.ASSUMPTIONS))
+
+    def max_age(self):
+        """
+        :return: 发生率表可覆盖整个保险期间的最大投保年龄
+        :rtype: int
+        """
+        return self.max_issue_age(self.plan_id, self.sex, self.insterm)
+
+    @staticmethod
+    def max_issue_age(plan_id, sex, insterm):
+        """
+        :return: 给定险种、性别与保险期间下，发生率表可覆盖整个保险期间的最大投保年龄
+        :rtype: int
+        """
+        ages = [len(tm.ReadTable.get_mort_array(x.get_qx_tbl_name(), sex)) - 1
+                for x in pc.PricingOd(plan_id).ben_list() if x.BEN_TYPE not in ("ann", "endow")]
+        max_reach = min(ages) if ages else 105
+        if isinstance(insterm, str) and insterm == "105@":
+            return min(max_reach, 105)
+        return max_reach - insterm + 1
+
+    @staticmethod
+    def _project(bp):
+        """
+        :param bt.BatchPricing bp: 全部投保年龄的批量定价对象
+        :return: cv, rpu, eti_years, eti_endow
+        :rtype: tuple
+        """
+        cv = np.array(bp.cv())
+        n = bp.insterm[:, None]
+        col = bp.mp_polyr()
+        alive = (col < n) & (cv > 0)
+        # 期满及之后的年度、现金价值非正的年度不丧失价值为0
+        dx = bp.mp_dx_cv("boy")
+        v_mat = (1 + bp.IntRate_CV) ** -bp.insterm
+        dx_mat = bp.mp_lx_eop()[np.arange(len(bp)), bp.insterm - 1] * v_mat
+        dx_next = np.concatenate([dx[:, 1:], np.zeros((len(bp), 1))], axis=1)
+        dx_next[col == n] = np.broadcast_to(dx_mat[:, None], dx.shape)[col == n]
+        # 第t保单年度末（即第t+1年初）的换算函数D
+
+        sa = bp.pricing.sa
+        term = 0
+        for ben in bp.ben_list():
+            if ben.BEN_TYPE not in ("ann", "endow"):
+                term = term + bp.mp_cx_cv(ben) * (bp.mp_ben_fix(ben) + bp.gp()[:, None] * bp.mp_ben_prem(ben))
+        pv_ben = bt.roll_left(bt.safe_div(bt.rev_cumsum(bp.apv_ben_total_cv()), dx), bp.insterm)
+        rpu = np.where(alive, np.fmin(bt.safe_div(cv * sa, pv_ben), sa), 0)
+
+        term = term * np.ones(dx.shape)
+        cum = np.concatenate([np.zeros((len(bp), 1)), term.cumsum(axis=1)], axis=1)
+        # cum[:, j] 为前j个保单年度的定期保障成本
+        start = cum[:, 1:]
+        target = start + np.fmax(cv, 0) * dx_next
+        cum_n = cum[np.arange(len(bp)), bp.insterm][:, None]
+        full = target >= cum_n * (1 - 1e-10)
+        # 现金价值等于未来给付现值（如缴清后）时允许舍入误差
+        j = (cum[:, None, :] <= target[:, :, None]).sum(axis=2) - 1
+        j = np.minimum(j, cum.shape[1] - 2)
+        rows = np.arange(len(bp))[:, None]
+        lo = cum[rows, j]
+        hi = cum[rows, j + 1]
+        frac = bt.safe_div(target - lo, hi - lo)
+        eti_years = np.where(full, n - col, j - col + frac)
+        eti_years = np.where(alive, eti_years, 0)
+        eti_endow = np.where(alive & full, np.clip(bt.safe_div(target - cum_n, dx_mat[:, None]), 0, sa), 0)
+        return cv, rpu, eti_years, eti_endow
+
+    def lookup(self, iss_age, polyr):
+        """
+        按投保年龄与保单年度取不丧失价值
+
+        :param iss_age: 投保年龄
+        :param polyr: 保单年度，取该年度末的价值
+        :return: 列为 iss_age, polyr, cv, rpu, eti_years, eti_endow 的Dataframe
+        :rtype: tm.pd.DataFrame
+        """
+        iss_age, polyr = np.broadcast_arrays(np.atleast_1d(np.asarray(iss_age, dtype='int64')),
+                                             np.asarray(polyr, dtype='int64'))
+        if ((iss_age < 0) | (iss_age >= len(self.ages))).any():
+            raise ValueError("iss_age out of range for plan {}".format(self.plan_id))
+        if ((polyr < 1) | (polyr > self.cv.shape[1])).any():
+            raise ValueError("polyr out of range for plan {}".format(self.plan_id))
+        out = tm.pd.DataFrame({"iss_age": iss_age, "polyr": polyr})
+        for x in ("cv", "rpu", "eti_years", "eti_endow"):
+            out[x] = getattr(self, x)[iss_age, polyr - 1]
+        return out
+
+    def frame(self):
+        """
+        :return: 全部投保年龄、保单年度的长表
+        :rtype: tm.pd.DataFrame
+        """
+        age, polyr = np.meshgrid(self.ages, np.arange(1, self.cv.shape[1] + 1), indexing='ij')
+        return self.lookup(age.ravel(), polyr.ravel())
+
+    pass
+
+
+if __name__ == '__main__':
+    nf = NonforfeitureTable.get(10513002, 0, 10, 50)
+    print(nf.lookup([30, 30, 30], [1, 10, 20]))
@@ -6,6 +6,7 @@ This module defined the pricing module for ordinary life insurance products
 including
 ..py:class:: Benefit 责任
 ..py:class:: Plan 险种信息
+..py:class:: ProductIndex 险种与责任参数索引
 ..py:class:: PricingOd 定价模块
 
 
@@ -14,17 +15,25 @@ including
 
 import numpy as np
 import core.tbl_manage as tm
+import core.memo as memo
+import core.decrement as dc
+import core.benefit_rule as br
 from functools import reduce
 #from peewee import *
 #from playhouse import postgres_ext as pge
 import os
+import threading
 
 
 class Benefit(object):
     """
     责任基础类，获取发生率表，赔付表
 
+    Benefit不可修改，同一险种的Benefit由ProductIndex生成并在各对象、各线程间共享，
+    相同类型与参数的Benefit相等，可作为缓存键
+
     """
+    __slots__ = ("b_id", "uid_f", "uid_p")
 
     def __init__(self, b_id, uid_f, uid_p):
         """
@@ -38,25 +47,51 @@ class Benefit(object):
         :param int uid_f: 责任赔付fix金额的uid
         :param int uid_p: 责任赔付prem金额的uid
         """
-        self.b_id = b_id
-        self.uid_f = uid_f
-        self.uid_p = uid_p
+        object.__setattr__(self, "b_id", int(b_id))
+        object.__setattr__(self, "uid_f", int(uid_f))
+        object.__setattr__(self, "uid_p", int(uid_p))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Benefit is immutable")
+
+    def __reduce__(self):
+        return self.__class__, (self.b_id, self.uid_f, self.uid_p)
+
+    def _key(self):
+        return self.__class__, self.b_id, self.uid_f, self.uid_p
+
+    def __eq__(self, other):
+        return isinstance(other, Benefit) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return "{}({}, {}, {})".format(self.__class__.__name__, self.b_id, self.uid_f, self.uid_p)
 
     def get_parameter(self):
         """
         读取责任的参数
         
-        :return:参数列表的Dataframe
-        :rtype: tm.pd.Dataframe
+        :return: 索引中的责任参数
+        :rtype: BenefitInfo
         
         Example:
         >>> Benefit(1,1,1).get_parameter()
-           benefit_id benefit_type       tbl_name
-        0           1        death  CL_2000_1.csv
+        BenefitInfo(benefit_id=1, benefit_type='death', tbl_name='CL_2000_1.csv')
                 
         """
-        b_t = tm.ReadTable.get_ben_table()
-        return b_t[b_t['benefit_id'] == self.b_id]
+        return ProductIndex.get().benefit(self.b_id)
+
+    def get_qx_tbl_name(self):
+        """
+        :return: 责任的发生率表名
+        :rtype: str
+        """
+        return ProductIndex.get().benefit(self.b_id).tbl_name
 
     def get_qx_tbl(self):
         """
@@ -65,7 +100,7 @@ class Benefit(object):
         :return: 发生率的Dataframe
         :rtype: tm.pd.Dataframe
         """
-        tbl_name = self.get_parameter()['tbl_name'].values[0]
+        tbl_name = self.get_qx_tbl_name()
         return tm.ReadTable.get_mort_table(tbl_name)
 
     def get_ben_sa_fix(self, nb, np, age, polyr, mat):
@@ -121,6 +156,7 @@ class Db(Benefit):
     >>> db1 = Db(1,1,1)
     
     """
+    __slots__ = ()
     BEN_TYPE = "death"
 
     def __init__(self, b_id, uid_f, uid_p):
@@ -137,6 +173,7 @@ class Acc(Benefit):
     >>> ac1 = Acc(1,1,1)
 
     """
+    __slots__ = ()
     BEN_TYPE = "acc"
 
 
@@ -148,6 +185,7 @@ class Ci(Benefit):
     >>> ci1 = Ci(1,1,1)
 
     """
+    __slots__ = ()
     BEN_TYPE = "ci"
 
     def __init__(self, b_id, uid_f, uid_p):
@@ -159,6 +197,7 @@ class Ann(Benefit):
     """
     年金类，规定BEN_TYPE为ann
     """
+    __slots__ = ()
     BEN_TYPE = "ann"
 
     def __init__(self, b_id, uid_f, uid_p):
@@ -190,6 +229,130 @@ class Ann(Benefit):
         return ben
 
 
+class Record(object):
+    """
+    不可修改的参数记录，属性由子类的__slots__定义，按属性值比较与哈希；
+    子类构造函数的位置参数须与__slots__顺序一致
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, x) for x in self.__slots__)
+
+    def _key(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.__class__.__name__,) + self._key())
+
+    def replace(self, **kwargs):
+        """
+        :return: 修改部分属性后的新记录，经子类构造函数生成，与直接构造时的类型转换与校验一致
+        """
+        unknown = set(kwargs) - set(self.__slots__)
+        if unknown:
+            raise AttributeError("{} has no field {}".format(self.__class__.__name__, ", ".join(sorted(unknown))))
+        return self.__class__(*[kwargs.get(x, getattr(self, x)) for x in self.__slots__])
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__,
+                               ", ".join("{}={!r}".format(x, getattr(self, x)) for x in self.__slots__))
+
+
+class BenefitInfo(Record):
+    """
+    list_benifit.csv中的一行
+    """
+    __slots__ = ("benefit_id", "benefit_type", "tbl_name")
+
+
+class PlanRecord(Record):
+    """
+    险种参数，benefits为Benefit的tuple，顺序与list_plan_benifit.csv一致
+    """
+    __slots__ = ("plan_id", "underwrite", "plan_type", "benefits")
+
+
+class ProductIndex(object):
+    """
+    险种与责任参数索引，读表一次后按plan_id、benefit_id以dict取值
+
+    索引建立后不再修改，可在线程间共享，fork后的子进程直接继承；
+    ReadTable.clear_cache后下一次get时重建
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.generation = tm.ReadTable.generation
+        ben_t = tm.ReadTable.get_ben_table()
+        self.benefits = dict(
+            (int(b), BenefitInfo(int(b), t, n))
+            for b, t, n in zip(ben_t['benefit_id'], ben_t['benefit_type'], ben_t['tbl_name']))
+        type_path = os.path.join(tm.ReadTable.PLAN_DIRECTORY, "list_plan_type.csv")
+        types = {}
+        if os.path.exists(type_path):
+            type_t = tm.ReadTable.read_csv(type_path)
+            types = dict((int(p), (u, t)) for p, u, t in zip(type_t['plan_id'], type_t['underwrite'], type_t['type']))
+        pb_t = tm.ReadTable.get_plan_table()
+        bens = {}
+        for p, t, b, f, u in zip(pb_t['plan_id'], pb_t['benefit_type'], pb_t['benefit_id'],
+                                 pb_t['sa_uid_f'], pb_t['sa_uid_p']):
+            bens.setdefault(int(p), []).append(PricingOd.get_ben(int(b), t, int(f), int(u)))
+        self.plans = dict(
+            (p, PlanRecord(p, types.get(p, (None, None))[0], types.get(p, (None, None))[1], tuple(x)))
+            for p, x in bens.items())
+
+    @classmethod
+    def get(cls):
+        """
+        :return: 与当前ReadTable缓存一致的索引
+        :rtype: ProductIndex
+        """
+        index = cls._instance
+        if index is not None and index.generation == tm.ReadTable.generation:
+            return index
+        with cls._lock:
+            if cls._instance is None or cls._instance.generation != tm.ReadTable.generation:
+                cls._instance = cls()
+            return cls._instance
+
+    def plan(self, plan_id):
+        """
+        :param int plan_id: 险种代码
+        :rtype: PlanRecord
+        """
+        try:
+            return self.plans[int(plan_id)]
+        except KeyError:
+            raise KeyError("unknown plan_id {}".format(plan_id))
+
+    def benefit(self, b_id):
+        """
+        :param int b_id: 责任代码
+        :rtype: BenefitInfo
+        """
+        try:
+            return self.benefits[int(b_id)]
+        except KeyError:
+            raise KeyError("unknown benefit_id {}".format(b_id))
+
+    pass
+
+
 class Plan(object):
     """
     险种基础类，读取险种，险种类型，险种包含的责任
@@ -211,22 +374,26 @@ class Plan(object):
 
         Example:
         
+        >>> Plan(10513002).plan_type()
 
-        :return: 险种类型参数
-        :rtype: tm.pd.Dataframe
+        :return: 险种类型，list_plan_type.csv中没有该险种时为None
+        :rtype: str
         """
-        pb_t = tm.ReadTable.get_plan_table()
-        pb_t = pb_t[pb_t['plan_id'] == self.plan_id]
-        return pb_t
+        return self.record().plan_type
 
     def plan_benefit(self):
-        pb_t = tm.ReadTable.get_plan_table()
-        pb_t = pb_t[pb_t['plan_id'] == self.plan_id]
-        return pb_t[['benefit_type', 'benefit_id', 'sa_uid_f', 'sa_uid_p']]
-    # 读取Plan下的责任列表
+        return self.record().benefits
+    # 读取Plan下的责任列表，为Benefit的tuple
+
+    def record(self):
+        """
+        :return: 索引中的险种参数
+        :rtype: PlanRecord
+        """
+        return ProductIndex.get().plan(self.plan_id)
 
     def plan_benifit_count(self):
-        b_count = len(self.plan_benefit().index)
+        b_count = len(self.record().benefits)
         return b_count
     # 责任个数
 
@@ -286,18 +453,14 @@ class PricingOd(object):
         return ben
     # 根据type生成Ben类
 
+    @memo.node("plan_id")
     def ben_list(self):
         """
         获取险种对应的Benefit类的list
-        :return: Benefit类的list
-        :rtype: list
-        """
-        ids = list(self.plan().plan_benefit()['benefit_id'].values)
-        types = list(self.plan().plan_benefit()['benefit_type'].values)
-        uid_f = list(self.plan().plan_benefit()['sa_uid_f'].values)
-        uid_p = list(self.plan().plan_benefit()['sa_uid_p'].values)
-        ben_l = list(map(self.get_ben, ids, types, uid_f, uid_p))
-        return ben_l
+        :return: Benefit类的tuple，各对象共享，不可修改
+        :rtype: tuple
+        """
+        return self.plan().record().benefits
     # 读表获取plan下的Ben类
 
     # def ben_dict(self):
@@ -307,6 +470,7 @@ class PricingOd(object):
     #     return dict(zip(types, bens))
     # # 读表获取plan下的Ben类
 
+    @memo.node("IssAge", "insterm")
     def apv_mp_age(self):
         """
         :return: model points对应的age列 
@@ -318,6 +482,7 @@ class PricingOd(object):
             mp_age = np.array(range(self.IssAge, self.IssAge + self.insterm, 1), dtype='int32')
         return mp_age
 
+    @memo.node()
     def apv_mp_polyr(self):
         """
         
@@ -332,24 +497,26 @@ class PricingOd(object):
         """
         
         :param ben: 
-        :return: 生成benefit的fix_sa的获取函数
+        :return: 生成benefit的fix_sa的获取函数，返回float64数组
         """
-        get_ben_sa_np = np.frompyfunc(ben.get_ben_sa_fix, 5, 1)
+        get_ben_sa_np = br.get_fix_rule(ben)
         return get_ben_sa_np
 
+    @memo.node("insterm", "payterm", "mat")
     def mp_ben_fix(self, ben):
-        return self.get_ben_sa_fix(ben)(self.insterm, self.payterm, self.apv_mp_age(), self.apv_mp_polyr())
+        return self.get_ben_sa_fix(ben)(self.insterm, self.payterm, self.apv_mp_age(), self.apv_mp_polyr(), self.mat)
 
     @staticmethod
     def get_ben_sa_prem(ben):
         """
 
         :param ben: 
-        :return: 生成benefit的prem_sa的获取函数
+        :return: 生成benefit的prem_sa的获取函数，返回float64数组
         """
-        get_ben_sa_np = np.frompyfunc(ben.get_ben_sa_p, 5, 1)
+        get_ben_sa_np = br.get_prem_rule(ben)
         return get_ben_sa_np
 
+    @memo.node("insterm", "payterm", "mat")
     def mp_ben_prem(self, ben):
         return self.get_ben_sa_prem(ben)(self.insterm, self.payterm, self.apv_mp_age(), self.apv_mp_polyr(), self.mat)
     # 生成model points中某个ben对应的sa列
@@ -369,16 +536,21 @@ class PricingOd(object):
     #     qx_list = tbl[tbl.age >= age][sel]
     #     return qx_list
 
-    def get_qx_list(self, sex, tbl):
+    def get_qx_list(self, sex, tbl_name):
         """
         
-        :param sex: 
-        :param tbl: 
-        :return: 读取tbl中的model points对应的行
+        :param sex: 性别
+        :param str tbl_name: 发生率表名，可为选择-终极表
+        :return: model points对应的发生率
+        :rtype: np.ndarray
         """
-        qx_list = tbl[tbl['age'].isin(self.apv_mp_age())]["male" if sex == 0 else "female"]
-        return qx_list
+        age = self.apv_mp_age()
+        qx = tm.ReadTable.get_select_table(tbl_name, sex).lookup(age[0], np.arange(len(age)))
+        if np.isnan(qx).any():
+            raise ValueError("age out of range in {}".format(tbl_name))
+        return qx
 
+    @memo.node("sex")
     def adj_qx_list(self, sex, ben):
         """
         
@@ -390,12 +562,13 @@ class PricingOd(object):
         if (ben.BEN_TYPE == "ann") or (ben.BEN_TYPE == "endow"):
             qx = np.zeros(len(self.apv_mp_age()))
         else:
-            qx = self.get_qx_list(sex, ben.get_qx_tbl())
-        if [x for x in self.ben_list() if x.BEN_TYPE == "ci"].__len__() != 0:
-            if ben.BEN_TYPE == "death":
-                qx = qx * (1 - self.get_qx_list(self.sex, tm.ReadTable.get_mort_table("K_2000_1.csv")).values)
+            qx = self.get_qx_list(sex, ben.get_qx_tbl_name())
+        adj = dc.KERNEL.adj_tbl_name(ben, self.ben_list())
+        if adj is not None:
+            qx = qx * (1 - self.get_qx_list(self.sex, adj))
         return qx
 
+    @memo.node("sex")
     def mp_qx_ben_list(self, ben):
         """
         
@@ -417,6 +590,7 @@ class PricingOd(object):
         return load_list
     # TODO 拆分首年loading
 
+    @memo.node("payterm", "load_tbl_name")
     def mp_ld(self):
         """
         
@@ -424,9 +598,10 @@ class PricingOd(object):
         :rtype: np.ndarray
         """
         loading = self.get_load_list(self.payterm, self.load_tbl_name).values
-        loading[np.isnan(loading)] = 0
+        loading = np.where(np.isnan(loading), 0, loading)
         return loading[:len(self.apv_mp_age())]
 
+    @memo.node("payterm")
     def mp_netp(self):
         """
         
@@ -448,13 +623,13 @@ class PricingOd(object):
             raise NotImplementedError("death benifit number error")
         # db部分处理
         qx = self.mp_qx_ben_list(self.ben_list())
-        lx = 1 - reduce(lambda x, y: x + y, qx)
-        lx = lx.cumprod()
-        return lx
+        return dc.KERNEL.project(np.stack(qx)).lx_eop[0]
 
+    @memo.node()
     def mp_lx_eop(self):
         return self.mp_lx_cal()
 
+    @memo.node()
     def mp_lx_bop(self):
         lx = np.roll(self.mp_lx_eop(), 1)
         lx[0] = 1
@@ -471,6 +646,7 @@ class PricingOd(object):
     #     return lx
         # TODO: 待区分付款与保障lx与db
 
+    @memo.node("IntRate")
     def mp_dx(self, phase="moy"):
         """
         
@@ -487,6 +663,7 @@ class PricingOd(object):
 
     # Dx calculate
 
+    @memo.node("IntRate")
     def mp_cx(self, ben):
         """
         
@@ -512,13 +689,7 @@ class PricingOd(object):
     def mp_plan_prem(self):
         return map(self.mp_ben_prem_sum, self.ben_list())
 
-    def mp_end(self):
-        if self.plan.plan_type() is "Endowment":
-            endow =
-        else:
-            endow = 0
-        return endow
-
+    @memo.node()
     def gp(self):
         """
         普通险保费计算公式
@@ -527,6 +698,7 @@ class PricingOd(object):
         """
         return round(sum(self.mp_plan_fix())/(sum(self.mp_netp()) - sum(self.mp_plan_prem())), 2)
 
+    @memo.node("IntRate_CV")
     def mp_dx_cv(self, phase="moy"):
         """
         CV的换算函数
@@ -542,16 +714,19 @@ class PricingOd(object):
         return dx
 
 
+    @memo.node()
     def mp_cx_cv(self, ben):
         cx = self.mp_dx_cv() * self.mp_qx_ben_list(ben)
         return cx
 
+    @memo.node("payterm")
     def mp_netp_cv(self):
         prem = np.zeros(len(self.apv_mp_age()), dtype='int32')
         prem[:self.payterm] = 1
         netp = (prem - self.mp_ld()) * self.mp_dx_cv("boy")
         return netp
 
+    @memo.node()
     def mp_ben_fix_cv(self, ben):
         return self.mp_cx_cv(ben) * self.mp_ben_fix(ben)
 
@@ -564,6 +739,7 @@ class PricingOd(object):
 
     # 单个ben（prem类型）的apv计算
 
+    @memo.node()
     def mp_ben_prem_cv(self, ben):
         return self.mp_cx_cv(ben) * self.mp_ben_prem(ben)
 
@@ -572,17 +748,21 @@ class PricingOd(object):
 
     # ben list（prem类型）的apv
 
+    @memo.node()
     def apv_ben_total_cv(self):
         return reduce(lambda x, y: x+y, self.apv_ben_fix_list()) + (self.gp() * reduce(lambda x, y: x+y, self.apv_ben_prem_list()))
 
+    @memo.node()
     def gp_cv(self):
         return sum(self.apv_ben_total_cv()) / sum(self.mp_netp_cv())
 
+    @memo.node()
     def pvr(self):
         pvr = self.apv_ben_total_cv() - np.float64(self.gp_cv()) * self.mp_netp_cv()
         pvr = np.roll(pvr[::-1].cumsum()[::-1] / self.mp_dx_cv("boy"), -1)
         return pvr
 
+    @memo.node("payterm")
     def cv(self):
         k = 0.8
         r = np.fmin(k + self.apv_mp_polyr() * (1 - k) / np.fmin(20, self.payterm), 1)
@@ -0,0 +1,182 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the premium rate book generator
+
+including
+..py:class:: RateBook 费率表
+
+按 (性别, 缴费期间) 分组，每组记录其依赖的假设（发生率表对应性别的列、loading表对应缴费期间的列、利率等），
+refresh时只重新计算假设发生变化的组，全部待算组合并为一次BatchPricing计算
+
+
+"""
+
+
+import numpy as np
+import core.tbl_manage as tm
+import core.decrement as dc
+import core.batch as bt
+
+
+class RateBook(object):
+    """
+    费率表，包含各投保年龄、性别、缴费期间的GP与现金价值
+    """
+    def __init__(self, plan_id, insterm, ages=None, sexes=(0, 1), payterms=None, load_tbl_name=None):
+        """
+
+        Example:
+
+        >>> book = RateBook(10513002, 50)
+        >>> book.gp_table()
+        >>> tm.ReadTable.clear_cache("Loading_20313001.csv")
+        >>> book.refresh()
+
+        :param int plan_id: 险种代码
+        :param insterm: 保险期间，"105@"表示保至105岁
+        :param ages: 投保年龄，默认为0至70岁中发生率表覆盖保险期间的年龄
+        :param sexes: 性别
+        :param payterms: 缴费期间，默认为loading表的全部列
+        :param str load_tbl_name: loading表名，默认为BatchPricing.load_tbl_name
+        """
+        self.plan_id = plan_id
+        self.insterm = insterm
+        self.load_tbl_name = load_tbl_name or bt.BatchPricing.load_tbl_name
+        self.sexes = list(sexes)
+        self.payterms = list(payterms) if payterms is not None else self.load_payterms()
+        if insterm != "105@":
+            self.payterms = [x for x in self.payterms if x <= insterm]
+        self.ages = np.asarray(ages if ages is not None else self.default_ages(), dtype='int64')
+        self._inputs = {}
+        self._gp = {}
+        self._cv = {}
+        self.refresh()
+
+    def load_payterms(self):
+        """
+        :return: loading表中的缴费期间列
+        :rtype: list
+        """
+        tbl = tm.ReadTable.get_load_table(self.load_tbl_name + ".csv")
+        return sorted(int(x) for x in tbl.columns if x.isdigit())
+
+    def _batch(self, ages, sexes, payterms):
+        batch = bt.BatchPricing(self.plan_id, ages, sexes, payterms, self.insterm)
+        batch.load_tbl_name = self.load_tbl_name
+        return batch
+
+    def default_ages(self):
+        if self.insterm == "105@":
+            return np.arange(0, 71)
+        probe = self._batch([0], self.sexes[0], self.payterms[0])
+        max_age = min(len(tm.ReadTable.get_mort_array(x, s)) for x in self.mort_tables(probe) for s in self.sexes) - 1
+        return np.arange(0, min(70, max_age - self.insterm + 1) + 1)
+
+    def terms(self):
+        """
+        :return: 各投保年龄的保险期间
+        :rtype: np.ndarray
+        """
+        if self.insterm == "105@":
+            return 106 - self.ages
+        return np.full(len(self.ages), self.insterm)
+
+    @staticmethod
+    def mort_tables(batch):
+        """
+        :return: 险种使用的发生率表名
+        :rtype: list
+        """
+        bens = batch.ben_list()
+        names = [x.get_qx_tbl_name() for x in bens
+                 if x.BEN_TYPE not in ("ann", "endow")]
+        for ben in bens:
+            adj = dc.KERNEL.adj_tbl_name(ben, bens)
+            if adj is not None and adj not in names:
+                names.append(adj)
+        return names
+
+    def group_inputs(self, sex, payterm):
+        """
+        一组 (性别, 缴费期间) 依赖的全部假设
+
+        :return: 假设列表，用于比较是否变化
+        :rtype: list
+        """
+        batch = self._batch([0], sex, payterm)
+        inputs = [(x.b_id, x.BEN_TYPE, x.uid_f, x.uid_p) for x in batch.ben_list()]
+        inputs += [batch.IntRate, batch.IntRate_CV, batch.mat]
+        inputs += [tm.ReadTable.get_mort_array(x, sex) for x in self.mort_tables(batch)]
+        inputs.append(tm.ReadTable.get_load_array(self.load_tbl_name + ".csv", payterm))
+        return inputs
+
+    @staticmethod
+    def _same_inputs(x, y):
+        if x is None or len(x) != len(y):
+            return False
+        return all(np.array_equal(a, b) if isinstance(a, np.ndarray) else a == b for a, b in zip(x, y))
+
+    def refresh(self):
+        """
+        重新读取假设，只重算假设变化的组
+
+        :return: 重算的 (性别, 缴费期间) 组
+        :rtype: list
+        """
+        dirty = []
+        for sex in self.sexes:
+            for payterm in self.payterms:
+                inputs = self.group_inputs(sex, payterm)
+                if not self._same_inputs(self._inputs.get((sex, payterm)), inputs):
+                    self._inputs[(sex, payterm)] = [x.copy() if isinstance(x, np.ndarray) else x for x in inputs]
+                    dirty.append((sex, payterm))
+        if not dirty:
+            return dirty
+        n = len(self.ages)
+        sexes = np.repeat([x[0] for x in dirty], n)
+        payterms = np.repeat([x[1] for x in dirty], n)
+        batch = self._batch(np.tile(self.ages, len(dirty)), sexes, payterms)
+        gp = batch.gp()
+        cv = batch.cv()
+        for i, key in enumerate(dirty):
+            self._gp[key] = gp[i * n:(i + 1) * n]
+            self._cv[key] = cv[i * n:(i + 1) * n]
+        return dirty
+
+    def gp_table(self):
+        """
+        :return: GP费率表，行为投保年龄，列为 (性别, 缴费期间)
+        :rtype: tm.pd.DataFrame
+        """
+        keys = [(s, p) for s in self.sexes for p in self.payterms]
+        tbl = tm.pd.DataFrame(np.column_stack([self._gp[x] for x in keys]), index=self.ages,
+                              columns=tm.pd.MultiIndex.from_tuples(keys, names=["sex", "payterm"]))
+        tbl.index.name = "age"
+        return tbl
+
+    def cv_table(self):
+        """
+        :return: 现金价值表，列为 sex, payterm, age, polyr, cv
+        :rtype: tm.pd.DataFrame
+        """
+        frames = []
+        term = self.terms()
+        for (sex, payterm), cv in sorted(self._cv.items()):
+            age, polyr = np.indices(cv.shape).reshape(2, -1)
+            keep = polyr < term[age]
+            frames.append(tm.pd.DataFrame({
+                "sex": sex,
+                "payterm": payterm,
+                "age": self.ages[age[keep]],
+                "polyr": polyr[keep] + 1,
+                "cv": cv[age[keep], polyr[keep]]
+            }))
+        return tm.pd.concat(frames, ignore_index=True)[["sex", "payterm", "age", "polyr", "cv"]]
+
+    pass
+
+
+if __name__ == '__main__':
+    book = RateBook(10513002, 50)
+    print(book.gp_table())
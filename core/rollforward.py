@@ -0,0 +1,204 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the valuation-date rollforward
+
+including
+..py:func:: fingerprint 险种假设指纹
+..py:class:: Rollforward 增量法定准备金评估
+
+每个model point (投保年龄, 性别, 缴费期间, 保险期间) 的准备金因子向量（每千元保额，各保单年度末）
+与各保单年度的修正净保费保存在状态文件中，评估时按保单已经过月数以 (1-f)(tV + P) + f·(t+1)V 插值取值，保额只用于缩放；
+只有新出现的model point、或险种假设指纹变化（利率、方法、loading表、相关表文件修改）时才重新计算，
+终止状态的保单准备金为0，不参与计算
+
+Example:
+
+>>> rf = Rollforward("reserve_state.npz")
+>>> out = rf.value(policies)   # policies 含 POLICY_COLUMNS 与 months，可选 status
+>>> rf.save()
+>>> rf.last_stats
+
+
+"""
+
+
+import os
+import json
+import numpy as np
+import core.tbl_manage as tm
+import core.pricing as pc
+import core.stat as st
+import core.batch as bt
+import core.commutation as cm
+import core.modelpoint as mpm
+import core.runner as rn
+import core.compress as cp
+
+
+INFORCE_STATUS = "inforce"
+# status列为其他值（lapse、death等）的保单不计提准备金
+
+
+def fingerprint(plan_id, assumptions=None):
+    """
+    险种假设指纹，假设组合或险种相关表文件（大小、修改时间）变化时改变
+
+    :param int plan_id: 险种代码
+    :param mpm.AssumptionSet assumptions: 假设组合，默认为类属性
+    :rtype: str
+    """
+    assumptions = assumptions or mpm.AssumptionSet.default()
+    rt = tm.ReadTable
+    paths = [os.path.join(rt.PLAN_DIRECTORY, x) for x in ("list_plan_benifit.csv", "list_benifit.csv")]
+    paths.append(os.path.join(rt.LOADING_TABLE_DIRECTORY, assumptions.load_tbl_name + ".csv"))
+    paths.append(os.path.join(rt.MORT_TABLE_DIRECTORY, "K_2000_1.csv"))
+    for ben in pc.PricingOd(plan_id).ben_list():
+        if ben.BEN_TYPE not in ("ann", "endow"):
+            paths.append(os.path.join(rt.MORT_TABLE_DIRECTORY, ben.get_qx_tbl_name()))
+    files = [(os.path.basename(x), os.path.getsize(x), os.path.getmtime(x)) for x in paths if os.path.exists(x)]
+    return json.dumps([repr(assumptions), files])
+
+
+def _npz_path(path):
+    """
+    np.savez会为不以.npz结尾的路径补上扩展名，读写统一使用补全后的路径
+    """
+    if path is None or path.endswith(".npz"):
+        return path
+    return path + ".npz"
+
+
+class Rollforward(object):
+    """
+    增量法定准备金评估，状态可保存为npz文件供下一评估期使用
+    """
+    def __init__(self, path=None, assumptions=None):
+        """
+
+        :param str path: 状态文件路径，存在时读取，缺少.npz扩展名时自动补上（与np.savez一致）
+        :param mpm.AssumptionSet assumptions: 假设组合，默认为类属性
+        """
+        self.path = _npz_path(path)
+        self.assumptions = assumptions
+        self.factors = {}
+        # plan_id -> {"fingerprint": str, "mp": (n × 4) int数组, "rsv": (n × 保单年度) 准备金因子,
+        #             "prem": 同形状的修正净保费}
+        self.last_stats = None
+        if self.path is not None and os.path.exists(self.path):
+            self.load(self.path)
+
+    def load(self, path):
+        with np.load(_npz_path(path), allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            for plan_id, fp in meta.items():
+                if "prem_{}".format(plan_id) not in data:
+                    continue
+                # 缺少修正净保费的旧状态文件，该险种重新计算
+                self.factors[int(plan_id)] = {
+                    "fingerprint": fp,
+                    "mp": data["mp_{}".format(plan_id)],
+                    "rsv": data["rsv_{}".format(plan_id)],
+                    "prem": data["prem_{}".format(plan_id)]
+                }
+
+    def save(self, path=None):
+        """
+        :param str path: 状态文件路径，默认为构造时的路径
+        """
+        path = _npz_path(path) or self.path
+        arrays = {"meta": np.array(json.dumps(dict((str(k), v["fingerprint"]) for k, v in self.factors.items())))}
+        for plan_id, v in self.factors.items():
+            arrays["mp_{}".format(plan_id)] = v["mp"]
+            arrays["rsv_{}".format(plan_id)] = v["rsv"]
+            arrays["prem_{}".format(plan_id)] = v["prem"]
+        np.savez(path, **arrays)
+
+    def _project(self, plan_id, mp):
+        bs = bt.BatchStat(plan_id, mp[:, 0], mp[:, 1], mp[:, 2], mp[:, 3])
+        if self.assumptions is not None:
+            self.assumptions.apply(bs)
+        valid = bs.pricing.mp_valid()
+        return bs.stat() * valid, bs.trnp() * valid
+
+    def _merge(self, plan_id, mp):
+        """
+        取得mp中各model point的准备金因子，缺少的model point计算后并入状态
+
+        :return: 各行在状态中的下标，重算的model point数
+        :rtype: tuple
+        """
+        fp = fingerprint(plan_id, self.assumptions)
+        entry = self.factors.get(plan_id)
+        if entry is None or entry["fingerprint"] != fp:
+            entry = {"fingerprint": fp, "mp": np.zeros((0, 4), dtype='int64'), "rsv": np.zeros((0, 0)),
+                     "prem": np.zeros((0, 0))}
+        known = dict((tuple(x), i) for i, x in enumerate(entry["mp"].tolist()))
+        uniq, inverse = cp.group_rows(tm.pd.DataFrame(mp), [0, 1, 2, 3])
+        new = np.array([tuple(x) not in known for x in uniq.tolist()], dtype=bool)
+        if new.any():
+            add = dict(zip(("rsv", "prem"), self._project(plan_id, uniq[new])))
+            width = max(add["rsv"].shape[1], entry["rsv"].shape[1])
+            for x in uniq[new].tolist():
+                known[tuple(x)] = len(known)
+            merged = {"fingerprint": fp, "mp": np.concatenate([entry["mp"], uniq[new]])}
+            for name in ("rsv", "prem"):
+                old = np.zeros((len(entry[name]), width))
+                old[:, :entry[name].shape[1]] = entry[name]
+                new_rows = np.zeros((len(add[name]), width))
+                new_rows[:, :add[name].shape[1]] = add[name]
+                merged[name] = np.concatenate([old, new_rows])
+            entry = merged
+        self.factors[plan_id] = entry
+        index = np.array([known[tuple(x)] for x in uniq.tolist()], dtype='int64')
+        return index[inverse], int(new.sum())
+
+    def value(self, policies):
+        """
+        评估各保单在评估时点的准备金
+
+        :param tm.pd.DataFrame policies: 包含POLICY_COLUMNS与months（评估时点已经过的保单月数），可选status列
+        :return: 列为 policy_id, reserve 的Dataframe
+        :rtype: tm.pd.DataFrame
+        """
+        reserve = np.zeros(len(policies))
+        active = np.ones(len(policies), dtype=bool)
+        if "status" in policies.columns:
+            active = (policies["status"] == INFORCE_STATUS).values
+        stats = {"policies": len(policies), "inforce": int(active.sum()), "reprojected": 0}
+        inforce = policies[active]
+        rows = np.nonzero(active)[0]
+        for plan_id, idx in inforce.groupby("plan_id").indices.items():
+            grp = inforce.iloc[idx]
+            mp = np.column_stack([grp[x].values.astype('int64') for x in rn.MP_COLUMNS])
+            index, n_new = self._merge(int(plan_id), mp)
+            stats["reprojected"] += n_new
+            entry = self.factors[int(plan_id)]
+            rsv = cm.interp_reserve(entry["rsv"][index], grp["months"].values, entry["prem"][index])
+            reserve[rows[idx]] = rsv * grp["sa"].values / st.Stat.sa
+        stats["model_points"] = sum(len(x["mp"]) for x in self.factors.values())
+        self.last_stats = stats
+        return tm.pd.DataFrame({"policy_id": policies["policy_id"].values, "reserve": reserve})
+
+    pass
+
+
+if __name__ == '__main__':
+    rng = np.random.RandomState(0)
+    n = 10000
+    demo = tm.pd.DataFrame({
+        "policy_id": np.arange(n),
+        "plan_id": 10513002,
+        "iss_age": rng.randint(0, 56, n),
+        "sex": rng.randint(0, 2, n),
+        "payterm": rng.choice([1, 5, 10], n),
+        "insterm": 50,
+        "sa": rng.randint(10, 500, n) * 1000.,
+        "months": rng.randint(0, 360, n)
+    })
+    rf = Rollforward()
+    rf.value(demo)
+    print(rf.last_stats)
+    demo["months"] += 3
+    rf.value(demo)
+    print(rf.last_stats)
@@ -0,0 +1,129 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the seriatim valuation runner
+
+including
+..py:func:: value_chunk 计算一组保单的法定准备金
+..py:class:: StatRunner 多进程逐单法定准备金计算
+
+保单文件为csv，包含POLICY_COLUMNS中的列，由ingest.PolicyStream分块读取与校验，准备金按 sa / Stat.sa 缩放，
+结果以 policy_id,polyr,reserve 的长表格式逐块写入输出文件
+
+
+"""
+
+
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import core.tbl_manage as tm
+import core.stat as st
+import core.batch as bt
+import core.ingest as ig
+
+
+POLICY_COLUMNS = ig.POLICY_COLUMNS
+MP_COLUMNS = ig.MP_COLUMNS
+ASSUMPTION_KEY = ig.ASSUMPTION_KEY
+# 列定义见ingest
+
+
+def value_chunk(plan_id, policy_id, iss_age, sex, payterm, insterm, sa):
+    """
+    计算一组同险种保单的法定准备金，相同model point只计算一次
+
+    :param int plan_id: 险种代码
+    :param np.ndarray policy_id: 保单号
+    :return: (policy_id, 准备金矩阵, 保险期间)
+    :rtype: tuple
+    """
+    mp = np.column_stack([iss_age, sex, payterm, insterm])
+    uniq, inverse = np.unique(mp, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    rsv = bt.BatchStat(plan_id, uniq[:, 0], uniq[:, 1], uniq[:, 2], uniq[:, 3]).stat()
+    return policy_id, rsv[inverse] * (np.asarray(sa, dtype='float64') / st.Stat.sa)[:, None], insterm
+
+
+def write_chunk(f, policy_id, rsv, insterm):
+    """
+    以长表格式写出一组保单的准备金
+
+    :param f: 输出文件
+    """
+    polyr = np.arange(1, rsv.shape[1] + 1)
+    valid = polyr[None, :] <= np.asarray(insterm)[:, None]
+    rows, cols = np.nonzero(valid)
+    out = tm.pd.DataFrame({
+        "policy_id": np.asarray(policy_id)[rows],
+        "polyr": polyr[cols],
+        "reserve": rsv[rows, cols]
+    })
+    out.to_csv(f, header=False, index=False)
+
+
+class StatRunner(object):
+    """
+    多进程逐单法定准备金计算
+    """
+    def __init__(self, max_workers=None, chunk_size=5000):
+        """
+
+        Example:
+
+        >>> StatRunner(max_workers=4).run("policy.csv", "reserve.csv")
+
+        :param int max_workers: 进程数，默认为cpu个数
+        :param int chunk_size: 每个任务的保单数
+        """
+        self.max_workers = max_workers or os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def run(self, policy_path, out_path, reject_path=None):
+        """
+        计算保单文件中全部保单的准备金并写入输出文件
+
+        保单由PolicyStream分块读取与校验，读取与计算并行，不一次读入全部保单；
+        计算进程以spawn方式启动，不复制读取线程
+
+        :param str policy_path: 保单文件路径
+        :param str out_path: 输出文件路径
+        :param str reject_path: 未通过校验的保单输出路径，None时不输出
+        :return: 保单数、耗时与每秒保单数
+        :rtype: dict
+        """
+        start = time.time()
+        stream = ig.PolicyStream(policy_path, unit_size=self.chunk_size)
+        max_pending = 2 * self.max_workers
+        # 限制在途任务数，保持内存平稳
+        ctx = multiprocessing.get_context("spawn")
+        with open(out_path, "w") as f, ProcessPoolExecutor(self.max_workers, mp_context=ctx) as ex:
+            f.write("policy_id,polyr,reserve\n")
+            pending = set()
+            for plan_id, c in stream:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        write_chunk(f, *fut.result())
+                args = (plan_id, c["policy_id"].values) + \
+                    tuple(c[x].values.astype('int64') for x in MP_COLUMNS) + (c["sa"].values,)
+                pending.add(ex.submit(value_chunk, *args))
+            for fut in wait(pending)[0]:
+                write_chunk(f, *fut.result())
+        if reject_path is not None:
+            stream.reject_frame().to_csv(reject_path, index=False)
+        elapsed = time.time() - start
+        return {
+            "policies": stream.stats["valid"],
+            "rejected": stream.stats["rejected"],
+            "seconds": elapsed,
+            "policies_per_sec": stream.stats["valid"] / elapsed if elapsed > 0 else float("inf")
+        }
+
+
+if __name__ == '__main__':
+    stats = StatRunner().run(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    print("{policies} policies, {rejected} rejected, {seconds:.2f}s, {policies_per_sec:.0f} policies/s".format(**stats))
@@ -0,0 +1,200 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the stochastic interest scenario engine
+
+including
+..py:func:: discount_factors 情景贴现因子
+..py:class:: ScenarioStat 多情景法定准备金与现值
+
+现金流（lx、发生率、保额、保费）由BatchStat计算一次，各情景只替换贴现因子，
+(情景 × 保单 × 保单年度) 的计算按情景分块，单块内同时存在的三维数组格子数合计不超过max_cells；
+只需要情景汇总（均值、最大值等）时以stat(rates, how)逐块累计，不保留全部情景的准备金
+
+
+"""
+
+
+import numpy as np
+import core.batch as bt
+
+
+def discount_factors(rates, n_dur, phase="moy"):
+    """
+    按各年度利率生成贴现因子，平坦利率时与 (1+i) ** -(polyr - adj) 一致
+
+    Example:
+
+    >>> discount_factors([[0.03] * 50, [0.04] * 50], 50, "boy")
+
+    :param rates: (情景 × 保单年度) 的年度利率，一维时视为各情景的平坦利率
+    :param int n_dur: 保单年度数
+    :param str phase: 时间节点
+    :return: (情景 × 保单年度) 贴现因子
+    :rtype: np.ndarray
+    """
+    adj = {
+        "boy": 1,
+        "moy": 0.5,
+        "eoy": 0
+    }
+    rates = np.asarray(rates, dtype='float64')
+    if rates.ndim == 1:
+        rates = np.repeat(rates[:, None], n_dur, axis=1)
+    if rates.shape[1] < n_dur:
+        raise ValueError("rate matrix covers {} durations, {} needed".format(rates.shape[1], n_dur))
+    rates = rates[:, :n_dur]
+    acc = np.cumprod(1 + rates, axis=1)
+    boy = np.concatenate([np.ones((len(rates), 1)), 1 / acc[:, :-1]], axis=1)
+    return boy * (1 + rates) ** -(1 - adj[phase])
+
+
+class ScenarioStat(object):
+    """
+    多情景法定准备金，与BatchStat在平坦利率Stat.IntRate下逐项一致
+    """
+    def __init__(self, batch, max_cells=20000000):
+        """
+
+        Example:
+
+        >>> ss = ScenarioStat(BatchStat(10513002, [30, 40], 0, 10, 50))
+        >>> ss.pv(np.random.normal(0.035, 0.01, (1000, 50)))
+
+        :param bt.BatchStat batch: 保单批次
+        :param int max_cells: 单块计算中同时存在的 (情景 × 保单 × 保单年度) 数组格子数合计上限，每格8字节
+        """
+        self.batch = batch
+        self.max_cells = max_cells
+
+    def n_dur(self):
+        return self.batch.pricing.mp_valid().shape[1]
+
+    def cf_benefit(self):
+        """
+        年中给付的期望赔付，含保费相关赔付
+        :return: (保单 × 保单年度) 未贴现现金流
+        :rtype: np.ndarray
+        """
+        batch = self.batch
+        cf = 0
+        for ben in batch.ben_list():
+            sa = batch.pricing.mp_ben_fix(ben) + batch.pricing.gp()[:, None] * batch.pricing.mp_ben_prem(ben)
+            cf = cf + batch.adj_qx_list(ben) * sa
+        return cf * batch.mp_lx_bop() * batch.pricing.mp_valid()
+
+    def cf_premium(self):
+        """
+        年初收取的期望保费因子（每单位保费）
+        :return: (保单 × 保单年度) 未贴现现金流
+        :rtype: np.ndarray
+        """
+        batch = self.batch
+        return batch.pricing.mp_prem_ind() * batch.mp_lx_bop() * batch.pricing.mp_valid()
+
+    def pv(self, rates):
+        """
+        各情景下的赔付与保费现值
+
+        :param rates: (情景 × 保单年度) 年度利率
+        :return: pv_benefit, pv_premium，均为 (情景 × 保单)
+        :rtype: dict
+        """
+        n = self.n_dur()
+        return {
+            "pv_benefit": discount_factors(rates, n, "moy").dot(self.cf_benefit().T),
+            "pv_premium": discount_factors(rates, n, "boy").dot(self.cf_premium().T) * self.batch.pricing.gp()
+        }
+
+    TEMPORARIES = 6
+    # _stat中同时存在的 (情景 × 保单 × 保单年度) 数组个数上限，含比较产生的布尔数组
+
+    def _chunk(self, n_scen):
+        step = max(1, self.max_cells // max(1, self.TEMPORARIES * len(self.batch) * self.n_dur()))
+        for i in range(0, n_scen, step):
+            yield slice(i, min(i + step, n_scen))
+
+    def _stat(self, cf, disc_boy, disc_moy, disc_eoy):
+        batch = self.batch
+        n_scen = len(disc_boy)
+        n_pol, n_dur = len(batch), self.n_dur()
+        insterm = np.tile(batch.pricing.insterm, n_scen)
+        lx = batch.mp_lx_bop() * batch.pricing.mp_valid()
+        prem_lx = batch.pricing.mp_prem_ind() * lx
+        # 与情景无关；续年净保费的分子分母以矩阵乘法按保单年度求和，不生成三维数组
+        dx_boy = lx[None] * disc_boy[:, None, :]
+        trnp = np.zeros(dx_boy.shape)
+        if batch.method == "FPT":
+            first = cf[:, 0][None] * disc_moy[:, :1]
+            renewal = (disc_moy.dot(cf.T) - first) / (disc_boy.dot(prem_lx.T) - 1)
+            polyr = batch.pricing.mp_polyr()
+            mask = (polyr > 1) & (polyr <= batch.pricing.payterm[:, None])
+            trnp[:] = np.where(mask[None], renewal[..., None], 0)
+            trnp[..., 0] = first
+
+        def flat(x):
+            return x.reshape(-1, n_dur)
+
+        net = cf[None] * disc_moy[:, None, :]
+        net -= trnp * dx_boy
+        adj = bt.safe_div(bt.rev_cumsum(flat(net)), flat(dx_boy))
+        del net
+        adj = bt.roll_left(adj, insterm)
+        mp_p = bt.rev_cumsum(flat(prem_lx[None] * disc_boy[:, None, :]))
+        del dx_boy
+        prem = flat(trnp)
+        prem -= np.tile(batch.pricing.gp(), n_scen)[:, None]
+        np.fmax(prem, 0, out=prem)
+        prem *= mp_p
+        del mp_p, trnp
+        prem[:, 0] = 0
+        prem = bt.roll_left(prem, insterm)
+        adj += bt.safe_div(prem, flat(lx[None] * disc_eoy[:, None, :]))
+        del prem
+        rsv = adj.reshape(n_scen, n_pol, n_dur)
+        np.fmax(rsv, batch.pricing.cv()[None], out=rsv)
+        return rsv
+
+    def stat_iter(self, rates):
+        """
+        按情景分块计算法定准备金
+
+        :param rates: (情景 × 保单年度) 年度利率
+        :return: 逐块返回 (情景slice, (情景 × 保单 × 保单年度) 准备金)
+        """
+        n = self.n_dur()
+        disc = [discount_factors(rates, n, x) for x in ("boy", "moy", "eoy")]
+        cf = self.cf_benefit()
+        # 现金流与情景无关，各块共用
+        for sl in self._chunk(len(disc[0])):
+            yield sl, self._stat(cf, *[x[sl] for x in disc])
+
+    REDUCE = {
+        "sum": (np.sum, np.add),
+        "mean": (np.sum, np.add),
+        "max": (np.max, np.fmax),
+        "min": (np.min, np.fmin)
+    }
+    # 块内汇总函数与块间合并函数
+
+    def stat(self, rates, how=None):
+        """
+        :param rates: (情景 × 保单年度) 年度利率
+        :param str how: None时返回全部情景；"sum"、"mean"、"max"、"min"时逐块汇总，只保留 (保单 × 保单年度) 的结果
+        :return: (情景 × 保单 × 保单年度) 或 (保单 × 保单年度) 准备金
+        :rtype: np.ndarray
+        """
+        if how is None:
+            return np.concatenate([x for _, x in self.stat_iter(rates)], axis=0)
+        if how not in self.REDUCE:
+            raise ValueError("unknown reduction {}".format(how))
+        func, merge = self.REDUCE[how]
+        out = None
+        n_scen = 0
+        for sl, x in self.stat_iter(rates):
+            part = func(x, axis=0)
+            out = part if out is None else merge(out, part)
+            n_scen += sl.stop - sl.start
+        return out / n_scen if how == "mean" else out
+
+    pass
@@ -0,0 +1,148 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the sensitivity and shock runner
+
+including
+..py:class:: Shock 冲击
+..py:class:: Sensitivity 敏感性测试
+
+先计算基础情形，各冲击情形由memo.clone复制基础对象及其缓存后修改对应假设，
+只有依赖该假设的节点重新计算（如利率冲击不重算lx，发生率冲击不重算保额与loading），
+定价部分（gp、现金价值）在各情形间共享
+
+
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import core.tbl_manage as tm
+import core.memo as memo
+import core.stat as st
+import core.batch as bt
+
+
+class Shock(object):
+    """
+    冲击，作用于评估发生率(qx)、退保率(lapse)或评估利率(int_rate)
+    """
+    TARGETS = ("qx", "lapse", "int_rate")
+
+    def __init__(self, target, kind, value, name=None):
+        """
+
+        Example:
+
+        >>> Shock("qx", "mul", 1.1, "mort+10%")
+        >>> Shock("int_rate", "add", -0.005, "int-50bp")
+
+        :param str target: 冲击对象
+        :param str kind: "mul"为乘法冲击，"add"为加法冲击
+        :param float value: 系数或增量
+        :param str name: 名称
+        """
+        if target not in self.TARGETS:
+            raise ValueError("unknown shock target {}".format(target))
+        if kind not in ("mul", "add"):
+            raise ValueError("unknown shock kind {}".format(kind))
+        self.target = target
+        self.kind = kind
+        self.value = value
+        self.name = name or "{}_{}_{}".format(target, kind, value)
+
+    def apply(self, stat, gaap):
+        """
+        将冲击写入BatchStat与BatchGaap的假设
+
+        :param bt.BatchStat stat:
+        :param bt.BatchGaap gaap:
+        """
+        if self.target == "qx":
+            stat.qx_shock = gaap.qx_shock = (self.kind, self.value)
+        elif self.target == "lapse":
+            gaap.lapse_shock = (self.kind, self.value)
+        else:
+            stat.IntRate = stat.IntRate * self.value if self.kind == "mul" else stat.IntRate + self.value
+
+
+class Sensitivity(object):
+    """
+    敏感性测试，输出法定准备金与GAAP年度现金流
+    """
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm, sa=None):
+        """
+        参数同BatchGaap
+
+        Example:
+
+        >>> sens = Sensitivity(10513002, [30, 40], 0, 10, 50)
+        >>> sens.run([Shock("qx", "mul", 1.1), Shock("lapse", "mul", 0.5), Shock("int_rate", "add", 0.005)])
+        """
+        self.stat = bt.BatchStat(plan_id, iss_age, sex, payterm, insterm)
+        self.gaap = bt.BatchGaap(plan_id, iss_age, sex, payterm, insterm, sa)
+        self.gaap.pricing = self.stat.pricing
+
+    @staticmethod
+    def evaluate(stat, gaap):
+        """
+        法定准备金按保单保额缩放，GAAP月度现金流按保单年度汇总
+
+        :return: 法定准备金、年度保费、年度赔付，均为 (保单 × 保单年度)
+        :rtype: tuple
+        """
+        rsv = stat.stat() * (gaap.sa / st.Stat.sa)[:, None]
+        n_dur = rsv.shape[1]
+        prem = gaap.mp_prem().reshape(len(gaap), n_dur, 12).sum(axis=2)
+        ben = sum(gaap.mp_ben_fix(x) for x in gaap.ben_list()).reshape(len(gaap), n_dur, 12).sum(axis=2)
+        return rsv, prem, ben
+
+    def _frame(self, name, result):
+        rsv, prem, ben = result
+        policy, polyr = np.indices(rsv.shape).reshape(2, -1)
+        keep = polyr < self.stat.pricing.insterm[policy]
+        return tm.pd.DataFrame({
+            "shock": name,
+            "policy": policy[keep],
+            "polyr": polyr[keep] + 1,
+            "stat_reserve": rsv.ravel()[keep],
+            "gaap_premium": prem.ravel()[keep],
+            "gaap_benefit": ben.ravel()[keep]
+        })[["shock", "policy", "polyr", "stat_reserve", "gaap_premium", "gaap_benefit"]]
+
+    def _run_shock(self, shock):
+        stat = memo.clone(self.stat)
+        gaap = memo.clone(self.gaap)
+        shock.apply(stat, gaap)
+        return self.evaluate(stat, gaap)
+
+    def run(self, shocks, max_workers=None):
+        """
+        计算基础情形与全部冲击情形，冲击情形并行计算
+
+        :param list shocks: Shock列表
+        :param int max_workers: 线程数
+        :return: 列为 shock, policy, polyr, stat_reserve, gaap_premium, gaap_benefit 的长表
+        :rtype: tm.pd.DataFrame
+        """
+        frames = [self._frame("base", self.evaluate(self.stat, self.gaap))]
+        # 基础情形先算完，其缓存被各冲击情形继承
+        with ThreadPoolExecutor(max_workers) as ex:
+            results = list(ex.map(self._run_shock, shocks))
+        frames += [self._frame(x.name, r) for x, r in zip(shocks, results)]
+        return tm.pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def summary(frame):
+        """
+        :param tm.pd.DataFrame frame: run的结果
+        :return: 各情形准备金与现金流合计，及相对基础情形的变动比例
+        :rtype: tm.pd.DataFrame
+        """
+        cols = ["stat_reserve", "gaap_premium", "gaap_benefit"]
+        total = frame.groupby("shock", sort=False)[cols].sum()
+        for col in cols:
+            total[col + "_chg"] = total[col] / total.loc["base", col] - 1
+        return total
+
+    pass
@@ -0,0 +1,395 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the local pricing/valuation HTTP service
+
+including
+..py:class:: MicroBatcher 跨请求合并计算
+..py:class:: QuoteService 保费、法定准备金HTTP服务
+
+常驻进程启动时读取假设表并完成各险种的一次计算，之后按请求计算：
+同一时间窗口（默认1毫秒）内到达的model points不论来自哪个请求，按险种合并为一个BatchPricing/BatchStat计算，
+结果按model point缓存，重复报价直接取缓存；ReadTable.clear_cache后缓存自动失效；
+合并后的计算在单独的计算线程中进行，计算期间事件循环继续应答缓存命中的请求
+
+接口（JSON）：
+POST /gp     {"points": [{"plan_id": 10513002, "iss_age": 30, "sex": 0, "payterm": 10, "insterm": 50}, ...]}
+             返回 {"results": [{"gp": 11.72}, ...]}
+POST /stat   points中可选 sa、months，返回各保单年度末每标准保额的准备金 stat，
+             有months时另返回按 sa / Stat.sa 缩放的评估时点准备金 reserve
+GET  /stats  请求数、合并批次数、缓存命中数与最近请求的延迟分位数
+
+Example:
+
+>>> python -m core.service 8080 10513002
+
+
+"""
+
+
+import sys
+import json
+import time
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import core.tbl_manage as tm
+import core.pricing as pc
+import core.stat as st
+import core.batch as bt
+import core.commutation as cm
+import core.ingest as ig
+
+
+class MicroBatcher(object):
+    """
+    合并等待窗口内的计算请求，compute为同步函数：输入key列表，返回与之对应的结果或异常列表
+
+    compute在单个计算线程中执行，同一时间只有一个批次在计算；计算中的key再次请求时等待该批次的结果
+    """
+    def __init__(self, compute, max_batch=256, max_wait=0.001, cache_size=100000):
+        """
+
+        :param compute: 批量计算函数
+        :param int max_batch: 达到该数量时立即计算
+        :param float max_wait: 等待窗口，秒
+        :param int cache_size: 结果缓存的最大条数
+        """
+        self.compute = compute
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._pending = collections.OrderedDict()
+        # key -> 等待该结果的future列表
+        self._inflight = {}
+        # 计算中的 key + (generation,) -> future列表，假设表更新后不再合并到更新前开始的计算
+        self._executor = ThreadPoolExecutor(1)
+        self._timer = None
+        self.stats = {"points": 0, "cache_hits": 0, "batches": 0, "computed": 0}
+
+    def submit(self, key):
+        """
+        :param tuple key: model point
+        :return: 结果的future
+        :rtype: asyncio.Future
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.stats["points"] += 1
+        ckey = key + (tm.ReadTable.generation,)
+        if ckey in self._cache:
+            self._cache.move_to_end(ckey)
+            self.stats["cache_hits"] += 1
+            future.set_result(self._cache[ckey])
+            return future
+        if ckey in self._inflight:
+            self._inflight[ckey].append(future)
+            return future
+        self._pending.setdefault(key, []).append(future)
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, collections.OrderedDict()
+        keys = list(pending)
+        generation = tm.ReadTable.generation
+        self._inflight.update((key + (generation,), f) for key, f in pending.items())
+        self.stats["batches"] += 1
+        self.stats["computed"] += len(keys)
+        task = asyncio.get_event_loop().run_in_executor(self._executor, self.compute, keys)
+        task.add_done_callback(lambda x: self._resolve(keys, generation, x))
+
+    def _resolve(self, keys, generation, task):
+        """
+        计算完成后写入缓存并设置等待中的future
+        """
+        error = task.exception()
+        values = [error] * len(keys) if error is not None else task.result()
+        for key, value in zip(keys, values):
+            futures = self._inflight.pop(key + (generation,), [])
+            if isinstance(value, Exception):
+                for f in futures:
+                    if not f.done():
+                        f.set_exception(value)
+                continue
+            self._cache[key + (generation,)] = value
+            for f in futures:
+                if not f.done():
+                    f.set_result(value)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def put(self, keys, values):
+        """
+        预先写入结果缓存
+
+        :param list keys: model point列表
+        :param list values: 对应的结果
+        """
+        generation = tm.ReadTable.generation
+        for key, value in zip(keys, values):
+            if not isinstance(value, Exception):
+                self._cache[key + (generation,)] = value
+
+    pass
+
+
+def _by_plan(keys, func):
+    """
+    按险种分组批量计算，某组出错时逐个重算，只有出错的model point返回异常
+
+    :param list keys: (plan_id, iss_age, sex, payterm, insterm) 列表
+    :param func: 输入 (plan_id, 各列数组)，返回与行对应的结果列表
+    :rtype: list
+    """
+    out = [None] * len(keys)
+    groups = collections.OrderedDict()
+    for i, key in enumerate(keys):
+        groups.setdefault(key[0], []).append(i)
+    for plan_id, idx in groups.items():
+        rows = [keys[i] for i in idx]
+        try:
+            values = func(plan_id, *[np.array(x) for x in zip(*rows)][1:])
+        except Exception:
+            values = []
+            for row in rows:
+                try:
+                    values.extend(func(plan_id, *[np.array([x]) for x in row[1:]]))
+                except Exception as e:
+                    values.append(e)
+        for i, v in zip(idx, values):
+            out[i] = v
+    return out
+
+
+def _integer(value, name):
+    """
+    model point的整数字段，非整数（如30.5）不截断，抛出ValueError
+
+    :param value: 请求中的值，可为数字或数字字符串
+    :param str name: 字段名
+    :rtype: int
+    """
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError("{} must be an integer, got {!r}".format(name, value))
+    return int(number)
+
+
+class QuoteService(object):
+    """
+    保费、法定准备金HTTP服务
+    """
+    KEYS = ["plan_id"] + ig.MP_COLUMNS
+
+    def __init__(self, host="127.0.0.1", port=8080, assumptions=None, max_batch=256, max_wait=0.001):
+        """
+
+        :param str host: 监听地址
+        :param int port: 端口
+        :param core.modelpoint.AssumptionSet assumptions: 假设组合，默认为类属性
+        :param int max_batch: 单次合并计算的最大model point数
+        :param float max_wait: 合并等待窗口，秒
+        """
+        self.host = host
+        self.port = port
+        self.assumptions = assumptions
+        self.gp = MicroBatcher(self._gp, max_batch, max_wait)
+        self.stat = MicroBatcher(self._stat, max_batch, max_wait)
+        self.latency = collections.deque(maxlen=10000)
+        # 最近请求的处理时间，秒
+        self.requests = 0
+        self.warm_errors = {}
+
+    def _apply(self, obj):
+        if self.assumptions is not None:
+            self.assumptions.apply(obj)
+        return obj
+
+    def _gp(self, keys):
+        def func(plan_id, iss_age, sex, payterm, insterm):
+            return self._apply(bt.BatchPricing(plan_id, iss_age, sex, payterm, insterm)).gp().tolist()
+        return _by_plan(keys, func)
+
+    def _stat(self, keys):
+        def func(plan_id, iss_age, sex, payterm, insterm):
+            bs = self._apply(bt.BatchStat(plan_id, iss_age, sex, payterm, insterm))
+            valid = bs.pricing.mp_valid()
+            rsv = bs.stat() * valid
+            prem = bs.trnp() * valid
+            return [(rsv[i, :n], prem[i, :n]) for i, n in enumerate(bs.pricing.insterm)]
+        return _by_plan(keys, func)
+
+    def warm(self, plan_ids=None, insterms=None):
+        """
+        预先读取各险种的假设表并完成一次计算，出错的险种记录在warm_errors中；
+        给定insterms时，对各保险期间下全部有效的投保年龄、性别与loading表中的缴费期间预先计算并写入结果缓存
+
+        :param list plan_ids: 险种代码，默认为全部险种
+        :param list insterms: 预先计算的保险期间
+        """
+        index = pc.ProductIndex.get()
+        plan_ids = list(index.plans) if plan_ids is None else plan_ids
+        rules = ig.PolicyRules(None if self.assumptions is None else self.assumptions.load_tbl_name)
+        for plan_id in plan_ids:
+            try:
+                self._apply(bt.BatchStat(plan_id, [pc.PricingOd.IssAge], [0, 1], pc.PricingOd.payterm,
+                                         pc.PricingOd.insterm)).stat()
+                for n in insterms or []:
+                    ages = np.arange(rules.max_age[plan_id] - n + 2)
+                    payterms = rules.payterms[rules.payterms <= n]
+                    grid = bt.BatchPricing.from_grid(plan_id, ages, [0, 1], payterms, n)
+                    keys = [(plan_id,) + x for x in zip(grid.iss_age.tolist(), grid.sex.tolist(),
+                                                         grid.payterm.tolist(), grid.insterm.tolist())]
+                    self.gp.put(keys, self._gp(keys))
+                    self.stat.put(keys, self._stat(keys))
+            except Exception as e:
+                self.warm_errors[plan_id] = str(e)
+
+    def _key(self, point):
+        key = [point[x] for x in self.KEYS]
+        if key[-1] == "105@":
+            key[-1] = 106 - _integer(key[1], "iss_age")
+            # 与BatchPricing对"105@"的处理一致
+        return tuple(_integer(x, name) for x, name in zip(key, self.KEYS))
+
+    async def quote(self, kind, points):
+        """
+        :param str kind: "gp" 或 "stat"
+        :param list points: model point字典列表
+        :return: 与points对应的结果字典列表
+        :rtype: list
+        """
+        batcher = self.gp if kind == "gp" else self.stat
+        futures = []
+        for p in points:
+            try:
+                futures.append(batcher.submit(self._key(p)))
+            except (KeyError, TypeError, ValueError) as e:
+                futures.append(e)
+        out = []
+        for p, f in zip(points, futures):
+            try:
+                if isinstance(f, Exception):
+                    raise f
+                value = await f
+                if kind == "gp":
+                    res = {"gp": value}
+                else:
+                    rsv, prem = value
+                    res = {"stat": rsv.tolist()}
+                    if "months" in p:
+                        sa = float(p.get("sa", st.Stat.sa))
+                        months = [_integer(p["months"], "months")]
+                        res["reserve"] = float(cm.interp_reserve(rsv, months, prem)[0] * sa / st.Stat.sa)
+            except Exception as e:
+                res = {"error": "{}: {}".format(type(e).__name__, e)}
+            out.append(res)
+        return out
+
+    def summary(self):
+        """
+        :return: 服务统计
+        :rtype: dict
+        """
+        lat = np.array(self.latency) * 1e3
+        out = {"requests": self.requests, "gp": self.gp.stats, "stat": self.stat.stats}
+        if len(lat):
+            out["latency_ms"] = {"p50": float(np.percentile(lat, 50)), "p99": float(np.percentile(lat, 99)),
+                                 "max": float(lat.max())}
+        return out
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path in ("/stats", "/health"):
+            return 200, self.summary()
+        if method != "POST" or path not in ("/gp", "/stat"):
+            return 404, {"error": "not found"}
+        try:
+            data = json.loads(body.decode("utf-8") or "{}")
+        except ValueError as e:
+            return 400, {"error": "invalid json: {}".format(e)}
+        points = data.get("points", [data]) if isinstance(data, dict) else data
+        if not isinstance(points, list):
+            return 400, {"error": "points must be a list"}
+        return 200, {"results": await self.quote(path[1:], points)}
+
+    @staticmethod
+    async def _respond(writer, status, payload, close):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n{}\r\n".format(
+            status, "OK" if status == 200 else "Error", len(data),
+            "Connection: close\r\n" if close else "").encode("latin-1") + data)
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                parts = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0")
+                if len(parts) < 2 or not length.isdigit():
+                    await self._respond(writer, 400, {"error": "bad request"}, True)
+                    break
+                # 请求行或Content-Length无法解析时无法确定下一个请求的位置，应答后关闭连接
+                body = await reader.readexactly(int(length))
+                status, payload = await self._route(parts[0], parts[1], body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, close)
+                self.requests += 1
+                self.latency.append(time.perf_counter() - start)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """
+        :return: 已开始监听的server
+        :rtype: asyncio.AbstractServer
+        """
+        return await asyncio.start_server(self._handle, self.host, self.port)
+
+    def serve_forever(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(self.start())
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+    pass
+
+
+if __name__ == '__main__':
+    service = QuoteService(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    service.warm([int(x) for x in sys.argv[2:]] or None, [pc.PricingOd.insterm])
+    print("warm errors: {}".format(service.warm_errors))
+    print("listening on {}:{}".format(service.host, service.port))
+    service.serve_forever()
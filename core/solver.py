@@ -0,0 +1,164 @@
+# -*- coding:utf-8 -*-
+
+"""
+This module defined the premium solver on profit test cashflows
+
+including
+..py:class:: PremiumSolver 按目标利润率或IRR反求保费
+
+利润测试按保单年度：
+profit_t = (V_{t-1}·lx_bop_t + P_t - E_t)(1+i) - B_t(1+i)^0.5 - V_t·lx_eop_t
+
+lx为BatchGaap含退保的在险比例，P为保费，E为loading × P，B为赔付（含保费相关赔付），
+V为BatchStat法定准备金（现金价值下限）；
+P、E与保费相关赔付与保费成正比，只有准备金因FPT与现金价值下限而非线性，
+迭代时lx、赔付、loading以及准备金中与保费无关的部分均取缓存，每步只重算与保费相关的项
+
+
+"""
+
+
+import numpy as np
+import core.memo as memo
+import core.batch as bt
+
+
+class PremiumSolver(object):
+    """
+    批量保费反求，对全部model points同时做割线迭代，每步只计算一次目标函数
+    """
+    def __init__(self, plan_id, iss_age, sex, payterm, insterm, sa=None):
+        """
+        参数同BatchGaap
+
+        Example:
+
+        >>> ps = PremiumSolver(10513002, np.arange(20, 50), 0, 10, 50)
+        >>> ps.solve_margin(0.05, 0.08)
+        >>> ps.solve_irr(0.10)
+        """
+        self.plan_id = plan_id
+        self.stat = bt.BatchStat(plan_id, iss_age, sex, payterm, insterm)
+        self.gaap = bt.BatchGaap(plan_id, iss_age, sex, payterm, insterm, sa)
+        self.gaap.pricing = self.stat.pricing
+        self.pricing = self.stat.pricing
+
+    EarnRate = 0.045
+    # 准备金与现金流的投资收益率
+    tol = 1e-6
+    max_iter = 50
+
+    def __len__(self):
+        return len(self.pricing)
+
+    def _annual(self, x):
+        return x.reshape(len(self), -1, 12).sum(axis=2)
+
+    @memo.node()
+    def lx_bop(self):
+        return self.gaap.mp_lx_bop()[:, ::12]
+
+    @memo.node()
+    def lx_eop(self):
+        return self.gaap.mp_lx_eop()[:, 11::12] * self.pricing.mp_valid()
+
+    @memo.node()
+    def prem_unit(self):
+        """
+        :return: 每单位保费（每千元保额）的期望保费收入
+        :rtype: np.ndarray
+        """
+        return self.pricing.mp_prem_ind() * self.lx_bop() * self.gaap.mp_scale()
+
+    @memo.node()
+    def ben_fix(self):
+        return self._annual(sum(self.gaap.mp_ben_fix(x) for x in self.gaap.ben_list()))
+
+    @memo.node()
+    def ben_prem_unit(self):
+        """
+        :return: 每单位保费的保费相关期望赔付
+        :rtype: np.ndarray
+        """
+        ben = 0
+        for x in self.gaap.ben_list():
+            sa = np.repeat(self.pricing.mp_ben_prem(x), 12, axis=1)
+            ben = ben + self.gaap.adj_qx_list(x) * self.gaap.mp_lx_bop() * sa
+        return self._annual(ben) * self.gaap.mp_scale()
+
+    def profit(self, gp):
+        """
+        :param np.ndarray gp: 各model point每千元保额的保费
+        :return: (保单 × 保单年度) 的年末利润
+        :rtype: np.ndarray
+        """
+        gp = np.asarray(gp, dtype='float64')[:, None]
+        rsv = self.stat.stat_at(gp[:, 0]) * self.pricing.mp_valid() * self.gaap.mp_scale()
+        rsv_bop = np.roll(rsv, 1, axis=1)
+        rsv_bop[:, 0] = 0
+        prem = gp * self.prem_unit()
+        exp = self.pricing.mp_ld() * prem
+        ben = self.ben_fix() + gp * self.ben_prem_unit()
+        i = self.EarnRate
+        return (rsv_bop * self.lx_bop() + prem - exp) * (1 + i) - ben * (1 + i) ** 0.5 - rsv * self.lx_eop()
+
+    def objective(self, gp, rate, margin=0.):
+        """
+        PV(利润) - margin × PV(保费)，按rate贴现
+
+        :param float rate: 贴现率
+        :param float margin: 目标利润率
+        :rtype: np.ndarray
+        """
+        t = self.pricing.mp_polyr()
+        gp = np.asarray(gp, dtype='float64')
+        pv_profit = (self.profit(gp) * (1 + rate) ** -t).sum(axis=1)
+        pv_prem = (gp[:, None] * self.prem_unit() * (1 + rate) ** -(t - 1)).sum(axis=1)
+        return pv_profit - margin * pv_prem
+
+    def _solve(self, rate, margin):
+        x0 = self.pricing.gp().astype('float64')
+        f0 = self.objective(x0, rate, margin)
+        x1 = x0 + 1e-2 * np.fmax(np.abs(x0), 1)
+        # 以定价保费及其附近一点为两个初值
+        active = np.ones(len(x0), dtype=bool)
+        for n in range(self.max_iter):
+            f1 = self.objective(x1, rate, margin)
+            df = f1 - f0
+            step = np.where(active & (df != 0), f1 * (x1 - x0) / np.where(df == 0, 1, df), 0)
+            x0, f0 = x1, f1
+            x1 = x1 - step
+            active = np.abs(step) > self.tol
+            if not active.any():
+                return x1, n + 1
+        raise RuntimeError("premium solver did not converge for {} model points".format(active.sum()))
+
+    def solve_margin(self, margin, rate):
+        """
+        反求使利润率 PV(利润)/PV(保费) 等于margin的保费
+
+        :param float margin: 目标利润率
+        :param float rate: 风险贴现率
+        :return: 每千元保额的保费
+        :rtype: np.ndarray
+        """
+        return self._solve(rate, margin)[0]
+
+    def solve_irr(self, irr):
+        """
+        反求使利润IRR等于irr的保费，即按irr贴现的利润现值为0
+
+        :param float irr: 目标IRR
+        :return: 每千元保额的保费
+        :rtype: np.ndarray
+        """
+        return self._solve(irr, 0.)[0]
+
+    pass
+
+
+if __name__ == '__main__':
+    ps = PremiumSolver(10513002, np.arange(20, 50), 0, 10, 50)
+    print(ps.pricing.gp())
+    print(ps.solve_margin(0.05, 0.08))
+    print(ps.solve_irr(0.10))
@@ -1,6 +1,8 @@
 # -*- coding:utf-8 -*-
 import numpy as np
 import core.tbl_manage as tm
+import core.memo as memo
+import core.decrement as dc
 import core.pricing as pc
 #from peewee import *
 from functools import reduce
@@ -18,27 +20,35 @@ class Stat(object):
     IntRate = 0.035
     method = "FPT"
 
+    @memo.node("pricing")
     def apv_mp_age(self):
         return self.pricing.apv_mp_age()
     # 生成model points对应的age列
 
+    @memo.node("pricing")
     def apv_mp_polyr(self):
         return self.pricing.apv_mp_polyr()
     # 生成model points对应的保单难度列
 
+    @memo.node("pricing")
     def ben_list(self):
         return self.pricing.ben_list()
 
-    def get_qx_list(self, sex, tbl):
+    def get_qx_list(self, sex, tbl_name):
         """
-
-        :param sex: 
-        :param tbl: 
-        :return: 读取tbl中的model points对应的行
+        
+        :param sex: 性别
+        :param str tbl_name: 发生率表名，可为选择-终极表
+        :return: model points对应的发生率
+        :rtype: np.ndarray
         """
-        qx_list = tbl[tbl['age'].isin(self.apv_mp_age())]["male" if sex == 0 else "female"]
-        return qx_list
+        age = self.apv_mp_age()
+        qx = tm.ReadTable.get_select_table(tbl_name, sex).lookup(age[0], np.arange(len(age)))
+        if np.isnan(qx).any():
+            raise ValueError("age out of range in {}".format(tbl_name))
+        return qx
 
+    @memo.node("sex")
     def adj_qx_list(self, sex, ben):
         """
 
@@ -47,11 +57,13 @@ class Stat(object):
         :return: qx
         :rtype: np.ndarray
         """
-        qx = self.get_qx_list(sex, ben.get_qx_tbl())
-        if ben.BEN_TYPE == "death":
-            qx = qx * (1 - self.get_qx_list(self.sex, tm.ReadTable.get_mort_table("K_2000_1.csv")).values)
+        qx = self.get_qx_list(sex, ben.get_qx_tbl_name())
+        adj = dc.KERNEL.adj_tbl_name(ben, self.ben_list())
+        if adj is not None:
+            qx = qx * (1 - self.get_qx_list(self.sex, adj))
         return qx
 
+    @memo.node("sex")
     def mp_qx_ben_list(self, ben):
         """
 
@@ -73,18 +85,19 @@ class Stat(object):
             raise NotImplementedError("death benifit number error")
         # db部分处理
         qx = self.mp_qx_ben_list(self.ben_list())
-        lx = 1 - reduce(lambda x, y: x + y, qx)
-        lx = lx.cumprod()
-        return lx
+        return dc.KERNEL.project(np.stack(qx)).lx_eop[0]
 
+    @memo.node()
     def mp_lx_eop(self):
         return self.mp_lx_cal()
 
+    @memo.node()
     def mp_lx_bop(self):
         lx = np.roll(self.mp_lx_eop(), 1)
         lx[0] = 1
         return lx
 
+    @memo.node("IntRate", "pricing")
     def mp_dx(self, phase="moy"):
         adj = {
             "boy": 1,
@@ -95,12 +108,14 @@ class Stat(object):
         return dx
     # Dx calculate
 
+    @memo.node()
     def mp_cx_ben(self, ben, phase="moy"):
         cx = self.mp_dx(phase) * self.mp_qx_ben_list(ben)
         # 与换算函数不同，减少了年末给付的贴现
         return cx
     # Cx calculate
 
+    @memo.node("pricing")
     def mp_ben_fix(self, ben):
         return self.mp_cx_ben(ben) * self.pricing.mp_ben_fix(ben)
 
@@ -108,6 +123,7 @@ class Stat(object):
         ben_out_list = map(self.mp_ben_fix, self.ben_list())
         return ben_out_list
 
+    @memo.node("pricing")
     def mp_ben_prem(self, ben):
         return self.mp_cx_ben(ben) * self.pricing.mp_ben_prem(ben)
     # 单个ben（prem类型）的apv计算
@@ -116,10 +132,12 @@ class Stat(object):
         return map(self.mp_ben_prem, self.ben_list())
     # ben list（prem类型）的apv
 
+    @memo.node("pricing")
     def apv_ben_total(self):
         return reduce(lambda x, y: x+y, self.apv_ben_fix_list()) + (self.pricing.gp() * reduce(lambda x, y: x+y, self.apv_ben_prem_list()))
     # ben的apv总和
 
+    @memo.node("payterm")
     def mp_p(self):
         prem = np.zeros(len(self.apv_mp_age()), dtype='int32')
         prem[:self.payterm] = 1
@@ -127,6 +145,7 @@ class Stat(object):
         return gross_p
     # 贴现使用年初
 
+    @memo.node("method", "payterm")
     def trnp(self):
         """
         计算修正净保费：
@@ -136,8 +155,9 @@ class Stat(object):
         """
         trnp = np.zeros(len(self.apv_mp_polyr()))
         if self.method == "FPT":
-            trnp[0] = self.apv_ben_total().values[0]
-            trnp[1:self.payterm] = (sum(self.apv_ben_total().values) - trnp[0]) / (sum(self.mp_p()) - 1)
+            apv = np.asarray(self.apv_ben_total())
+            trnp[0] = apv[0]
+            trnp[1:self.payterm] = (sum(apv) - trnp[0]) / (sum(self.mp_p()) - 1)
         return trnp
 
     # def reserve(self):
@@ -146,6 +166,7 @@ class Stat(object):
     #         res[i-1] = (res[i] * self.mp_dx()[i] + self.apv_ben_total()[i-1] - self.mp_dx()[i-1] * self.trnp("FPT")[i-1]) / self.mp_dx()[i-1]
     #     return res
 
+    @memo.node()
     def adj_rsv(self):
         """
         计算修正准备金
@@ -159,6 +180,7 @@ class Stat(object):
         res = np.roll(res, -1)
         return res
 
+    @memo.node("pricing")
     def prem_rsv(self):
         # TODO: 4位小数有差
         res = np.fmax(self.trnp() - self.pricing.gp(), 0) * self.mp_p()[::-1].cumsum()[::-1]
@@ -167,6 +189,7 @@ class Stat(object):
         res /= self.mp_dx("eoy")
         return res
 
+    @memo.node("pricing")
     def stat(self):
         return np.fmax(self.adj_rsv() + self.prem_rsv(), self.pricing.cv())
 
@@ -1,4 +1,8 @@
 import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 
 
@@ -12,28 +16,435 @@ class ReadTable(object):
     SA_TABLE_DIRECTORY = os.path.join(BASE_DIRECTORY, "sa")
     LOADING_TABLE_DIRECTORY = os.path.join(BASE_DIRECTORY, "loading")
     LAPSE_TABLE_DIRECTORY = os.path.join(BASE_DIRECTORY, "lapse")
+    STORE_DIRECTORY = os.path.join(BASE_DIRECTORY, "store")
+
+    store = None
+    # 加载二进制假设库后优先从库中读表，见use_store
+
+    CACHE_SIZE = 256
+    # 缓存条目上限，超出后按LRU淘汰
+    _cache = OrderedDict()
+    _lock = threading.RLock()
+    generation = 0
+    # 每次clear_cache加1，供下游缓存判断表是否更新
+    read_count = 0
+    # 实际解析csv的次数
+
+    @classmethod
+    def _cache_get(cls, key, loader):
+        """
+        LRU缓存读取，未命中时调用loader生成并写入缓存
+
+        :param tuple key: 缓存键，第二项为表文件路径，其后可包含依赖的其他表文件路径
+        :param loader: 无参函数，返回需要缓存的对象
+        :return: 缓存对象
+        """
+        with cls._lock:
+            if key in cls._cache:
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+        value = loader()
+        with cls._lock:
+            cls._cache[key] = value
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return value
+
+    @classmethod
+    def read_csv(cls, path):
+        """
+        读取csv，同一文件只解析一次
+
+        返回的是缓存中的Dataframe，调用方不能修改
+
+        :param str path: 文件路径
+        :rtype: pd.DataFrame
+        """
+        def load():
+            if cls.store is not None and cls.store.has(path):
+                return cls.store.frame(path)
+            cls.read_count += 1
+            return pd.read_csv(path)
+        return cls._cache_get(("csv", path), load)
+
+    @classmethod
+    def read_columns(cls, path, *names):
+        """
+        读取表中的若干列，使用假设库时为内存映射的只读视图，不复制数据
+
+        :param str path: 文件路径
+        :param str names: 列名
+        :return: 数组列表
+        :rtype: list
+        """
+        if cls.store is not None and cls.store.has(path):
+            return [cls.store.column(path, x) for x in names]
+        tbl = cls.read_csv(path)
+        return [tbl[x].values for x in names]
+
+    @classmethod
+    def use_store(cls, directory=None):
+        """
+        加载二进制假设库，之后读表优先使用库中数据；库中缺少的表或csv更新过的表仍读csv
+
+        Example:
+        >>> TableStore.compile()
+        >>> ReadTable.use_store()
+
+        :param str directory: 假设库目录，默认为STORE_DIRECTORY，为False时停止使用
+        :rtype: TableStore
+        """
+        if directory is False:
+            cls.store = None
+        else:
+            cls.store = TableStore(directory or cls.STORE_DIRECTORY)
+        cls.clear_cache()
+        return cls.store
+
+    @classmethod
+    def clear_cache(cls, tbl_name=None):
+        """
+        清除缓存，表文件更新后需要调用
+
+        Example:
+        >>> ReadTable.clear_cache("CL_2000_1.csv")
+
+        :param str tbl_name: 表名（文件名或完整路径），为None时清空全部缓存
+        """
+        with cls._lock:
+            cls.generation += 1
+            if tbl_name is None:
+                cls._cache.clear()
+                return
+            for key in [k for k in cls._cache
+                        if any(x == tbl_name or os.path.basename(x) == tbl_name
+                               for x in k[1:] if isinstance(x, str))]:
+                del cls._cache[key]
+            # 缓存键中的任一表（如月度发生率的扣除表）更新时都需清除
 
     @classmethod
     def get_plan_table(cls):
-        tbl = pd.read_csv(os.path.join(cls.PLAN_DIRECTORY, "list_plan_benifit.csv"))
-        return tbl
+        """
+        以下get_*_table返回缓存中的Dataframe，不复制，调用方不能修改（同read_csv）
+
+        :rtype: pd.DataFrame
+        """
+        return cls.read_csv(os.path.join(cls.PLAN_DIRECTORY, "list_plan_benifit.csv"))
 
     @classmethod
     def get_ben_table(cls):
-        tbl = pd.read_csv(os.path.join(cls.PLAN_DIRECTORY, "list_benifit.csv"))
-        return tbl
+        return cls.read_csv(os.path.join(cls.PLAN_DIRECTORY, "list_benifit.csv"))
 
     @classmethod
     def get_mort_table(cls, tbl_name):
-        tbl = pd.read_csv(os.path.join(cls.MORT_TABLE_DIRECTORY, tbl_name))
-        return tbl
+        return cls.read_csv(os.path.join(cls.MORT_TABLE_DIRECTORY, tbl_name))
 
     @classmethod
     def get_load_table(cls, tbl_name):
-        tbl = pd.read_csv(os.path.join(cls.LOADING_TABLE_DIRECTORY, tbl_name))
-        return tbl
+        return cls.read_csv(os.path.join(cls.LOADING_TABLE_DIRECTORY, tbl_name))
 
     @classmethod
     def get_lapse_table(cls, tbl_name):
-        tbl = pd.read_csv(os.path.join(cls.LAPSE_TABLE_DIRECTORY, tbl_name))
-        return tbl
+        return cls.read_csv(os.path.join(cls.LAPSE_TABLE_DIRECTORY, tbl_name))
+
+    @staticmethod
+    def _freeze(arr):
+        arr.setflags(write=False)
+        return arr
+
+    @classmethod
+    def get_mort_array(cls, tbl_name, sex):
+        """
+        以年龄为下标的发生率数组，缺失年龄为nan；选择-终极表（含duration列）返回duration为0行的终极发生率
+
+        Example:
+        >>> ReadTable.get_mort_array("CL_2000_1.csv", 0)[30]
+        0.000881
+
+        :param str tbl_name: 发生率表名
+        :param int sex: 性别，0为男性，1为女性
+        :return: 只读float64数组
+        :rtype: np.ndarray
+        """
+        path = os.path.join(cls.MORT_TABLE_DIRECTORY, tbl_name)
+
+        def load():
+            age, col = cls.read_columns(path, 'age', "male" if sex == 0 else "female")
+            age = age.astype('int64')
+            if "duration" in cls.read_csv(path).columns:
+                ult = cls.read_columns(path, 'duration')[0].astype('int64') == 0
+                if not ult.any():
+                    raise ValueError("select table {} has no ultimate (duration 0) rows".format(tbl_name))
+                age, col = age[ult], col[ult]
+            if cls.store is not None and np.array_equal(age, np.arange(len(age))):
+                return cls._freeze(col.view())
+            # 假设库中年龄连续时直接使用映射视图，同样只读
+            qx = np.full(age.max() + 1, np.nan)
+            qx[age] = col
+            return cls._freeze(qx)
+        return cls._cache_get(("mort", path, sex), load)
+
+    @classmethod
+    def get_select_table(cls, tbl_name, sex):
+        """
+        选择-终极发生率表，按 (投保年龄, 保单年度) 存为二维数组；只有age列的终极表同样适用
+
+        选择表csv包含 age, duration, male, female 列：duration为1至选择期的行是投保年龄age第duration保单年度的发生率，
+        duration为0的行是到达年龄age的终极发生率
+
+        Example:
+        >>> ReadTable.get_select_table("CL_2000_1.csv", 0).lookup([30, 40], [[0, 1], [0, 1]])
+
+        :param str tbl_name: 发生率表名
+        :param int sex: 性别，0为男性，1为女性
+        :rtype: SelectTable
+        """
+        path = os.path.join(cls.MORT_TABLE_DIRECTORY, tbl_name)
+
+        def load():
+            col = "male" if sex == 0 else "female"
+            if "duration" not in cls.read_csv(path).columns:
+                return SelectTable(cls.get_mort_array(tbl_name, sex))
+            age, dur, qx = cls.read_columns(path, 'age', 'duration', col)
+            age, dur = age.astype('int64'), dur.astype('int64')
+            ult = dur == 0
+            ult_qx = np.full(age[ult].max() + 1, np.nan)
+            ult_qx[age[ult]] = qx[ult]
+            sel = np.full((age[~ult].max() + 1, dur.max()), np.nan)
+            sel[age[~ult], dur[~ult] - 1] = qx[~ult]
+            return SelectTable(ult_qx, sel)
+        return cls._cache_get(("select", path, sex), load)
+
+    @classmethod
+    def get_monthly_mort_array(cls, tbl_name, sex, adj_tbl_name=None):
+        """
+        以年龄为下标的月度发生率数组，1 - (1 - qx) ** (1/12)
+
+        Example:
+        >>> ReadTable.get_monthly_mort_array("CL_2000_1.csv", 0, "K_2000_1.csv")
+
+        :param str tbl_name: 发生率表名
+        :param int sex: 性别，0为男性，1为女性
+        :param str adj_tbl_name: 扣除表名，年度发生率先乘以(1 - 扣除率)再转换
+        :return: 只读float64数组
+        :rtype: np.ndarray
+        """
+        path = os.path.join(cls.MORT_TABLE_DIRECTORY, tbl_name)
+        adj_path = None if adj_tbl_name is None else os.path.join(cls.MORT_TABLE_DIRECTORY, adj_tbl_name)
+
+        def load():
+            qx = cls.get_mort_array(tbl_name, sex)
+            if adj_tbl_name is not None:
+                adj = cls.get_mort_array(adj_tbl_name, sex)
+                n = min(len(qx), len(adj))
+                qx = qx[:n] * (1 - adj[:n])
+            return cls._freeze(1 - (1 - qx) ** (1 / 12.))
+        return cls._cache_get(("mort_monthly", path, sex, adj_path), load)
+
+    @classmethod
+    def _polyr_array(cls, path, payterm):
+        def load():
+            col = cls.read_columns(path, str(payterm))[0].astype('float64')
+            return cls._freeze(np.nan_to_num(col))
+        return cls._cache_get(("polyr", path, payterm), load)
+
+    @classmethod
+    def get_load_array(cls, tbl_name, payterm):
+        """
+        以保单年度为序的附加费用率数组，首项对应第1保单年度，空值为0
+
+        :param str tbl_name: loading表名
+        :param int payterm: 缴费期间
+        :return: 只读float64数组
+        :rtype: np.ndarray
+        """
+        return cls._polyr_array(os.path.join(cls.LOADING_TABLE_DIRECTORY, tbl_name), payterm)
+
+    @classmethod
+    def get_lapse_array(cls, tbl_name, payterm):
+        """
+        以保单年度为序的退保率数组，首项对应第1保单年度，空值为0
+
+        :param str tbl_name: lapse表名
+        :param int payterm: 缴费期间
+        :return: 只读float64数组
+        :rtype: np.ndarray
+        """
+        return cls._polyr_array(os.path.join(cls.LAPSE_TABLE_DIRECTORY, tbl_name), payterm)
+
+
+class SelectTable(object):
+    """
+    选择-终极发生率表
+
+    rates[x, t] 为投保年龄x第t+1保单年度的发生率：t小于选择期时取选择发生率，否则取到达年龄 x+t 的终极发生率，
+    缺失的组合为nan；批量取值为一次数组下标运算，不筛选Dataframe
+    """
+    def __init__(self, ultimate, select=None):
+        """
+
+        :param np.ndarray ultimate: 以到达年龄为下标的终极发生率
+        :param np.ndarray select: (投保年龄 × 选择期) 的选择发生率，None时为终极表
+        """
+        ultimate = np.asarray(ultimate, dtype='float64')
+        n = len(ultimate)
+        age = np.arange(n)[:, None] + np.arange(n)[None, :]
+        rates = np.where(age < n, ultimate[np.minimum(age, n - 1)], np.nan)
+        self.select_period = 0
+        if select is not None:
+            select = np.asarray(select, dtype='float64')
+            self.select_period = select.shape[1]
+            m = min(len(select), n)
+            rates[:m, :self.select_period] = select[:m, :n]
+        rates.setflags(write=False)
+        self.rates = rates
+
+    def lookup(self, iss_age, t):
+        """
+        按投保年龄与保单年度下标取值，参数按numpy规则广播
+
+        :param iss_age: 投保年龄
+        :param t: 保单年度减1
+        :return: 发生率，超出表范围或缺失时为nan
+        :rtype: np.ndarray
+        """
+        iss_age, t = np.broadcast_arrays(np.asarray(iss_age, dtype='int64'), np.asarray(t, dtype='int64'))
+        n_age, n_dur = self.rates.shape
+        out = (iss_age >= 0) & (iss_age < n_age) & (t >= 0) & (t < n_dur)
+        qx = self.rates[np.where(out, iss_age, 0), np.where(out, t, 0)]
+        return np.where(out, qx, np.nan)
+
+    pass
+
+
+class TableStore(object):
+    """
+    二进制列式假设库
+
+    将ReadTable读取的各目录csv编译为一个数据文件与一个索引文件，
+    数据文件以内存映射方式只读加载，多进程共享同一份页缓存
+    """
+    DIRECTORIES = ("plan", "table", "loading", "lapse")
+    DATA_FILE = "assumption.bin"
+    INDEX_FILE = "assumption.json"
+
+    def __init__(self, directory):
+        """
+
+        :param str directory: 假设库目录
+        """
+        self.directory = directory
+        with open(os.path.join(directory, self.INDEX_FILE)) as f:
+            index = json.load(f)
+        self.index = index["tables"]
+        data_path = os.path.join(directory, self.DATA_FILE)
+        if "data_size" in index and os.path.getsize(data_path) != index["data_size"]:
+            raise ValueError("assumption store {} is inconsistent, compile it again".format(directory))
+        if os.path.getsize(data_path):
+            self.data = np.memmap(data_path, dtype='uint8', mode='r')
+        else:
+            self.data = np.zeros(0, dtype='uint8')
+
+    @staticmethod
+    def key(path):
+        """
+        :param str path: csv文件路径
+        :return: 索引键，相对于BASE_DIRECTORY的路径
+        :rtype: str
+        """
+        return os.path.relpath(path, ReadTable.BASE_DIRECTORY).replace(os.sep, "/")
+
+    def has(self, path):
+        """
+        库中是否有该表，csv修改时间晚于编译时间时视为没有
+        """
+        entry = self.index.get(self.key(path))
+        if entry is None:
+            return False
+        return not (os.path.exists(path) and os.path.getmtime(path) > entry["mtime"])
+
+    def column(self, path, name):
+        """
+        :param str path: csv文件路径
+        :param str name: 列名
+        :return: 数值列为内存映射的只读视图，文本列为object数组
+        :rtype: np.ndarray
+        """
+        entry = self.index[self.key(path)]
+        for col in entry["columns"]:
+            if col["name"] == name:
+                break
+        else:
+            raise KeyError(name)
+        if col["dtype"] == "text":
+            return np.array(col["values"], dtype=object)
+        return np.ndarray((entry["rows"],), dtype=col["dtype"], buffer=self.data, offset=col["offset"])
+
+    def frame(self, path):
+        """
+        :param str path: csv文件路径
+        :return: 与pd.read_csv结果一致的Dataframe
+        :rtype: pd.DataFrame
+        """
+        entry = self.index[self.key(path)]
+        names = [x["name"] for x in entry["columns"]]
+        return pd.DataFrame(OrderedDict((x, self.column(path, x)) for x in names), columns=names)
+
+    @classmethod
+    def compile(cls, directory=None):
+        """
+        编译假设库
+
+        Example:
+        >>> TableStore.compile()
+
+        :param str directory: 输出目录，默认为ReadTable.STORE_DIRECTORY
+        :return: 输出目录
+        :rtype: str
+        """
+        directory = directory or ReadTable.STORE_DIRECTORY
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        tables = OrderedDict()
+        offset = 0
+        data_path = os.path.join(directory, cls.DATA_FILE)
+        index_path = os.path.join(directory, cls.INDEX_FILE)
+        # 先写入临时文件再替换，编译中断时原有的库保持完整
+        with open(data_path + ".tmp", "wb") as f:
+            for sub in cls.DIRECTORIES:
+                sub_dir = os.path.join(ReadTable.BASE_DIRECTORY, sub)
+                if not os.path.isdir(sub_dir):
+                    continue
+                for name in sorted(os.listdir(sub_dir)):
+                    if not name.endswith(".csv"):
+                        continue
+                    path = os.path.join(sub_dir, name)
+                    tbl = pd.read_csv(path)
+                    columns = []
+                    for col in tbl.columns:
+                        values = tbl[col].values
+                        if values.dtype == object:
+                            columns.append({"name": col, "dtype": "text",
+                                            "values": [None if pd.isnull(x) else x for x in values]})
+                            continue
+                        buf = np.ascontiguousarray(values).tobytes()
+                        buf += b"\0" * (-len(buf) % 8)
+                        # 按8字节对齐
+                        f.write(buf)
+                        columns.append({"name": col, "dtype": values.dtype.str, "offset": offset})
+                        offset += len(buf)
+                    tables[cls.key(path)] = {
+                        "rows": len(tbl),
+                        "mtime": os.path.getmtime(path),
+                        "columns": columns
+                    }
+        with open(index_path + ".tmp", "w") as f:
+            json.dump({"data_size": offset, "tables": tables}, f, indent=1)
+        os.replace(data_path + ".tmp", data_path)
+        os.replace(index_path + ".tmp", index_path)
+        return directory
+
+
+if __name__ == '__main__':
+    print(TableStore.compile())
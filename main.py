@@ -0,0 +1,21 @@
+# -*- coding:utf-8 -*-
+
+"""
+逐单法定准备金计算入口
+
+python main.py policy.csv reserve.csv [reject.csv]
+
+
+"""
+
+
+import sys
+import core.runner as rn
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("usage: python main.py policy.csv reserve.csv [reject.csv]")
+        sys.exit(1)
+    stats = rn.StatRunner().run(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    print("{policies} policies, {rejected} rejected, {seconds:.2f}s, {policies_per_sec:.0f} policies/s".format(**stats))
@@ -0,0 +1,8 @@
+# -*- coding:utf-8 -*-
+
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore", category=SyntaxWarning)
@@ -0,0 +1,56 @@
+# -*- coding:utf-8 -*-
+
+"""
+BatchPricing、BatchStat与逐单的PricingOd、Stat在model point网格上一致
+"""
+
+import numpy as np
+import pytest
+import core.batch as bt
+import core.pricing as pc
+import core.stat as st
+
+PLAN = 10513002
+GRID = [(age, sex, payterm, insterm)
+        for age in (0, 25, 40, 55)
+        for sex in (0, 1)
+        for payterm in (1, 5, 10)
+        for insterm in (20, 50)]
+
+
+def _single(age, sex, payterm, insterm):
+    s = st.Stat(PLAN)
+    p = s.pricing
+    s.IssAge, s.sex, s.payterm, s.insterm = age, sex, payterm, insterm
+    p.IssAge, p.sex, p.payterm, p.insterm = age, sex, payterm, insterm
+    return p, s
+
+
+@pytest.fixture(scope="module")
+def batch():
+    mp = np.array(GRID)
+    return bt.BatchStat(PLAN, mp[:, 0], mp[:, 1], mp[:, 2], mp[:, 3])
+
+
+def test_gp_grid(batch):
+    gp = batch.pricing.gp()
+    for i, x in enumerate(GRID):
+        p, _ = _single(*x)
+        assert gp[i] == pytest.approx(p.gp(), abs=1e-9), x
+
+
+def test_cv_grid(batch):
+    cv = batch.pricing.cv()
+    for i, x in enumerate(GRID):
+        p, _ = _single(*x)
+        n = x[3]
+        np.testing.assert_allclose(cv[i, :n - 1], p.cv()[:n - 1], atol=1e-9, err_msg=str(x))
+
+
+def test_stat_grid(batch):
+    rsv = batch.stat()
+    for i, x in enumerate(GRID):
+        _, s = _single(*x)
+        n = x[3]
+        np.testing.assert_allclose(rsv[i, :n], s.stat()[:n], atol=1e-9, err_msg=str(x))
+        assert not rsv[i, n:].any()
@@ -0,0 +1,42 @@
+# -*- coding:utf-8 -*-
+
+"""
+向量化保额规则与Benefit逐项一致，未定义的uid抛出异常
+"""
+
+import numpy as np
+import pytest
+import core.pricing as pc
+import core.benefit_rule as br
+
+AGE = np.arange(25, 85)
+POLYR = AGE - 24
+MAT = 80
+
+
+@pytest.mark.parametrize("ben", [pc.Db(1, 0, 0), pc.Db(1, 0, 1), pc.Ci(2, 1, 0), pc.Db(1, 0, 2), pc.Ann(3, 2, 0)])
+def test_rules_match_scalar(ben):
+    for np_ in (1, 10):
+        fix = br.get_fix_rule(ben)(50, np_, AGE, POLYR, MAT)
+        expected = [ben.get_ben_sa_fix(50, np_, a, t, MAT) for a, t in zip(AGE, POLYR)]
+        np.testing.assert_allclose(fix, expected)
+        if ben.BEN_TYPE != "ann":
+            prem = br.get_prem_rule(ben)(50, np_, AGE, POLYR, MAT)
+            expected = [ben.get_ben_sa_p(50, np_, a, t, MAT) for a, t in zip(AGE, POLYR)]
+            np.testing.assert_allclose(prem, expected)
+
+
+def test_rules_broadcast():
+    out = br.get_prem_rule(pc.Db(1, 0, 1))(50, np.array([[5], [10]]), AGE[None, :], POLYR[None, :], MAT)
+    assert out.shape == (2, len(AGE)) and out.dtype == np.float64
+    np.testing.assert_array_equal(out.max(axis=1), [5, 10])
+
+
+@pytest.mark.parametrize("ben, func, msg", [
+    (pc.Db(1, 0, 3), br.get_fix_rule, "fixed sa uid_p 3"),
+    (pc.Db(1, 0, 3), br.get_prem_rule, "premium sa uid_p 3"),
+    (pc.Ann(3, 5, 0), br.get_fix_rule, "annuity uid_f 5"),
+])
+def test_unknown_uid_raises(ben, func, msg):
+    with pytest.raises(NotImplementedError, match=msg):
+        func(ben)
@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+
+"""
+CashflowWriter的分片输出
+"""
+
+import numpy as np
+import core.tbl_manage as tm
+import core.cashflow as cf
+
+
+def _write(directory, n_shards):
+    writer = cf.CashflowWriter(directory)
+    valid = np.ones((2, 3), dtype=bool)
+    for i in range(n_shards):
+        writer.write(np.array([2 * i, 2 * i + 1]), np.ones((2, 3)), np.ones((2, 3)), np.zeros((2, 3)), valid)
+    return writer
+
+
+def test_rewrite_removes_stale_shards(tmp_path):
+    directory = str(tmp_path)
+    (tmp_path / "other.txt").write_text("keep")
+    _write(directory, 3)
+    _write(directory, 1)
+    shards = cf.read_shards(directory, "policy_id")
+    assert len(shards) == 1
+    np.testing.assert_array_equal(np.concatenate(shards), [0, 0, 0, 1, 1, 1])
+    assert (tmp_path / "other.txt").exists()
+
+
+def test_projector_validates_policies(tmp_path):
+    policies = tm.pd.DataFrame({
+        "policy_id": [1, 2, 3, 4],
+        "plan_id": 10513002,
+        "iss_age": [30, 40, 35, 45],
+        "sex": [0, 1, 2, 0],
+        "payterm": [10, 5, 10, 10],
+        "insterm": [20, 20, 20, 20],
+        "sa": [1000., 2000., 1000., -1.],
+        "issue_month": [202001, 202003, 202001, 202001]
+    })
+    path = str(tmp_path / "policy.csv")
+    reject_path = str(tmp_path / "reject.csv")
+    policies.to_csv(path, index=False)
+    res = cf.CashflowProjector().run(path, str(tmp_path / "cf"), reject_path=reject_path)
+    assert res["policies"] == 2 and res["rejected"] == 2
+    rejects = tm.pd.read_csv(reject_path).set_index("policy_id")["reason"]
+    assert rejects.to_dict() == {3: "invalid sex", 4: "invalid sa"}
+    lx_bop, prem, ben, valid = cf.project_chunk(10513002, np.array([30, 40]), np.array([0, 1]),
+                                                np.array([10, 5]), np.array([20, 20]), np.array([1000., 2000.]))
+    np.testing.assert_array_equal(np.concatenate(cf.read_shards(str(tmp_path / "cf"), "prem")), prem[valid])
+    agg = res["aggregate"]
+    assert agg["month"].iloc[0] == 202001
+    np.testing.assert_allclose(agg["prem"].sum(), prem[valid].sum())
@@ -0,0 +1,27 @@
+# -*- coding:utf-8 -*-
+
+"""
+CohortProjection的汇总结果
+"""
+
+import numpy as np
+import core.tbl_manage as tm
+import core.cohort as co
+
+
+def test_run_twice_does_not_accumulate():
+    policies = tm.pd.DataFrame({
+        "policy_id": np.arange(4),
+        "plan_id": 10513002,
+        "iss_age": [30, 40, 30, 50],
+        "sex": [0, 1, 0, 1],
+        "payterm": [10, 10, 5, 1],
+        "insterm": 20,
+        "sa": [1000., 2000., 500., 3000.],
+        "issue_year": [2015, 2015, 2016, 2016]
+    })
+    cp = co.CohortProjection(policies)
+    first = dict((k, v.copy()) for k, v in cp.run().items())
+    second = cp.run()
+    for name in co.CohortProjection.RESULTS:
+        np.testing.assert_array_equal(second[name], first[name])
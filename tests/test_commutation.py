@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+
+"""
+ProductCommutation与逐单、批量计算一致，interp_reserve的保费插值
+"""
+
+import numpy as np
+import pytest
+import core.batch as bt
+import core.commutation as cm
+import core.pricing as pc
+import core.stat as st
+
+PLAN = 10513002
+
+
+@pytest.mark.parametrize("sex, payterm, insterm", [
+    (0, 10, 50),
+    (1, 10, 50),
+    (0, 20, "105@"),
+    (1, 5, 30),
+])
+def test_product_matches_batch_stat(sex, payterm, insterm):
+    table = cm.ProductCommutation.get(PLAN, sex, payterm, insterm)
+    ages = np.arange(len(table.iss_age))
+    bs = bt.BatchStat(PLAN, ages, sex, payterm, insterm)
+    ref = bs.stat() * bs.pricing.mp_valid()
+    got = table.stat(ages[:, None], np.arange(1, ref.shape[1] + 1)[None, :])
+    np.testing.assert_allclose(got, ref, atol=1e-9)
+    np.testing.assert_array_equal(table.gp(ages), bs.pricing.gp())
+
+
+def test_product_matches_single_point():
+    s = st.Stat(PLAN)
+    p = pc.PricingOd(PLAN)
+    table = cm.ProductCommutation.get(PLAN, s.sex, s.payterm, s.insterm)
+    assert table.gp(p.IssAge) == p.gp()
+    rsv = s.stat()
+    np.testing.assert_allclose(table.stat(s.IssAge, np.arange(1, len(rsv))), rsv[:-1], atol=1e-9)
+
+
+def test_reserve_at_uses_premium():
+    table = cm.ProductCommutation.get(PLAN, 0, 10, 50)
+    bs = bt.BatchStat(PLAN, [30, 30, 30, 30], 0, 10, 50)
+    months = np.array([0, 6, 18, 12 * 12 + 3])
+    got = cm.interp_reserve(bs.stat(), months, bs.trnp())
+    np.testing.assert_allclose(got, table.reserve_at(30, months), atol=1e-9)
+    t, f = months // 12, (months % 12) / 12.
+    expected = (1 - f) * (table.stat(30, t) + table.trnp(30, t)) + f * table.stat(30, t + 1)
+    np.testing.assert_allclose(got, np.where(f > 0, expected, table.stat(30, t)), atol=1e-9)
+    assert got[1] > cm.interp_reserve(bs.stat(), months)[1]
+
+
+def test_cache_is_bounded():
+    old = cm.Commutation.CACHE_SIZE
+    cm.Commutation.CACHE_SIZE = 2
+    try:
+        for rate in (0.02, 0.025, 0.03):
+            cm.Commutation.from_plan(PLAN, 0, rate)
+        assert len(cm.Commutation._instances) <= 2
+    finally:
+        cm.Commutation.CACHE_SIZE = old
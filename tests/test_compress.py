@@ -0,0 +1,68 @@
+# -*- coding:utf-8 -*-
+
+"""
+compress按保额加权归并，value与逐单计算一致，error_report汇总误差
+"""
+
+import numpy as np
+import core.tbl_manage as tm
+import core.batch as bt
+import core.commutation as cm
+import core.compress as cp
+
+
+def _policies(n=200, seed=0):
+    rng = np.random.RandomState(seed)
+    return tm.pd.DataFrame({
+        "policy_id": np.arange(n),
+        "plan_id": 10513002,
+        "iss_age": rng.randint(20, 50, n),
+        "sex": rng.randint(0, 2, n),
+        "payterm": rng.choice([5, 10], n),
+        "insterm": 50,
+        "sa": rng.randint(10, 100, n) * 1000.,
+        "duration": rng.randint(0, 20, n)
+    })
+
+
+def test_compress_weights_by_sa():
+    policies = tm.pd.DataFrame({
+        "policy_id": [1, 2, 3],
+        "plan_id": 10513002,
+        "iss_age": [30, 34, 40],
+        "sex": 0,
+        "payterm": 10,
+        "insterm": 50,
+        "sa": [1000., 3000., 1000.],
+        "duration": [2, 2, 2]
+    })
+    points = cp.compress(policies, age_band=5)
+    assert points["iss_age"].tolist() == [33, 40]
+    # (30 × 1000 + 34 × 3000) / 4000 = 33
+    assert points["sa"].tolist() == [4000., 1000.] and points["count"].tolist() == [2, 1]
+    assert points["duration"].tolist() == [2, 2]
+
+
+def test_value_matches_batch_stat():
+    policies = _policies(20)
+    got = cp.value(policies)["reserve"].values
+    bs = bt.BatchStat(10513002, policies["iss_age"].values, policies["sex"].values,
+                      policies["payterm"].values, policies["insterm"].values)
+    expected = cm.interp_reserve(bs.stat(), 12 * policies["duration"].values, bs.trnp())
+    np.testing.assert_allclose(got, expected * policies["sa"].values / cp.st.Stat.sa)
+
+
+def test_compress_without_banding_is_exact():
+    policies = _policies()
+    seriatim = cp.value(policies)["reserve"].sum()
+    points = cp.compress(policies, age_band=1, duration_band=1)
+    assert points["sa"].sum() == policies["sa"].sum() and points["count"].sum() == len(policies)
+    np.testing.assert_allclose(cp.value(points)["reserve"].sum(), seriatim, rtol=1e-12)
+
+
+def test_error_report():
+    report = cp.error_report(_policies(), sample=150, age_band=5)
+    total = report.loc["total"]
+    assert total["policies"] == 150 and total["points"] < 150
+    assert abs(total["rel_error"]) < 0.05
+    np.testing.assert_allclose(total["rel_error"], total["compressed"] / total["seriatim"] - 1)
@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+"""
+多减因kernel与K表扣除规则
+"""
+
+import numpy as np
+import pytest
+import core.tbl_manage as tm
+import core.decrement as dc
+import core.pricing as pc
+import core.stat as st
+import core.gaap as ga
+import core.batch as bt
+
+
+DEATH_ONLY = 10513099
+
+
+@pytest.fixture
+def death_only_plan(tmp_path, monkeypatch):
+    """
+    在险种表中增加只含死亡责任的险种
+    """
+    rt = tm.ReadTable
+    for name in ("list_plan_benifit.csv", "list_benifit.csv"):
+        (tmp_path / name).write_bytes(open(tm.os.path.join(rt.PLAN_DIRECTORY, name), "rb").read())
+    with open(str(tmp_path / "list_plan_benifit.csv"), "a") as f:
+        f.write("\n{},death,1,0,1".format(DEATH_ONLY))
+    monkeypatch.setattr(rt, "PLAN_DIRECTORY", str(tmp_path))
+    rt.clear_cache()
+    yield
+    monkeypatch.undo()
+    rt.clear_cache()
+
+
+def _death(plan_id):
+    return [x for x in pc.PricingOd(plan_id).ben_list() if x.BEN_TYPE == "death"][0]
+
+
+@pytest.mark.parametrize("plan_id, adjusted", [(10513002, True), (DEATH_ONLY, False)])
+def test_k_adjustment_agrees_across_engines(death_only_plan, plan_id, adjusted):
+    ben = _death(plan_id)
+    bens = pc.PricingOd(plan_id).ben_list()
+    assert dc.KERNEL.adj_tbl_name(ben, bens) == ("K_2000_1.csv" if adjusted else None)
+    p = pc.PricingOd(plan_id)
+    raw = p.get_qx_list(0, ben.get_qx_tbl_name())
+    k = p.get_qx_list(0, "K_2000_1.csv")
+    expected = raw * (1 - k) if adjusted else raw
+    s = st.Stat(plan_id)
+    g = ga.Gaap(plan_id, "YEAR")
+    for qx in (p.adj_qx_list(0, ben), s.adj_qx_list(0, ben), g.adj_qx_list(0, ben)):
+        np.testing.assert_allclose(qx, expected)
+    assert p.IssAge == 30
+    bp = bt.BatchPricing(plan_id, [30], 0, 10, 20)
+    bs = bt.BatchStat(plan_id, [30], 0, 10, 20)
+    np.testing.assert_allclose(bp.adj_qx_list(ben)[0], expected[:20])
+    np.testing.assert_allclose(bs.adj_qx_list(ben)[0], expected[:20])
+    bg = bt.BatchGaap(plan_id, [30], 0, 10, 20)
+    annual = 1 - np.prod(1 - bg.adj_qx_list(ben)[0].reshape(20, 12), axis=1)
+    np.testing.assert_allclose(annual, expected[:20])
+
+
+def _rates(n_pol=3, n_dec=3, n_dur=6, seed=0):
+    return np.random.RandomState(seed).uniform(0, 0.1, (n_pol, n_dec, n_dur))
+
+
+def test_kernel_single_group_matches_sum_of_rates():
+    q = _rates()
+    proj = dc.DecrementKernel().project(q)
+    expected = np.cumprod(1 - q.sum(axis=1), axis=1)
+    np.testing.assert_allclose(proj.lx_eop, expected)
+    np.testing.assert_allclose(proj.lx_bop[:, 1:], expected[:, :-1])
+    assert (proj.lx_bop[:, 0] == 1).all() and proj.exits is None
+
+
+def test_kernel_groups_and_exits():
+    q = _rates()
+    proj = dc.DecrementKernel().project(q, groups=[0, 0, 1], exits=True)
+    survival = (1 - q[:, 0] - q[:, 1]) * (1 - q[:, 2])
+    np.testing.assert_allclose(proj.survival, survival)
+    np.testing.assert_allclose(proj.lx_eop, np.cumprod(survival, axis=1))
+    np.testing.assert_allclose(proj.exits[:, 0], q[:, 0] * proj.lx_bop)
+    np.testing.assert_allclose(proj.exits[:, 2], q[:, 2] * proj.lx_bop * (1 - q[:, 0] - q[:, 1]))
+    # 后一组的退出以前一组退出后的在险人数为基数
+    np.testing.assert_allclose(proj.exits.sum(axis=1), proj.lx_bop - proj.lx_eop)
+
+
+def test_kernel_float32_and_single_policy():
+    q = _rates(n_pol=1)
+    proj = dc.DecrementKernel('float32').project(q[0], exits=True)
+    assert proj.lx_eop.dtype == np.float32 and proj.exits.dtype == np.float32
+    assert proj.lx_eop.shape == (1, 6)
+    np.testing.assert_allclose(proj.lx_eop, dc.KERNEL.project(q).lx_eop, rtol=1e-6)
@@ -0,0 +1,45 @@
+# -*- coding:utf-8 -*-
+
+"""
+PolicyRules的校验规则，每行只记录第一个错误原因
+"""
+
+import numpy as np
+import core.tbl_manage as tm
+import core.ingest as ig
+
+GOOD = {"policy_id": 1, "plan_id": 10513002, "iss_age": 30, "sex": 0, "payterm": 10, "insterm": 50, "sa": 1000.}
+CASES = [
+    ({}, ""),
+    ({"insterm": "105@"}, ""),
+    ({"iss_age": 30.0}, ""),
+    ({"iss_age": None}, "missing value"),
+    ({"sa": "abc"}, "non-numeric value"),
+    ({"iss_age": 30.5}, "non-integer value"),
+    ({"payterm": 9.9}, "non-integer value"),
+    ({"insterm": 50.2}, "non-integer value"),
+    ({"plan_id": 1}, "unknown plan_id"),
+    ({"sex": 2}, "invalid sex"),
+    ({"iss_age": -1}, "invalid iss_age"),
+    ({"payterm": 20, "insterm": 10}, "invalid payterm/insterm"),
+    ({"payterm": 7}, "payterm not in loading table"),
+    ({"iss_age": 80}, "age out of mortality table"),
+    ({"sa": 0}, "invalid sa"),
+]
+
+
+def test_rules_reasons():
+    rows = [dict(GOOD, **change) for change, _ in CASES]
+    chunk = tm.pd.DataFrame(rows, columns=ig.POLICY_COLUMNS).astype(object)
+    reason = ig.PolicyRules().check(chunk)
+    assert reason.tolist() == [x for _, x in CASES]
+
+
+def test_fractional_age_is_rejected_not_truncated(tmp_path):
+    path = str(tmp_path / "policy.csv")
+    tm.pd.DataFrame([GOOD, dict(GOOD, policy_id=2, iss_age=30.5)]).to_csv(path, index=False)
+    stream = ig.PolicyStream(path)
+    units = list(stream)
+    assert [c["policy_id"].tolist() for _, c in units] == [[1]]
+    assert stream.reject_frame()["reason"].tolist() == ["non-integer value"]
+    np.testing.assert_array_equal(units[0][1]["iss_age"].values, [30])
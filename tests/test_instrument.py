@@ -0,0 +1,24 @@
+# -*- coding:utf-8 -*-
+
+"""
+Profile统计逐单与批量模块的方法，退出后恢复原方法
+"""
+
+import numpy as np
+import core.batch as bt
+import core.instrument as ins
+
+
+def test_profile_batch_modules():
+    raw = bt.BatchStat.__dict__["stat"]
+    with ins.profile() as prof:
+        bs = bt.BatchStat(10513002, [30, 40], 0, 10, 50)
+        rsv = bs.stat()
+        bg = bt.BatchGaap(10513002, [30, 40], 0, 10, 50)
+        bg.mp_lx_bop()
+    names = set(prof.stats)
+    assert {"BatchStat.stat", "BatchPricing.gp", "BatchGaap.mp_lx_bop"} <= names
+    assert prof.stats["BatchStat.stat"][0] == 1
+    assert any(k[:1] == ("BatchStat.stat",) and "BatchPricing.gp" in k for k in prof.stacks)
+    assert bt.BatchStat.__dict__["stat"] is raw
+    np.testing.assert_array_equal(rsv, bt.BatchStat(10513002, [30, 40], 0, 10, 50).stat())
@@ -0,0 +1,68 @@
+# -*- coding:utf-8 -*-
+
+"""
+memo缓存失效：修改各节点声明的依赖后，结果与新建对象一致
+"""
+
+import numpy as np
+import pytest
+import core.batch as bt
+
+PLAN = 10513002
+
+
+def _stat(sex=(0, 1), age=(30, 40), payterm=(10, 5), insterm=50):
+    return bt.BatchStat(PLAN, list(age), list(sex), list(payterm), insterm)
+
+
+@pytest.mark.parametrize("attr, value", [
+    ("sex", np.array([1, 1])),
+    ("iss_age", np.array([35, 45])),
+    ("payterm", np.array([5, 10])),
+    ("insterm", np.array([40, 40])),
+    ("IntRate", 0.03),
+    ("IntRate_CV", 0.05),
+    ("load_tbl_name", "Loading_10513002"),
+    ("mat", 70),
+])
+def test_batch_stat_pricing_attribute(attr, value):
+    bs = _stat()
+    bs.stat()
+    setattr(bs.pricing, attr, value)
+    fresh = _stat()
+    setattr(fresh.pricing, attr, value)
+    np.testing.assert_array_equal(bs.stat(), fresh.stat())
+    np.testing.assert_array_equal(bs.pricing.gp(), fresh.pricing.gp())
+
+
+@pytest.mark.parametrize("attr, value", [("IntRate", 0.03), ("method", "NET"), ("qx_shock", ("mul", 1.2))])
+def test_batch_stat_attribute(attr, value):
+    bs = _stat()
+    bs.stat()
+    setattr(bs, attr, value)
+    fresh = _stat()
+    setattr(fresh, attr, value)
+    np.testing.assert_array_equal(bs.stat(), fresh.stat())
+
+
+@pytest.mark.parametrize("target, attr, value", [
+    ("pricing", "sex", np.array([1, 1])),
+    ("pricing", "iss_age", np.array([35, 45])),
+    ("pricing", "payterm", np.array([5, 10])),
+    ("pricing", "insterm", np.array([40, 40])),
+    ("pricing", "mat", 70),
+    ("self", "sa", np.array([2000., 5000.])),
+    ("self", "sa_unit", 500),
+    ("self", "qx_shock", ("mul", 1.2)),
+    ("self", "lapse_shock", ("mul", 0.5)),
+])
+def test_batch_gaap_attribute(target, attr, value):
+    def make():
+        return bt.BatchGaap(PLAN, [30, 40], [0, 1], [10, 5], 50)
+    bg = make()
+    bg.mp_prem(), bg.mp_ben_fix(bg.ben_list()[0])
+    fresh = make()
+    for obj in (bg, fresh):
+        setattr(obj.pricing if target == "pricing" else obj, attr, value)
+    np.testing.assert_array_equal(bg.mp_prem(), fresh.mp_prem())
+    np.testing.assert_array_equal(bg.mp_ben_fix(bg.ben_list()[0]), fresh.mp_ben_fix(fresh.ben_list()[0]))
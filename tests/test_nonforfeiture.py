@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+
+"""
+现金价值表与逐单现金价值一致，逐单准备金不生成整张表
+"""
+
+import numpy as np
+import core.nonforfeiture as nf
+import core.stat as st
+
+
+def test_single_point_stat_does_not_build_table():
+    nf.NonforfeitureTable._instances.clear()
+    s = st.Stat(10513002)
+    s.stat()
+    assert len(nf.NonforfeitureTable._instances) == 0
+
+
+def test_table_matches_single_point_cv():
+    s = st.Stat(10513002)
+    p = s.pricing
+    table = nf.NonforfeitureTable.from_pricing(p)
+    n = len(p.cv())
+    np.testing.assert_allclose(table.cv[p.IssAge, :n - 1], p.cv()[:n - 1], atol=1e-9)
+
+
+PLAN = 10513002
+
+
+def test_rpu_is_cv_over_future_benefits():
+    table = nf.NonforfeitureTable.get(PLAN, 0, 10, 50)
+    bp = nf.bt.BatchPricing(PLAN, [30], 0, 10, 50)
+    dx = bp.mp_dx_cv("boy")[0]
+    pv_ben = bp.apv_ben_total_cv()[0][::-1].cumsum()[::-1]
+    t = np.arange(1, 10)
+    # 第t保单年度末的未来给付现值为第t+1年初起的给付
+    expected = bp.pricing.sa * table.cv[30, t - 1] / (pv_ben[t] / dx[t])
+    np.testing.assert_allclose(table.rpu[30, t - 1], expected, rtol=1e-9)
+    assert (np.diff(table.rpu[30, :9]) > 0).all()
+    np.testing.assert_allclose(table.rpu[30, 9:49], bp.pricing.sa)
+    # 缴费期满后现金价值即为未来给付现值，减额缴清保额为原保额
+
+
+def test_values_bounded_and_zero_at_maturity():
+    table = nf.NonforfeitureTable.get(PLAN, 1, 20, 40)
+    sa = nf.pc.PricingOd.sa
+    remaining = 40 - np.arange(1, 41)
+    assert ((table.rpu >= 0) & (table.rpu <= sa)).all()
+    assert ((table.eti_endow >= 0) & (table.eti_endow <= sa)).all()
+    assert ((table.eti_years >= 0) & (table.eti_years <= remaining[None, :] + 1e-9)).all()
+    for x in ("rpu", "eti_years", "eti_endow"):
+        assert (getattr(table, x)[:, -1] == 0).all()
+
+
+def test_eti_buys_term_cover():
+    table = nf.NonforfeitureTable.get(PLAN, 0, 10, 50)
+    years = table.eti_years[30, :9]
+    assert ((years > 0) & (years < 50 - np.arange(1, 10))).all()
+    assert (np.diff(years) > 0).all()
+    np.testing.assert_allclose(table.eti_years[30, 9:49], 50 - np.arange(10, 50))
+    # 缴清后展期至期满
+    paid_up = nf.NonforfeitureTable.get(PLAN, 0, 1, 20)
+    np.testing.assert_allclose(paid_up.eti_years[30, :19], 20 - np.arange(1, 20))
+    np.testing.assert_allclose(paid_up.rpu[30, :19], nf.pc.PricingOd.sa)
+
+
+def test_cache_is_bounded_and_drops_old_generations():
+    old = nf.NonforfeitureTable.CACHE_SIZE
+    nf.NonforfeitureTable.CACHE_SIZE = 2
+    try:
+        nf.NonforfeitureTable._instances.clear()
+        for payterm in (5, 10, 15):
+            nf.NonforfeitureTable.get(PLAN, 0, payterm, 20)
+        assert len(nf.NonforfeitureTable._instances) == 2
+        first = nf.NonforfeitureTable.get(PLAN, 0, 15, 20)
+        assert nf.NonforfeitureTable.get(PLAN, 0, 15, 20) is first
+        nf.tm.ReadTable.clear_cache()
+        second = nf.NonforfeitureTable.get(PLAN, 0, 15, 20)
+        assert second is not first
+        assert list(nf.NonforfeitureTable._instances.values()) == [second]
+    finally:
+        nf.NonforfeitureTable.CACHE_SIZE = old
@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+
+"""
+RateBook与BatchPricing一致，refresh只重算假设变化的组
+"""
+
+import numpy as np
+import core.tbl_manage as tm
+import core.batch as bt
+import core.ratebook as rb
+
+PLAN = 10513002
+
+
+def test_gp_and_cv_tables_match_batch():
+    book = rb.RateBook(PLAN, 20, ages=[30, 40], payterms=[5, 10])
+    gp = book.gp_table()
+    assert list(gp.columns) == [(0, 5), (0, 10), (1, 5), (1, 10)]
+    np.testing.assert_array_equal(gp[(1, 10)].values, bt.BatchPricing(PLAN, [30, 40], 1, 10, 20).gp())
+    cv = book.cv_table()
+    row = cv[(cv["sex"] == 0) & (cv["payterm"] == 5) & (cv["age"] == 40)]
+    assert row["polyr"].tolist() == list(range(1, 21))
+    np.testing.assert_array_equal(row["cv"].values, bt.BatchPricing(PLAN, [40], 0, 5, 20).cv()[0, :20])
+
+
+def test_default_ages_and_payterms():
+    book = rb.RateBook(PLAN, 50, load_tbl_name="Loading_10513002")
+    assert book.payterms == [1, 3, 5, 10]
+    assert book.ages[0] == 0 and book.ages[-1] == 105 - 50 + 1
+    # 发生率表至105岁，保险期间50年的最大投保年龄为56
+    assert rb.RateBook.mort_tables(book._batch([0], 0, 10)) == ["CL_2000_1.csv", "CI_2000_1.csv", "K_2000_1.csv"]
+
+
+def test_refresh_recomputes_changed_groups(tmp_path, monkeypatch):
+    rt = tm.ReadTable
+    name = "Loading_10513002.csv"
+    (tmp_path / name).write_bytes(open(tm.os.path.join(rt.LOADING_TABLE_DIRECTORY, name), "rb").read())
+    monkeypatch.setattr(rt, "LOADING_TABLE_DIRECTORY", str(tmp_path))
+    rt.clear_cache()
+    book = rb.RateBook(PLAN, 20, ages=[30, 40], payterms=[5, 10], load_tbl_name="Loading_10513002")
+    assert book.refresh() == []
+    before = book.gp_table()
+    load = tm.pd.read_csv(str(tmp_path / name))
+    load.loc[0, "10"] = 0.5
+    load.to_csv(str(tmp_path / name), index=False)
+    rt.clear_cache(name)
+    assert book.refresh() == [(0, 10), (1, 10)]
+    after = book.gp_table()
+    assert (after[(0, 10)] < before[(0, 10)]).all()
+    np.testing.assert_array_equal(after[(0, 5)].values, before[(0, 5)].values)
+    rt.clear_cache()
@@ -0,0 +1,49 @@
+# -*- coding:utf-8 -*-
+
+"""
+Record.replace对各子类均可用
+"""
+
+import pytest
+import core.pricing as pc
+import core.modelpoint as mpm
+
+
+def test_replace_plan_record():
+    rec = pc.PlanRecord(10513002, 0, "od", ())
+    new = rec.replace(plan_type="ul")
+    assert new.plan_type == "ul" and new.plan_id == 10513002
+    assert rec.plan_type == "od"
+    assert type(new) is pc.PlanRecord
+
+
+def test_replace_benefit_info_and_assumptions():
+    info = pc.BenefitInfo(1, "death", "CL_2000_1.csv")
+    assert info.replace(tbl_name="x.csv") == pc.BenefitInfo(1, "death", "x.csv")
+    ass = mpm.AssumptionSet.default()
+    assert ass.replace(valuation_int_rate=0.03).valuation_int_rate == 0.03
+
+
+def test_replace_unknown_field():
+    with pytest.raises(AttributeError):
+        pc.BenefitInfo(1, "death", "CL_2000_1.csv").replace(plan_id=1)
+
+
+def test_replace_coerces_like_constructor():
+    ass = mpm.AssumptionSet.default().replace(valuation_int_rate=3)
+    assert type(ass.valuation_int_rate) is float
+    assert ass == mpm.AssumptionSet.default().replace(valuation_int_rate=3.0)
+    mp = mpm.ModelPoint(10513002, 30, 0, 10, 50).replace(iss_age=40.0, sa="2000")
+    assert type(mp.iss_age) is int and mp.sa == 2000.
+    with pytest.raises(ValueError):
+        mpm.AssumptionSet.default().replace(pricing_int_rate="abc")
+
+
+def test_plan_accessors_use_index():
+    index = pc.ProductIndex.get()
+    pc.tm.ReadTable.read_count = 0
+    plan = pc.Plan(10513002)
+    assert plan.plan_benefit() is index.plan(10513002).benefits
+    assert plan.plan_type() == index.plan(10513002).plan_type
+    assert pc.Benefit(1, 1, 1).get_parameter() is index.benefit(1)
+    assert pc.tm.ReadTable.read_count == 0
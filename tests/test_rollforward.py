@@ -0,0 +1,34 @@
+# -*- coding:utf-8 -*-
+
+"""
+Rollforward状态文件的保存与读取
+"""
+
+import numpy as np
+import core.tbl_manage as tm
+import core.rollforward as rf
+
+
+def _policies():
+    return tm.pd.DataFrame({
+        "policy_id": np.arange(4),
+        "plan_id": 10513002,
+        "iss_age": [30, 40, 30, 50],
+        "sex": [0, 1, 0, 1],
+        "payterm": [10, 10, 5, 1],
+        "insterm": 50,
+        "sa": [1000., 2000., 500., 3000.],
+        "months": [0, 18, 61, 7]
+    })
+
+
+def test_state_reloads_without_extension(tmp_path):
+    path = str(tmp_path / "state")
+    first = rf.Rollforward(path)
+    out = first.value(_policies())
+    first.save()
+    second = rf.Rollforward(path)
+    assert second.path == path + ".npz"
+    again = second.value(_policies())
+    assert second.last_stats["reprojected"] == 0
+    np.testing.assert_allclose(again["reserve"].values, out["reserve"].values)
@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+
+"""
+ScenarioStat与BatchStat一致，分块汇总与全部情景的结果一致
+"""
+
+import numpy as np
+import pytest
+import core.batch as bt
+import core.scenario as sc
+
+
+def _scenario(max_cells=20000000):
+    return sc.ScenarioStat(bt.BatchStat(10513002, [30, 40, 50], [0, 1, 0], [10, 5, 1], 50), max_cells)
+
+
+def test_flat_rate_matches_batch_stat():
+    ss = _scenario()
+    rsv = ss.stat([ss.batch.IntRate])
+    np.testing.assert_allclose(rsv[0], ss.batch.stat(), atol=1e-9)
+
+
+@pytest.mark.parametrize("how", ["sum", "mean", "max", "min"])
+def test_chunked_reduction(how):
+    rates = np.random.RandomState(0).normal(0.035, 0.01, (7, 50))
+    ss = _scenario(max_cells=2 * 3 * 50)
+    full = ss.stat(rates)
+    np.testing.assert_allclose(ss.stat(rates, how), getattr(np, how)(full, axis=0), atol=1e-9)
+
+
+def test_chunk_memory_within_temporaries():
+    import tracemalloc
+    ss = sc.ScenarioStat(bt.BatchStat(10513002, np.arange(20, 50), 0, 10, 50))
+    rates = np.random.RandomState(1).normal(0.035, 0.01, (100, 50))
+    disc = [sc.discount_factors(rates, 50, x) for x in ("boy", "moy", "eoy")]
+    cf = ss.cf_benefit()
+    ss._stat(cf, *[x[:1] for x in disc])
+    # 预先计算与情景无关的缓存
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        ss._stat(cf, *disc)
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    assert peak <= 8 * ss.TEMPORARIES * rates.size * 30
+
+
+def test_chunk_size_counts_temporaries():
+    ss = _scenario(max_cells=4 * sc.ScenarioStat.TEMPORARIES * 3 * 50)
+    assert [x.stop - x.start for x in ss._chunk(10)] == [4, 4, 2]
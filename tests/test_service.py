@@ -0,0 +1,127 @@
+# -*- coding:utf-8 -*-
+
+"""
+MicroBatcher的合并、缓存与失效，QuoteService的逐点错误与HTTP 400应答
+"""
+
+import json
+import asyncio
+import threading
+import core.tbl_manage as tm
+import core.batch as bt
+import core.service as sv
+
+POINT = {"plan_id": 10513002, "iss_age": 30, "sex": 0, "payterm": 10, "insterm": 50}
+
+
+def _counting(calls, gate=None):
+    def compute(keys):
+        if gate is not None:
+            gate.wait(5)
+        calls.append(list(keys))
+        return [sum(k) for k in keys]
+    return compute
+
+
+def test_batcher_merges_and_caches():
+    calls = []
+
+    async def main():
+        b = sv.MicroBatcher(_counting(calls), max_wait=0.01)
+        first = await asyncio.gather(b.submit((1, 2)), b.submit((1, 2)), b.submit((3, 4)))
+        again = await b.submit((1, 2))
+        return b, first, again
+
+    b, first, again = asyncio.run(main())
+    assert first == [3, 3, 7] and again == 3
+    assert calls == [[(1, 2), (3, 4)]]
+    assert b.stats["cache_hits"] == 1
+
+
+def test_batcher_joins_inflight_of_same_generation():
+    calls = []
+    gate = threading.Event()
+
+    async def main():
+        b = sv.MicroBatcher(_counting(calls, gate), max_wait=0.001)
+        f1 = b.submit((1, 2))
+        b.flush()
+        f2 = b.submit((1, 2))
+        assert not b._pending
+        # 计算中的相同key等待同一批次
+        tm.ReadTable.clear_cache()
+        f3 = b.submit((1, 2))
+        assert list(b._pending) == [(1, 2)]
+        # 假设表更新后不合并到更新前开始的计算
+        gate.set()
+        return await asyncio.gather(f1, f2, f3)
+
+    assert asyncio.run(main()) == [3, 3, 3]
+    assert calls == [[(1, 2)], [(1, 2)]]
+
+
+def test_batcher_cache_invalidated_by_clear_cache():
+    calls = []
+
+    async def main():
+        b = sv.MicroBatcher(_counting(calls), max_wait=0.001)
+        await b.submit((1, 2))
+        tm.ReadTable.clear_cache()
+        await b.submit((1, 2))
+        return b
+
+    b = asyncio.run(main())
+    assert len(calls) == 2 and b.stats["cache_hits"] == 0
+
+
+def test_quote_rejects_fractional_fields_per_point():
+    service = sv.QuoteService()
+    points = [dict(POINT), dict(POINT, iss_age=30.5), dict(POINT, payterm="10.2"), dict(POINT, iss_age=40.0)]
+    out = asyncio.run(service.quote("gp", points))
+    gp = bt.BatchPricing(10513002, [30, 40], 0, 10, 50).gp()
+    assert out[0] == {"gp": gp[0]} and out[3] == {"gp": gp[1]}
+    assert out[1]["error"].startswith("ValueError: iss_age must be an integer")
+    assert out[2]["error"].startswith("ValueError: payterm must be an integer")
+
+
+async def _request(port, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body.decode("utf-8"))
+
+
+def _post(path, body):
+    body = body.encode("utf-8")
+    return "POST {} HTTP/1.1\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+        path, len(body)).encode("latin-1") + body
+
+
+def test_http_status_codes():
+    async def main():
+        service = sv.QuoteService(port=0)
+        server = await service.start()
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [
+                await _request(port, _post("/gp", json.dumps({"points": [POINT]}))),
+                await _request(port, _post("/gp", "{not json")),
+                await _request(port, _post("/gp", json.dumps({"points": 1}))),
+                await _request(port, b"POST /gp HTTP/1.1\r\nContent-Length: abc\r\n\r\n"),
+                await _request(port, b"garbage\r\n\r\n"),
+                await _request(port, _post("/other", "{}")),
+            ]
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    res = asyncio.run(main())
+    assert res[0] == (200, {"results": [{"gp": bt.BatchPricing(10513002, [30], 0, 10, 50).gp()[0]}]})
+    assert res[1][0] == 400 and res[1][1]["error"].startswith("invalid json")
+    assert res[2] == (400, {"error": "points must be a list"})
+    assert res[3] == (400, {"error": "bad request"})
+    assert res[4] == (400, {"error": "bad request"})
+    assert res[5] == (404, {"error": "not found"})
@@ -0,0 +1,29 @@
+# -*- coding:utf-8 -*-
+
+"""
+PremiumSolver的割线迭代
+"""
+
+import numpy as np
+import core.solver as sv
+
+
+def test_solve_margin_hits_target():
+    ps = sv.PremiumSolver(10513002, np.arange(20, 50, 5), 0, 10, 50)
+    calls = []
+    objective = ps.objective
+
+    def counted(gp, rate, margin=0.):
+        calls.append(1)
+        return objective(gp, rate, margin)
+    ps.objective = counted
+    gp, n = ps._solve(0.08, 0.05)
+    assert len(calls) == n + 1
+    # 割线法每步一次目标函数，另加一个初值
+    np.testing.assert_allclose(objective(gp, 0.08, 0.05), 0, atol=1e-6)
+
+
+def test_solve_irr():
+    ps = sv.PremiumSolver(10513002, [30, 40], [0, 1], 10, 50)
+    gp = ps.solve_irr(0.10)
+    np.testing.assert_allclose(ps.objective(gp, 0.10), 0, atol=1e-6)
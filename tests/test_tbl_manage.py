@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+"""
+ReadTable缓存
+"""
+
+import pytest
+import core.tbl_manage as tm
+
+
+def test_plan_tables_are_not_copied():
+    rt = tm.ReadTable
+    assert rt.get_plan_table() is rt.get_plan_table()
+    assert rt.get_ben_table() is rt.get_ben_table()
+    count = rt.read_count
+    rt.get_plan_table()
+    assert rt.read_count == count
+
+
+def test_clear_cache_invalidates_monthly_adjustment(tmp_path, monkeypatch):
+    rt = tm.ReadTable
+    for name in ("CL_2000_1.csv", "K_2000_1.csv"):
+        (tmp_path / name).write_bytes(open(tm.os.path.join(rt.MORT_TABLE_DIRECTORY, name), "rb").read())
+    monkeypatch.setattr(rt, "MORT_TABLE_DIRECTORY", str(tmp_path))
+    before = rt.get_monthly_mort_array("CL_2000_1.csv", 0, "K_2000_1.csv").copy()
+    k = tm.pd.read_csv(str(tmp_path / "K_2000_1.csv"))
+    k["male"] = 0.
+    k.to_csv(str(tmp_path / "K_2000_1.csv"), index=False)
+    rt.clear_cache("K_2000_1.csv")
+    after = rt.get_monthly_mort_array("CL_2000_1.csv", 0, "K_2000_1.csv")
+    expected = 1 - (1 - rt.get_mort_array("CL_2000_1.csv", 0)[:len(after)]) ** (1 / 12.)
+    assert (before != after).any()
+    tm.np.testing.assert_allclose(after, expected)
+
+
+def test_store_round_trip(tmp_path):
+    rt = tm.ReadTable
+    directory = tm.TableStore.compile(str(tmp_path))
+    expected = rt.get_mort_array("CL_2000_1.csv", 1).copy()
+    load = rt.get_load_array("Loading_10513002.csv", 10).copy()
+    plan = rt.get_plan_table().copy()
+    try:
+        store = rt.use_store(directory)
+        path = tm.os.path.join(rt.MORT_TABLE_DIRECTORY, "CL_2000_1.csv")
+        assert store.has(path)
+        qx = rt.get_mort_array("CL_2000_1.csv", 1)
+        tm.np.testing.assert_array_equal(qx, expected)
+        assert not qx.flags.writeable
+        tm.np.testing.assert_array_equal(rt.get_load_array("Loading_10513002.csv", 10), load)
+        tm.pd.testing.assert_frame_equal(store.frame(tm.os.path.join(rt.PLAN_DIRECTORY, "list_plan_benifit.csv")),
+                                         plan)
+    finally:
+        rt.use_store(False)
+
+
+def test_store_rejects_truncated_data(tmp_path):
+    directory = tm.TableStore.compile(str(tmp_path))
+    data = tmp_path / tm.TableStore.DATA_FILE
+    data.write_bytes(data.read_bytes()[:-8])
+    with pytest.raises(ValueError):
+        tm.TableStore(directory)
+
+
+def _select_table(tmp_path, monkeypatch):
+    rows = ["age,duration,male,female"]
+    for age in range(0, 106):
+        rows.append("{},0,{},{}".format(age, 0.001 * (age + 1), 0.002 * (age + 1)))
+    for age in range(0, 60):
+        for dur in (1, 2):
+            rows.append("{},{},{},{}".format(age, dur, 0.0001 * dur, 0.0002 * dur))
+    (tmp_path / "SEL.csv").write_text("\n".join(rows))
+    monkeypatch.setattr(tm.ReadTable, "MORT_TABLE_DIRECTORY", str(tmp_path))
+    tm.ReadTable.clear_cache()
+
+
+def test_select_table_lookup(tmp_path, monkeypatch):
+    _select_table(tmp_path, monkeypatch)
+    table = tm.ReadTable.get_select_table("SEL.csv", 0)
+    assert table.select_period == 2
+    got = table.lookup(30, tm.np.arange(5))
+    tm.np.testing.assert_allclose(got, [0.0001, 0.0002, 0.001 * 33, 0.001 * 34, 0.001 * 35])
+    # 选择期后取到达年龄的终极发生率
+    assert tm.np.isnan(table.lookup([-1, 30, 30], [0, -1, 200])).all()
+    female = tm.ReadTable.get_select_table("SEL.csv", 1).lookup([10, 10], [1, 2])
+    tm.np.testing.assert_allclose(female, [0.0004, 0.002 * 13])
+
+
+def test_mort_array_of_select_table_is_ultimate(tmp_path, monkeypatch):
+    _select_table(tmp_path, monkeypatch)
+    qx = tm.ReadTable.get_mort_array("SEL.csv", 0)
+    tm.np.testing.assert_allclose(qx, 0.001 * (tm.np.arange(106) + 1))
+    (tmp_path / "NOULT.csv").write_text("age,duration,male,female\n30,1,0.1,0.1\n")
+    with pytest.raises(ValueError):
+        tm.ReadTable.get_mort_array("NOULT.csv", 0)